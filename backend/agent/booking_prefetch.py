@@ -0,0 +1,92 @@
+"""
+Speculative prefetch for the booking dialogue
+The booking flow asks for name, OTID, reason and doctor preference before it
+needs free slots. As soon as a call enters booking (and again once the
+reason is known) the agent starts looking up the likely doctors' slots
+here on a small thread pool, so the database work overlaps with the caller
+talking. The result stays with the call and is picked up when the
+preference arrives; a stale, failed or mismatched prefetch just means the
+normal lookup runs.
+
+Results are process-local: with several voice workers sharing a SQLite
+session store, a turn served by another worker simply misses the prefetch.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+from loguru import logger
+import config
+
+
+class BookingPrefetcher:
+    """Per-call background computations, keyed by what they were computed for"""
+
+    def __init__(self, workers: int = None, maxage: float = None):
+        """
+        Args:
+            workers: Prefetch threads
+            maxage: Seconds after which a prefetched result is not used any more
+        """
+        self.workers = workers or config.config.PREFETCHWORKERS
+        self.maxage = maxage or config.config.PREFETCHMAXAGESECONDS
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[object, float, Future]] = {}  # call id -> (key, started at, future)
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, callid: str, key, compute: Callable[[], Dict]) -> bool:
+        """
+        Start compute() for this call unless a fresh run for the same key exists
+
+        Returns:
+            bool: True if a new prefetch was started
+        """
+        with self._lock:
+            entry = self._entries.get(callid)
+            if entry and entry[0] == key and time.monotonic() - entry[1] < self.maxage:
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="booking-prefetch")
+            self._entries[callid] = (key, time.monotonic(), self._executor.submit(compute))
+            return True
+
+    async def result(self, callid: str, key, timeout: float = None) -> Optional[Dict]:
+        """
+        The prefetched result for this call and key, waiting up to timeout for it to finish
+
+        Returns:
+            Dict: The result, or None (nothing started, other key, too old, failed or still running)
+        """
+        timeout = timeout if timeout is not None else config.config.PREFETCHWAITSECONDS
+        with self._lock:
+            entry = self._entries.get(callid)
+        if not entry or entry[0] != key or time.monotonic() - entry[1] >= self.maxage:
+            self.misses += 1
+            return None
+
+        future = entry[2]
+        try:
+            result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            logger.info(f"[Call {callid}] Booking prefetch still running, looking up directly")
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"[Call {callid}] Booking prefetch failed: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def release(self, callid: str):
+        """Forget the call's prefetch (a running one finishes and is discarded)"""
+        with self._lock:
+            self._entries.pop(callid, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
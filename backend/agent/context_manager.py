@@ -0,0 +1,108 @@
+"""
+Token-budgeted conversation history for LLM prompts
+Each turn is stored with its approximate token cost. When the history goes
+over budget, the oldest turns are folded into a short rolling summary.
+Compaction goes down to a low-water mark rather than just under the budget,
+so the prompt prefix (system prompt, summary, older turns) stays identical
+for several turns in a row and the model server's prefix cache keeps hitting.
+"""
+
+import math
+from typing import Dict, Iterator, List
+import config
+
+# After compaction the kept turns use at most this share of the budget
+LOWWATER = 0.5
+SUMMARYCHARS = 90  # Per summarized turn
+MESSAGEOVERHEAD = 4  # Role and separators per message
+
+
+def estimatetokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English/French)"""
+    return math.ceil(len(text or "") / 4) + MESSAGEOVERHEAD
+
+
+class ConversationContext:
+    """
+    Conversation history bounded by a token budget
+
+    List-like for callers that only append and read (append, len, iteration,
+    indexing); messages() gives the prompt form with the summary first.
+    """
+
+    def __init__(self, budget: int = None, summarybudget: int = None):
+        """
+        Args:
+            budget: Tokens allowed for the kept turns
+            summarybudget: Tokens allowed for the summary of evicted turns
+        """
+        self.budget = budget or config.config.LLMCONTEXTTOKENS
+        self.summarybudget = summarybudget or config.config.LLMSUMMARYTOKENS
+        self._turns: List[Dict] = []
+        self._tokens: List[int] = []
+        self._summary: List[str] = []
+        self.used = 0
+        self.summarized = 0
+
+    @classmethod
+    def fromhistory(cls, history: List[Dict], **kwargs) -> "ConversationContext":
+        context = cls(**kwargs)
+        for message in history:
+            context.append(message)
+        return context
+
+    def append(self, message: Dict):
+        """Add a {"role", "content"} message, compacting if over budget"""
+        tokens = estimatetokens(message.get("content", ""))
+        self._turns.append(message)
+        self._tokens.append(tokens)
+        self.used += tokens
+        if self.used > self.budget:
+            self._compact()
+
+    def _compact(self):
+        target = self.budget * LOWWATER
+        evicted = 0
+        while self.used > target and len(self._turns) > 1:
+            message = self._turns.pop(0)
+            self.used -= self._tokens.pop(0)
+            self._summary.append(self._summarize(message))
+            evicted += 1
+        self.summarized += evicted
+
+        # Rolling: the oldest summary lines go first
+        while self._summary and estimatetokens(" | ".join(self._summary)) > self.summarybudget:
+            self._summary.pop(0)
+
+    @staticmethod
+    def _summarize(message: Dict) -> str:
+        text = " ".join((message.get("content") or "").split())
+        if len(text) > SUMMARYCHARS:
+            text = text[:SUMMARYCHARS].rsplit(" ", 1)[0] + "..."
+        speaker = "Patient" if message.get("role") == "user" else "Receptionist"
+        return f"{speaker}: {text}"
+
+    @property
+    def summary(self) -> str:
+        return " | ".join(self._summary)
+
+    def messages(self) -> List[Dict]:
+        """Prompt messages: summary of evicted turns (if any), then the kept turns"""
+        messages = []
+        if self._summary:
+            messages.append({"role": "system", "content": f"Earlier in this call: {self.summary}"})
+        messages.extend(self._turns)
+        return messages
+
+    def tokens(self) -> int:
+        """Approximate tokens of messages()"""
+        return self.used + (estimatetokens(self.summary) + 6 if self._summary else 0)
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self._turns)
+
+    def __getitem__(self, index):
+        return self._turns[index]
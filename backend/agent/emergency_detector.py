@@ -1,9 +1,32 @@
 from loguru import logger
-from typing import Dict, Tuple
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+from agent.keyword_matcher import keyword_matcher, KeywordHit
 import config
+import re
+
+
+class TriageBatch(NamedTuple):
+    """Compact result of EmergencyDetector.detect_batch"""
+    severity: array  # 'B' codes, see EmergencyDetector.SEVERITYCODES
+    start: array     # 'i' offset of the deciding keyword, -1 if none
+    end: array       # 'i'
+
 
 class EmergencyDetector:
     """Detect medical emergencies and provide triage"""
+    MATCHERNAMESPACE = "emergency_detector"
+    FEVERPATTERN = re.compile(r'fever\s+(?:of\s+)?(\d+)')
+
+    SEVERITYCODES = {"none": 0, "moderate": 1, "urgent": 2, "critical": 3}
+
+    SEVERITYADVICE = {
+        "critical": "This is a medical emergency. Please call 911 immediately or go to the nearest emergency room. Do not wait.",
+        "urgent": "This requires immediate medical attention. Please go to the emergency room or urgent care center right away.",
+        "moderate": "I recommend scheduling an appointment with your doctor soon to address this concern.",
+        "none": ""
+    }
+
     def __init__(self):
         self.emergencykeywords = config.config.EMERGENCYKEYWORDS
         
@@ -20,63 +43,85 @@ class EmergencyDetector:
                 "fever", "pain", "bleeding", "dizzy", "nausea", "rash"
             ]
         }
+
+        # Compile keyword lists into the shared single-pass matcher
+        self.matcher = keyword_matcher
+        self.matcher.register(self.MATCHERNAMESPACE, self.severitylevels)
     
-    def detectemergency(self, text: str) -> Tuple[bool, str, str]:
+    def detectemergency(self, text: str, hits: List[KeywordHit] = None) -> Tuple[bool, str, str]:
         """
         Detect if text contains emergency keywords
         
         Args:
             text: User input text
+            hits: Pre-computed keyword_matcher.scan(text) result (optional)
             
         Returns:
             Tuple[bool, str, str]: (isemergency, severity, advice)
         """
-        textlower = text.lower()
+        severity, keyword, _, _ = self._triage(text.lower(), hits)
+
+        if severity == "critical":
+            logger.critical(f"CRITICAL EMERGENCY DETECTED: {keyword}")
+        elif severity == "urgent":
+            logger.warning(f"URGENT SITUATION DETECTED: {keyword}")
+        elif severity == "moderate":
+            logger.info(f"MODERATE CONCERN DETECTED: {keyword}")
+
+        return (severity in ("critical", "urgent"), severity, self.SEVERITYADVICE[severity])
+
+    def _triage(self, textlower: str, hits: List[KeywordHit] = None) -> Tuple[str, str, int, int]:
+        """Triage without logging. Returns (severity, keyword, start, end)"""
+        if hits is None:
+            hits = self.matcher.scan(textlower, self.MATCHERNAMESPACE)
+
+        # First-listed keyword per severity (earliest occurrence on ties)
+        found = {}
+        for hit in hits:
+            if hit.namespace != self.MATCHERNAMESPACE:
+                continue
+            current = found.get(hit.category)
+            if current is None or hit.rank < current.rank:
+                found[hit.category] = hit
         
         # Check critical emergencies
-        for keyword in self.severitylevels["critical"]:
-            if keyword in textlower:
-                logger.critical(f"CRITICAL EMERGENCY DETECTED: {keyword}")
-                return (
-                    True,
-                    "critical",
-                    "This is a medical emergency. Please call 911 immediately or go to the nearest emergency room. Do not wait."
-                )
+        if "critical" in found:
+            hit = found["critical"]
+            return "critical", hit.keyword, hit.start, hit.end
         
         # Check for high fever (above 103°F)
-        import re
-        fever_matches = re.findall(r'fever\s+(?:of\s+)?(\d+)', textlower)
-        if fever_matches:
-            for fever_temp in fever_matches:
-                if int(fever_temp) >= 103:
-                    logger.warning(f"URGENT SITUATION DETECTED: high fever {fever_temp}")
-                    return (
-                        True,
-                        "urgent",
-                        "This requires immediate medical attention. Please go to the emergency room or urgent care center right away."
-                    )
-        
-        # Check urgent situations
-        for keyword in self.severitylevels["urgent"]:
-            if keyword in textlower:
-                logger.warning(f"URGENT SITUATION DETECTED: {keyword}")
-                return (
-                    True,
-                    "urgent",
-                    "This requires immediate medical attention. Please go to the emergency room or urgent care center right away."
-                )
+        for match in self.FEVERPATTERN.finditer(textlower):
+            if int(match.group(1)) >= 103:
+                return "urgent", f"high fever {match.group(1)}", match.start(), match.end()
         
-        # Check moderate concerns
-        for keyword in self.severitylevels["moderate"]:
-            if keyword in textlower:
-                logger.info(f"MODERATE CONCERN DETECTED: {keyword}")
-                return (
-                    False,
-                    "moderate",
-                    "I recommend scheduling an appointment with your doctor soon to address this concern."
-                )
+        # Check urgent situations, then moderate concerns
+        for severity in ("urgent", "moderate"):
+            if severity in found:
+                hit = found[severity]
+                return severity, hit.keyword, hit.start, hit.end
         
-        return (False, "none", "")
+        return "none", "", -1, -1
+
+    def detect_batch(self, texts: Iterable[str]) -> TriageBatch:
+        """
+        Triage many texts without per-item logging
+
+        Args:
+            texts: Iterable of user texts (e.g. call transcripts)
+
+        Returns:
+            TriageBatch: Severity codes (see SEVERITYCODES) and the offsets of
+            the keyword that decided each severity (-1 when none matched)
+        """
+        batch = TriageBatch(array("B"), array("i"), array("i"))
+        scan = self.matcher.scan
+        for text in texts:
+            textlower = text.lower()
+            severity, _, start, end = self._triage(textlower, scan(textlower, self.MATCHERNAMESPACE))
+            batch.severity.append(self.SEVERITYCODES[severity])
+            batch.start.append(start)
+            batch.end.append(end)
+        return batch
     
     def getemergencyprotocol(self, severity: str) -> str:
         """Get emergency protocol based on severity"""
@@ -1,8 +1,14 @@
 from loguru import logger
-from typing import Dict, List
+from array import array
+from typing import Dict, Iterable, List, Tuple
+from agent.keyword_matcher import keyword_matcher, KeywordHit
 
 class MedicalIntentClassifier:
     """Classify patient intents for medical receptionist"""
+    MATCHERNAMESPACE = "intent_classifier"
+
+    # Phrases that force appointmentinquiry ahead of keyword scoring
+    INQUIRYPRIORITY = ["when is", "when do i", "check appointment", "next appointment"]
 
     def __init__(self):
         self.intentkeywords = {
@@ -44,44 +50,74 @@ class MedicalIntentClassifier:
                 "hello", "hi", "hey", "good morning", "good afternoon", "good evening"
             ]
         }
+
+        # Stable numeric ids for batch results
+        self.intentids = list(self.intentkeywords)
+
+        # Compile keyword lists into the shared single-pass matcher
+        self.matcher = keyword_matcher
+        self.matcher.register(self.MATCHERNAMESPACE, {**self.intentkeywords, "inquirypriority": self.INQUIRYPRIORITY})
     
-    def classify(self, text: str) -> str:
+    def classify(self, text: str, hits: List[KeywordHit] = None) -> str:
         """
         Classify intent from user text
         
         Args:
             text: User input text
+            hits: Pre-computed keyword_matcher.scan(text) result (optional)
             
         Returns:
             str: Detected intent
         """
-        textlower = text.lower()
+        intent, score = self._score(text, hits)
+        if intent == "emergency":
+            logger.warning(f"EMERGENCY DETECTED: {text}")
+        elif score:
+            logger.info(f"Intent detected: {intent} (score: {score})")
+        return intent
+
+    def _score(self, text: str, hits: List[KeywordHit] = None) -> Tuple[str, int]:
+        """Classify without logging. Returns (intent, score)"""
+        if hits is None:
+            hits = self.matcher.scan(text, self.MATCHERNAMESPACE)
+        found = self.matcher.group(hits, self.MATCHERNAMESPACE)
         
         # Check for emergency first (highest priority)
-        for keyword in self.intentkeywords["emergency"]:
-            if keyword in textlower:
-                logger.warning(f"EMERGENCY DETECTED: {text}")
-                return "emergency"
+        if "emergency" in found:
+            return "emergency", len(found["emergency"])
         
         # Check for appointment inquiry - higher weight for "when" question
-        inquiry_keywords = self.intentkeywords["appointmentinquiry"]
-        if any(keyword in textlower for keyword in ["when is", "when do i", "check appointment", "next appointment"]):
-            logger.info(f"Intent detected: appointmentinquiry (score: 3)")
-            return "appointmentinquiry"
+        if "inquirypriority" in found:
+            return "appointmentinquiry", 3
         
-        # Check other intents
+        # Check other intents (one point per distinct keyword found)
         intentscores = {}
-        for intent, keywords in self.intentkeywords.items():
+        for intent in self.intentkeywords:
             if intent == "emergency":
                 continue
-            score = sum(1 for keyword in keywords if keyword in textlower)
-            if score > 0:
-                intentscores[intent] = score
+            if intent in found:
+                intentscores[intent] = len(found[intent])
         
         if intentscores:
             detectedintent = max(intentscores, key=intentscores.get)
-            logger.info(f"Intent detected: {detectedintent} (score: {intentscores[detectedintent]})")
-            return detectedintent
+            return detectedintent, intentscores[detectedintent]
         
         # Default to general inquiry
-        return "generalinquiry"
\ No newline at end of file
+        return "generalinquiry", 0
+
+    def classify_batch(self, texts: Iterable[str]) -> array:
+        """
+        Classify many texts without per-item logging
+
+        Args:
+            texts: Iterable of user texts (e.g. call transcripts)
+
+        Returns:
+            array('B'): Intent id per text, an index into self.intentids
+        """
+        intentindex = {intent: i for i, intent in enumerate(self.intentids)}
+        scan = self.matcher.scan
+        return array("B", (
+            intentindex[self._score(text, scan(text, self.MATCHERNAMESPACE))[0]]
+            for text in texts
+        ))
@@ -0,0 +1,129 @@
+"""
+Incremental extraction of string fields from a streamed JSON object
+Lets the agent hand spoken_response to TTS while the LLM is still generating
+the rest of the object (analysis, missing_info, ...).
+"""
+
+from typing import Dict, Optional
+
+ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class JSONFieldStreamer:
+    """
+    Character-level scanner over a JSON object arriving in arbitrary chunks
+
+    Tracks top-level string values as they are decoded. feed() returns the new
+    text of the target field; other top-level string fields are available in
+    `values` once complete. Nested objects/arrays are skipped.
+    """
+
+    def __init__(self, field: str = "spoken_response"):
+        self.field = field
+        self.values: Dict[str, str] = {}
+        self.text = ""           # Decoded target field so far
+        self.done = False        # Target field closed
+        self._depth = 0
+        self._instring = False
+        self._escape = None      # None, "" after backslash, or partial \\u digits
+        self._surrogate = None
+        self._iskey = False
+        self._key = None
+        self._expectkey = False
+        self._current = None     # Chars of the top-level string being read
+        self._target = False
+
+    def _emit(self, ch: str, out: list):
+        self._current.append(ch)
+        if self._target:
+            out.append(ch)
+
+    def _decodeescape(self, ch: str, out: list):
+        if self._escape == "":
+            if ch == "u":
+                self._escape = "u"
+                return
+            self._emit(ESCAPES.get(ch, ch), out)
+            self._escape = None
+            return
+
+        self._escape += ch
+        if len(self._escape) < 5:
+            return
+        code = int(self._escape[1:], 16)
+        self._escape = None
+        if 0xD800 <= code <= 0xDBFF:
+            self._surrogate = code
+            return
+        if 0xDC00 <= code <= 0xDFFF and self._surrogate is not None:
+            code = 0x10000 + ((self._surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._surrogate = None
+        self._emit(chr(code), out)
+
+    def _closestring(self):
+        value = "".join(self._current)
+        self._current = None
+        if self._iskey:
+            self._key = value
+        else:
+            self.values[self._key] = value
+            if self._target:
+                self.done = True
+            self._key = None
+        self._target = False
+
+    def feed(self, chunk: str) -> str:
+        """
+        Consume the next chunk of the JSON document
+
+        Returns:
+            str: Newly decoded text of the target field ("" if none)
+        """
+        out = []
+        for ch in chunk:
+            if self._instring:
+                if self._escape is not None:
+                    if self._current is not None:
+                        self._decodeescape(ch, out)
+                    else:
+                        # Skipped strings: \uXXXX digits can't end the string, so one char is enough
+                        self._escape = None
+                elif ch == "\\":
+                    self._escape = ""
+                elif ch == '"':
+                    self._instring = False
+                    if self._current is not None:
+                        self._closestring()
+                elif self._current is not None:
+                    self._emit(ch, out)
+                continue
+
+            if ch == '"':
+                self._instring = True
+                if self._depth == 1:
+                    self._iskey = self._expectkey
+                    if self._iskey or self._key is not None:
+                        self._current = []
+                        self._target = not self._iskey and self._key == self.field
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._expectkey = True
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    self._key = None
+            elif self._depth == 1:
+                if ch == ",":
+                    self._expectkey = True
+                    self._key = None
+                elif ch == ":":
+                    self._expectkey = False
+
+        text = "".join(out)
+        self.text += text
+        return text
+
+    def get(self, field: str) -> Optional[str]:
+        """Completed top-level string value, if already seen"""
+        return self.values.get(field)
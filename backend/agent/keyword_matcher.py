@@ -0,0 +1,137 @@
+"""
+Shared multi-pattern keyword matcher (Aho-Corasick)
+Compiles every registered keyword table into one automaton so an utterance
+is scanned once, however many keyword lists are registered.
+"""
+
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from loguru import logger
+
+
+class KeywordHit(NamedTuple):
+    """A single keyword occurrence in the scanned text"""
+    start: int
+    end: int
+    keyword: str
+    namespace: str
+    category: str
+    rank: int  # Position of the keyword in its category list (lower = listed first)
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton built from namespaced keyword tables"""
+
+    def __init__(self):
+        self._tables: Dict[str, Dict[str, Tuple[str, ...]]] = {}
+        self._lock = threading.Lock()
+        self._automaton = None
+
+    def register(self, namespace: str, table: Dict[str, Iterable[str]]):
+        """
+        Register (or replace) a keyword table
+
+        Args:
+            namespace: Owner of the table, e.g. "emergency_detector"
+            table: Mapping of category -> keywords, in priority order
+        """
+        frozen = {category: tuple(keywords) for category, keywords in table.items()}
+        with self._lock:
+            if self._tables.get(namespace) == frozen:
+                return
+            self._tables[namespace] = frozen
+            self._automaton = None
+
+    def _build(self):
+        """Compile all registered tables into goto/fail/output tables"""
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[list] = [[]]
+        patterns: Dict[str, list] = {}
+
+        for namespace, table in self._tables.items():
+            for category, keywords in table.items():
+                for rank, keyword in enumerate(keywords):
+                    if keyword:
+                        patterns.setdefault(keyword, []).append((namespace, category, rank))
+
+        # Trie of all distinct keywords
+        for keyword, payloads in patterns.items():
+            state = 0
+            for ch in keyword:
+                nextstate = goto[state].get(ch)
+                if nextstate is None:
+                    nextstate = len(goto)
+                    goto[state][ch] = nextstate
+                    goto.append({})
+                    outputs.append([])
+                state = nextstate
+            outputs[state].append((keyword, tuple(payloads)))
+
+        # Failure links (BFS), merging outputs of the fail chain into each state
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nextstate in goto[state].items():
+                queue.append(nextstate)
+                fallback = fail[state]
+                while fallback and ch not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[nextstate] = goto[fallback].get(ch, 0)
+                outputs[nextstate].extend(outputs[fail[nextstate]])
+
+        automaton = (goto, fail, [tuple(out) for out in outputs])
+        logger.debug(f"Keyword automaton compiled: {len(patterns)} keywords, {len(goto)} states")
+        return automaton
+
+    def _getautomaton(self):
+        automaton = self._automaton
+        if automaton is None:
+            with self._lock:
+                if self._automaton is None:
+                    self._automaton = self._build()
+                automaton = self._automaton
+        return automaton
+
+    def scan(self, text: str, namespace: Optional[str] = None) -> List[KeywordHit]:
+        """
+        Find every keyword occurrence in a single pass over the text
+
+        Matching is case-insensitive on the text side (the text is lowercased),
+        with the same substring semantics as `keyword in text.lower()`.
+
+        Args:
+            text: Raw user text
+            namespace: Only return hits for this namespace (default: all)
+
+        Returns:
+            List[KeywordHit]: Hits in order of their end position
+        """
+        goto, fail, outputs = self._getautomaton()
+        hits = []
+        state = 0
+        for index, ch in enumerate(text.lower()):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if outputs[state]:
+                end = index + 1
+                for keyword, payloads in outputs[state]:
+                    for owner, category, rank in payloads:
+                        if namespace is None or owner == namespace:
+                            hits.append(KeywordHit(end - len(keyword), end, keyword, owner, category, rank))
+        return hits
+
+    @staticmethod
+    def group(hits: List[KeywordHit], namespace: str) -> Dict[str, Dict[int, str]]:
+        """Group hits of one namespace as category -> {rank: keyword}"""
+        grouped: Dict[str, Dict[int, str]] = {}
+        for hit in hits:
+            if hit.namespace == namespace:
+                grouped.setdefault(hit.category, {})[hit.rank] = hit.keyword
+        return grouped
+
+
+# Process-wide matcher shared by the emergency detector and intent classifier
+keyword_matcher = KeywordMatcher()
@@ -1,6 +1,6 @@
 from loguru import logger
 from db.database import SessionLocal
-from db.models import MedicalKnowledge
+from db.knowledge_search import searchknowledge
 import config
 
 class MedicalKnowledgeBase:
@@ -37,13 +37,9 @@ class MedicalKnowledgeBase:
         """Search medical knowledge base"""
         try:
             db = SessionLocal()
-            querylower = query.lower()
             
-            # Search for matching terms
-            results = db.query(MedicalKnowledge).filter(
-                MedicalKnowledge.term.ilike(f"%{query}%") |
-                MedicalKnowledge.description.ilike(f"%{query}%")
-            ).limit(3).all()
+            # Ranked full-text search for matching terms
+            results = searchknowledge(db, query, limit=3)
             
             db.close()
             
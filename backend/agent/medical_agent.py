@@ -1,21 +1,29 @@
 import json
 import random
+from itertools import islice
 from loguru import logger
 from agent.intent_classifier import MedicalIntentClassifier
 from agent.emergency_detector import EmergencyDetector
 from agent.knowledge_base import MedicalKnowledgeBase
+from agent.keyword_matcher import keyword_matcher
+from agent.json_stream import JSONFieldStreamer
+from agent.session_store import createsessionstore
+from agent.context_manager import ConversationContext
+from agent.booking_prefetch import BookingPrefetcher
+from agent.specialty_router import specialty_router
 from db.database import SessionLocal
-from db.models import Patient, Doctor, Appointment, Call, User, TempCall
-from datetime import datetime, date, time, timedelta
+from sqlalchemy.exc import IntegrityError
+from db.models import Patient, Appointment, Call, User, TempCall
+from datetime import datetime, date, timedelta
 import config
 import re
 from services.email_service import email_service
+from services.llm_client import llm_client, LLMOverloaded, OLLAMAAVAILABLE
+from services.availability_service import availability_service, occupancy_index
+from services.slot_hold_service import slot_hold_service
+from services.doctor_directory import doctor_directory
 
-try:
-    import ollama
-    OLLAMAAVAILABLE = True
-except ImportError:
-    OLLAMAAVAILABLE = False
+if not OLLAMAAVAILABLE:
     logger.warning("Ollama not available, using rule-based responses")
 
 class MedicalReceptionistAgent:
@@ -25,7 +33,8 @@ class MedicalReceptionistAgent:
         self.intentclassifier = MedicalIntentClassifier()
         self.emergencydetector = EmergencyDetector()
         self.knowledgebase = MedicalKnowledgeBase()
-        self.conversationstate = {}
+        self.conversationstate = createsessionstore()  # call id -> ConversationState
+        self.bookingprefetch = BookingPrefetcher()  # call id -> doctors/slots looked up ahead of the dialogue
 
         if OLLAMAAVAILABLE and config.config.LLMPROVIDER == "ollama":
             self.usellm = True
@@ -37,6 +46,23 @@ class MedicalReceptionistAgent:
     def getgreeting(self) -> str:
         """Get varied, professional greeting"""
         return "Hello! Welcome to AI Medical Receptionist. I am an AI assistant here to help you. How may I assist you today?"
+
+    def getemergencyresponse(self, severity: str) -> str:
+        """Spoken emergency advice followed by the protocol for this severity"""
+        advice = self.emergencydetector.SEVERITYADVICE[severity]
+        protocol = self.emergencydetector.getemergencyprotocol(severity)
+        return f"{advice}\n\n{protocol}"
+
+    def getfixedresponses(self) -> list:
+        """Spoken replies that never vary (used to prewarm the TTS cache), most urgent first"""
+        return [
+            self.getemergencyresponse("critical"),
+            self.getemergencyresponse("urgent"),
+            self.getgreeting(),
+            "I'm here to help! Could you tell me more about what you need?",
+            "I apologize, I missed that. Could you repeat?",
+            "I apologize, I'm having trouble right now. How else can I help you?"
+        ]
         
     def _create_json_response(self, spoken_text: str, metadata: dict = None) -> str:
         """Create standardized JSON response"""
@@ -48,55 +74,64 @@ class MedicalReceptionistAgent:
         })
 
     
-    async def processinput(self, userinput: str, conversationhistory: list, callid: str = None, user_context: dict = None) -> str:
-        """Process patient input with medical intelligence"""
+    async def processinput(self, userinput: str, conversationhistory: list, callid: str = None, user_context: dict = None,
+                           on_fragment=None) -> str:
+        """
+        Process patient input with medical intelligence
+
+        Args:
+            on_fragment: Optional async callback(fragment, language) receiving
+                spoken_response text as the LLM streams it (language is None
+                until the model has emitted it). Replies that do not come from
+                the LLM are only returned.
+        """
         print(f"DEBUG_AGENT: processinput received input='{userinput}', context={user_context}", flush=True)
+        if callid is None:
+            callid = "websession"
+
+        # One turn per call at a time (across workers with the shared store);
+        # the state is written back when the turn ends
         try:
-            if callid is None:
-                callid = "websession"
-            
+            async with self.conversationstate.lock(callid):
+                return await self._processturn(userinput, conversationhistory, callid, user_context, on_fragment)
+        except TimeoutError as e:
+            logger.error(f"[Call {callid}] {e}")
+            return self._create_json_response(
+                "I apologize, could you please repeat that?",
+                {"error": str(e), "retry": True}
+            )
+
+    async def _processturn(self, userinput: str, conversationhistory: list, callid: str, user_context: dict,
+                           on_fragment) -> str:
+        try:
+            # Single keyword pass shared by emergency detection and intent classification
+            keywordhits = keyword_matcher.scan(userinput)
+
             # PRIORITY 1: Check for emergency
-            isemergency, severity, emergencyadvice = self.emergencydetector.detectemergency(userinput)
+            isemergency, severity, _ = self.emergencydetector.detectemergency(userinput, hits=keywordhits)
             if isemergency:
                 logger.critical(f"[Call {callid}] EMERGENCY: {severity}")
-                protocol = self.emergencydetector.getemergencyprotocol(severity)
                 return self._create_json_response(
-                    f"{emergencyadvice}\n\n{protocol}",
+                    self.getemergencyresponse(severity),
                     {"is_emergency": True, "severity": severity}
                 )
             
             # Classify intent
-            intent = self.intentclassifier.classify(userinput)
+            intent = self.intentclassifier.classify(userinput, hits=keywordhits)
             logger.info(f"[Call {callid}] Intent: {intent}")
             
             # Initialize conversation state
-            # Check state
-            logger.info(f"[Call {callid}] Processing input. State exists? {callid in self.conversationstate}")
-            if callid in self.conversationstate:
-                logger.info(f"[Call {callid}] Current State: {self.conversationstate[callid]}")
-
-            if callid not in self.conversationstate:
-                self.conversationstate[callid] = {
-                    "intent": intent,
-                    "patientid": None,
-                    "patientname": None,
-                    "phone": None,
-                    "verified": False,
-                    "otid": None,
-                    "awaitingname": False,
-                    "awaitingkey": False,
-                    "awaitingreason": False,
-                    "appointmentreason": None,
-                    "retrycount": 0
-                }
+            state = self.conversationstate.get(callid)
+            logger.info(f"[Call {callid}] Processing input. State exists? {state is not None}")
+            if state is not None:
+                logger.info(f"[Call {callid}] Current State: {state}")
+                state["intent"] = intent
             else:
-                self.conversationstate[callid]["intent"] = intent
-            
+                state = self.conversationstate.create(callid, intent=intent)
+
             # Apply Context Overrides (CRITICAL FIX)
             if user_context:
-                self.conversationstate[callid].update(user_context)
-            
-            state = self.conversationstate[callid]
+                state.update(user_context)
             
             # Extract patient name if mentioned (only if not already set)
             patientname = self.extractpatientname(userinput, state)
@@ -129,7 +164,7 @@ class MedicalReceptionistAgent:
             elif intent == "appointmentcancel":
                 return await self.handleappointmentcancel(userinput, callid, conversationhistory)
             elif intent == "medicalquestion":
-                return await self.handlemedicalquestion(userinput, callid, conversationhistory)
+                return await self.handlemedicalquestion(userinput, callid, conversationhistory, on_fragment)
             elif intent == "prescriptionrefill":
                 return await self.handleprescriptionrefill(userinput, callid, conversationhistory)
             elif intent == "testresults":
@@ -137,15 +172,15 @@ class MedicalReceptionistAgent:
             elif intent == "billing":
                 return await self.handlebilling(userinput, callid, conversationhistory)
             elif intent == "generalinquiry":
-                return await self.handlegeneralinquiry(userinput, callid, conversationhistory)
+                return await self.handlegeneralinquiry(userinput, callid, conversationhistory, on_fragment)
             elif intent == "greeting":
-                return await self.getsmartresponse(userinput, conversationhistory, callid, None, intent)
+                return await self.getsmartresponse(userinput, conversationhistory, callid, None, intent, on_fragment)
             else:
-                return await self.getsmartresponse(userinput, conversationhistory, callid, None, intent)
+                return await self.getsmartresponse(userinput, conversationhistory, callid, None, intent, on_fragment)
                 
         except Exception as e:
             logger.error(f"[Call {callid}] Error: {e}")
-            state = self.conversationstate.get(callid, {})
+            state = self.conversationstate.get(callid) or self.conversationstate.create(callid)
             state["retrycount"] = state.get("retrycount", 0) + 1
             
             if state["retrycount"] < 3:
@@ -163,6 +198,10 @@ class MedicalReceptionistAgent:
         """Handle appointment booking"""
         state = self.conversationstate[callid]
         
+        # Look up doctors and slots while the caller answers the questions below
+        if not state.get("selecteddoctorid"):
+            self.prefetchbooking(callid, state.get("appointmentreason"))
+
         # Auto-verify authenticated users
         if state.get("userid") and not state.get("verified"):
             logger.info(f"Auto-verifying authenticated user {state.get('patientname')}")
@@ -259,6 +298,7 @@ class MedicalReceptionistAgent:
                 state["appointmentreason"] = userinput
                 state["awaitingreason"] = False
                 state["awaitingdoctorpref"] = True # Move to next step
+                self.prefetchbooking(callid, userinput)
                 
                 return self._create_json_response(
                     "Do you have a specific doctor you would like to see, or would you like me to recommend one?",
@@ -275,19 +315,26 @@ class MedicalReceptionistAgent:
         if not state.get("selecteddoctorid"):
             if state.get("awaitingdoctorpref"):
                 # Analyze preference
+                prefetched = await self.bookingprefetch.result(callid, state.get("appointmentreason"))
                 selected_doc = self.find_doctor_by_preference(userinput, state.get("appointmentreason"))
                 if selected_doc:
                     state["selecteddoctorid"] = selected_doc.id
                     state["selecteddoctorname"] = selected_doc.name
                     state["awaitingdoctorpref"] = False
                     
-                    # Now show slots for THIS doctor
-                    availableslots = self.getavailableslots(doctor_id=selected_doc.id)
-                    if availableslots:
-                        slotstext = "\n".join([f"• {slot['date']} at {slot['time']} with {slot['doctor']}" for slot in availableslots[:3]])
+                    # Now show slots for THIS doctor, held for this call until the user picks one
+                    offers = []
+                    if prefetched and selected_doc.id in prefetched["slots"]:
+                        offers = self.holdslots(callid, prefetched["slots"][selected_doc.id])
+                    if not offers:
+                        offers = self.holdslots(callid, self.getavailableslots(doctor_id=selected_doc.id, callid=callid))
+                    self.bookingprefetch.release(callid)
+                    if offers:
+                        state["offeredholds"] = offers
+                        slotstext = "\n".join([f"• {slot['date']} at {slot['time']} with {slot['doctor']}" for slot in offers])
                         return self._create_json_response(
                             f"I've found {selected_doc.name} for you. Here are their upcoming openings:\n{slotstext}\n\nWhich time works best?",
-                            {"intent": "booking", "step": "offer_slots", "slots": availableslots[:3]}
+                            {"intent": "booking", "step": "offer_slots", "slots": offers}
                         )
                 else:
                     return self._create_json_response(
@@ -303,15 +350,19 @@ class MedicalReceptionistAgent:
         
         # Step 4: Book appointment
         if state.get("patientid") or state.get("userid"):
+            offer = self.pickofferedslot(userinput, state.get("offeredholds", []))
             appointment = self.createappointment(
                 patientid=state.get("patientid"),
                 userid=state.get("userid"),
                 reason=state["appointmentreason"],
                 userinput=userinput,
-                doctorid=state.get("selecteddoctorid")
+                doctorid=state.get("selecteddoctorid"),
+                holdid=offer["hold_id"] if offer else None,
+                callid=callid
             )
             
             if appointment:
+                state["offeredholds"] = None
                 return self._create_json_response(
                     f"Perfect! I've scheduled your appointment for {appointment['date']} at {appointment['time']} with {appointment['doctor']}. You'll receive a confirmation. Is there anything else I can help you with?",
                     {"intent": "booking", "step": "confirmed", "appointment": appointment}
@@ -396,14 +447,14 @@ class MedicalReceptionistAgent:
         
         return "You don't have any upcoming appointments to cancel."
     
-    async def handlemedicalquestion(self, userinput: str, callid: str, conversationhistory: list) -> str:
+    async def handlemedicalquestion(self, userinput: str, callid: str, conversationhistory: list, on_fragment=None) -> str:
         """Handle medical questions"""
         kbresponse = self.knowledgebase.searchmedicalknowledge(userinput)
         if kbresponse:
             return kbresponse
         
         if self.usellm:
-            return await self.getsmartresponse(userinput, conversationhistory, callid, None, "medicalquestion")
+            return await self.getsmartresponse(userinput, conversationhistory, callid, None, "medicalquestion", on_fragment)
         
         return "That's a great question. For specific medical advice, I recommend scheduling an appointment. Would you like me to book one for you?"
     
@@ -425,20 +476,26 @@ class MedicalReceptionistAgent:
         """Handle billing"""
         return "For billing questions, our billing department is available at +1-555-BILL, Monday through Friday, 9 AM to 5 PM. They can help with insurance, payments, and statements. Is there anything else I can assist you with?"
     
-    async def handlegeneralinquiry(self, userinput: str, callid: str, conversationhistory: list) -> str:
+    async def handlegeneralinquiry(self, userinput: str, callid: str, conversationhistory: list, on_fragment=None) -> str:
         """Handle general inquiries"""
         if any(word in userinput.lower() for word in ["hours", "location", "address", "phone"]):
             return self.knowledgebase.getclinicinfo(userinput)
         
-        return await self.getsmartresponse(userinput, conversationhistory, callid, None, "generalinquiry")
+        return await self.getsmartresponse(userinput, conversationhistory, callid, None, "generalinquiry", on_fragment)
     
-    async def getsmartresponse(self, userinput: str, conversationhistory: list, callid: str, patient: Patient = None, intent: str = None) -> str:
-        """Get intelligent response using LLM with JSON Mode"""
+    async def getsmartresponse(self, userinput: str, conversationhistory: list, callid: str, patient: Patient = None,
+                               intent: str = None, on_fragment=None) -> str:
+        """
+        Get intelligent response using LLM with JSON Mode
+
+        With on_fragment, the completion is streamed and spoken_response text
+        is passed to the callback as it arrives (see processinput). Falls back
+        to the rule-based reply when the LLM scheduler sheds the request.
+        conversationhistory may be a ConversationContext or a plain message
+        list; either way it is fitted to the LLMCONTEXTTOKENS budget.
+        """
         if not self.usellm:
-            return json.dumps({
-                "spoken_response": "I'm here to help! Could you tell me more about what you need?",
-                "metadata": {"intent": "fallback", "step": "0"}
-            })
+            return self._fallbackresponse()
         
         try:
             contextparts = [
@@ -446,40 +503,57 @@ class MedicalReceptionistAgent:
                 "You MUST respond in strictly valid JSON format.",
                 "Structure your JSON response as follows:",
                 "{"
+                '  "language": "en|fr" (Detect the user\'s language. Respond in the SAME language.),'
                 '  "spoken_response": "The text you want the TTS to speak to the patient (concise, 1-2 sentences).",'
                 '  "analysis": "Brief internal thought about the patient\'s request.",'
                 '  "current_step": "The current step in the triage process (1-8) or 0 if general chat.",'
                 '  "is_emergency": false,',
                 '  "missing_info": ["severity", "location"] (list of info you still need),'
-                '  "intent": "appointment|medical|emergency|general",'
-                '  "language": "en|fr" (Detect the user\'s language. Respond in the SAME language.)'
+                '  "intent": "appointment|medical|emergency|general"'
                 "}",
                 "Always maintain HIPAA compliance.",
                 "Process: 1. Detect language (English or French). 2. Generate spoken_response IN THAT LANGUAGE. 3. Set 'language' field.",
                 self.knowledgebase.getcontext()
             ]
             
-            if patient:
-                contextparts.append(f"Patient: {patient.name}")
-            if intent:
-                contextparts.append(f"Intent: {intent}")
-            
+            # The system prompt and history come first and stay identical from
+            # turn to turn (prefix cache); per-turn details go after the history
             systemmessage = " ".join(contextparts)
             messages = [{"role": "system", "content": systemmessage}]
-            messages.extend(conversationhistory[-8:])
+
+            if not isinstance(conversationhistory, ConversationContext):
+                conversationhistory = ConversationContext.fromhistory(conversationhistory or [])
+            history = conversationhistory.messages()
+            if history and history[-1] == {"role": "user", "content": userinput}:
+                # Callers that already appended this turn
+                history = history[:-1]
+            messages.extend(history)
+
+            turnparts = []
+            if patient:
+                turnparts.append(f"Patient: {patient.name}")
+            if intent:
+                turnparts.append(f"Intent: {intent}")
+            if turnparts:
+                messages.append({"role": "system", "content": " ".join(turnparts)})
             messages.append({"role": "user", "content": userinput})
             
-            response = ollama.chat(
-                model=config.config.LLMMODEL,
-                messages=messages,
-                format='json',
-                options={
-                    "temperature": 0.2, # Lower temperature for structure
-                    "numpredict": config.config.LLMMAXTOKENS
-                }
-            )
-            
-            json_str = response['message']['content'].strip()
+            options = {
+                "temperature": 0.2, # Lower temperature for structure
+                "numpredict": config.config.LLMMAXTOKENS
+            }
+
+            if on_fragment:
+                json_str = await self._streamchat(messages, options, on_fragment)
+            else:
+                response = await llm_client.chat(
+                    messages,
+                    format='json',
+                    options=options,
+                    priority="live",
+                    cache=True
+                )
+                json_str = response['message']['content'].strip()
             # Ensure it's valid JSON
             try:
                 parsed = json.loads(json_str)
@@ -491,6 +565,9 @@ class MedicalReceptionistAgent:
                     "metadata": {"error": "json_parse_error"}
                 })
             
+        except LLMOverloaded as e:
+            logger.warning(f"[Call {callid}] LLM shed, using rule-based reply: {e}")
+            return self._fallbackresponse()
         except Exception as e:
             logger.error(f"LLM error: {e}")
             return json.dumps({
@@ -498,6 +575,25 @@ class MedicalReceptionistAgent:
                 "metadata": {"error": str(e)}
             })
     
+    def _fallbackresponse(self) -> str:
+        """Rule-based reply used when the LLM is disabled or overloaded"""
+        return json.dumps({
+            "spoken_response": "I'm here to help! Could you tell me more about what you need?",
+            "metadata": {"intent": "fallback", "step": "0"}
+        })
+
+    async def _streamchat(self, messages: list, options: dict, on_fragment) -> str:
+        """Stream a JSON-mode completion, forwarding spoken_response as it is decoded"""
+        extractor = JSONFieldStreamer("spoken_response")
+        parts = []
+        async for part in llm_client.chat_stream(messages, format='json', options=options, priority="live", cache=True):
+            content = part['message']['content']
+            parts.append(content)
+            fragment = extractor.feed(content)
+            if fragment:
+                await on_fragment(fragment, extractor.get("language"))
+        return "".join(parts).strip()
+
     def extractpatientname(self, text: str, state: dict) -> str:
         """Extract patient name"""
         patterns = [
@@ -561,7 +657,7 @@ class MedicalReceptionistAgent:
             
             result = []
             for appt in appointments:
-                doctor = db.query(Doctor).filter(Doctor.id == appt.doctorid).first()
+                doctor = doctor_directory.get(appt.doctorid)
                 result.append({
                     "id": appt.id,
                     "date": appt.appointmentdate.strftime("%A, %B %d, %Y"),
@@ -576,67 +672,121 @@ class MedicalReceptionistAgent:
             logger.error(f"Error getting appointments: {e}")
             return []
     
-    def getavailableslots(self, doctor_id: int = None, daysahead: int = 14) -> list:
-        """Get available appointment slots (mock logic linked to DB)"""
+    def getavailableslots(self, doctor_id: int = None, daysahead: int = 14, limit: int = 10, callid: str = None) -> list:
+        """
+        Get the earliest available appointment slots (from tomorrow, see availability_service)
+
+        Slots held for other calls are skipped; callid's own holds stay visible.
+        """
         try:
             db = SessionLocal()
-            today = date.today()
-            slots = []
-            
-            # Get all doctors or specific doctor
-            query = db.query(Doctor)
-            if doctor_id:
-                query = query.filter(Doctor.id == doctor_id)
-            doctors = query.all()
-            
-            if not doctors:
+            try:
+                # Get all doctors or specific doctor
+                if doctor_id:
+                    doctor = doctor_directory.get(doctor_id)
+                    doctors = [doctor] if doctor else []
+                else:
+                    doctors = doctor_directory.all()
+                if not doctors:
+                    return []
+
+                slots = availability_service.freeslots(
+                    db, doctors, date.today() + timedelta(days=1), daysahead,
+                    shuffle=not doctor_id,  # Spread bookings when no doctor was asked for
+                    held=slot_hold_service.heldmasks(db, excludecallid=callid)
+                )
+                return list(islice(slots, limit))
+            finally:
                 db.close()
-                return []
-                
-            # Randomize doctors to check to simulate load balancing if no specific doctor
-            if not doctor_id:
-                 import random # Added import for random.shuffle
-                 random.shuffle(doctors)
-            
-            for dayoffset in range(1, daysahead + 1):
-                checkdate = today + timedelta(days=dayoffset)
-                dayname = checkdate.strftime("%A")
-                
-                if dayname not in config.config.CLINICDAYS:
-                    continue
-                
-                for doctor in doctors:
-                    if dayname in doctor.availabledays:
-                        for hour in range(9, 17):
-                            for minute in [0, 30]:
-                                slottime = time(hour, minute)
-                                
-                                existing = db.query(Appointment).filter(
-                                    Appointment.doctorid == doctor.id,
-                                    Appointment.appointmentdate == checkdate,
-                                    Appointment.appointmenttime == slottime,
-                                    Appointment.status == "scheduled"
-                                ).first()
-                                
-                                if not existing:
-                                    slots.append({
-                                        "date": checkdate.strftime("%A, %B %d"),
-                                        "time": slottime.strftime("%I:%M %p"),
-                                        "doctor": doctor.name,
-                                        "doctorid": doctor.id,
-                                        "datetime": checkdate,
-                                        "timeobj": slottime
-                                    })
-                                
-                                if len(slots) >= 10:
-                                    db.close()
-                                    return slots
-            
-            db.close()
-            return slots
         except Exception as e:
             logger.error(f"Error getting slots: {e}")
             return []
+
+    def prefetchbooking(self, callid: str, reason: str = None):
+        """Start looking up the free slots of the doctors likely to match the reason for this call"""
+        def compute() -> dict:
+            db = SessionLocal()
+            try:
+                start = date.today() + timedelta(days=1)
+                held = slot_hold_service.heldmasks(db, excludecallid=callid)
+                slots = {
+                    doctor.id: list(islice(
+                        availability_service.freeslots(db, [doctor], start, 14, held=held),
+                        config.config.PREFETCHSLOTS
+                    ))
+                    for doctor in self.specialistsfor(reason)
+                }
+                return {"slots": slots}
+            finally:
+                db.close()
+
+        self.bookingprefetch.start(callid, reason, compute)
+
+    def holdslots(self, callid: str, slots: list, count: int = 3) -> list:
+        """
+        Hold the first free slots for this call (see slot_hold_service)
+
+        Returns:
+            list: Offered slots (hold_id, date, time, doctor), JSON-safe for the
+                conversation state and response metadata
+        """
+        offers = []
+        db = SessionLocal()
+        try:
+            for slot in slot_hold_service.hold(db, callid, slots[:count]):
+                offers.append({key: slot[key] for key in ("hold_id", "date", "time", "doctor")})
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error holding slots: {e}")
+        finally:
+            db.close()
+        return offers
+
+    def pickofferedslot(self, userinput: str, offers: list) -> dict:
+        """
+        Match the user's answer to one of the offered slots
+
+        Understands ordinals ("the second one", "deuxième"), a time ("10:30",
+        "2 pm", "14h") or a day name; anything else takes the first offer.
+        """
+        if not offers:
+            return None
+        text = userinput.lower()
+
+        ordinals = [
+            ("first", "1st", "premier", "première"),
+            ("second", "2nd", "deuxième", "seconde"),
+            ("third", "3rd", "troisième")
+        ]
+        for index, words in enumerate(ordinals[:len(offers)]):
+            if any(re.search(rf"\b{word}\b", text) for word in words):
+                return offers[index]
+        if re.search(r"\b(last|dernier|dernière)\b", text):
+            return offers[-1]
+
+        match = re.search(r"\b(\d{1,2})(?:[:h](\d{2})|h)?(?!\d)\s*(am|pm|a\.m\.|p\.m\.)?", text)
+        if match:
+            hour, minute = int(match.group(1)), int(match.group(2) or 0)
+            meridiem = (match.group(3) or "").replace(".", "")
+            if meridiem == "pm" and hour < 12:
+                hour += 12
+            elif not meridiem and 1 <= hour <= 7:
+                hour += 12  # Clinic hours: "at 2" means the afternoon
+            for offer in offers:
+                offered = datetime.strptime(offer["time"], "%I:%M %p")
+                if (offered.hour, offered.minute) == (hour, minute):
+                    return offer
+
+        days = {
+            "monday": "lundi", "tuesday": "mardi", "wednesday": "mercredi", "thursday": "jeudi",
+            "friday": "vendredi", "saturday": "samedi", "sunday": "dimanche"
+        }
+        for offer in offers:
+            day = offer["date"].split(",")[0].lower()
+            if day in text or days.get(day, day) in text:
+                return offer
+
+        return offers[0]
     
     
     def send_email_notification(self, type: str, appointment: Appointment):
@@ -648,7 +798,7 @@ class MedicalReceptionistAgent:
                 user = db.query(User).filter(User.id == appointment.userid).first()
             
             if user and user.email:
-                doctor = db.query(Doctor).filter(Doctor.id == appointment.doctorid).first()
+                doctor = doctor_directory.get(appointment.doctorid)
                 doctor_name = doctor.name if doctor else "Unknown Doctor"
                 
                 if type == "confirmed":
@@ -663,8 +813,9 @@ class MedicalReceptionistAgent:
         except Exception as e:
             logger.error(f"Error triggering email service: {e}")
 
-    def createappointment(self, patientid: int, reason: str, userinput: str, userid: int = None, doctorid: int = None) -> dict:
-        """Create appointment with smart slot linking"""
+    def createappointment(self, patientid: int, reason: str, userinput: str, userid: int = None, doctorid: int = None,
+                          holdid: int = None, callid: str = None) -> dict:
+        """Create appointment with smart slot linking (the held slot when holdid is given)"""
         try:
             # Failsafe: If userid is missing but patientid exists, try to find the user
             if userid is None and patientid:
@@ -685,28 +836,22 @@ class MedicalReceptionistAgent:
                     userid = linked_user.id
                     print(f"DEBUG: Failsafe recovered userid={userid} from patientid={patientid}", flush=True)
 
-            slots = self.getavailableslots(doctor_id=doctorid)
-            
-            if not slots:
+            new_appt, selected_slot = None, None
+            if holdid:
+                new_appt = slot_hold_service.confirm(db, holdid, callid, patientid, userid, reason)
+                if new_appt:
+                    selected_slot = {
+                        "date": new_appt.appointmentdate.strftime("%A, %B %d"),
+                        "time": new_appt.appointmenttime.strftime("%I:%M %p"),
+                        "doctor": doctor_directory.get(new_appt.doctorid).name
+                    }
+                else:
+                    logger.info(f"[Call {callid}] Hold {holdid} expired or lost, booking the next free slot")
+            if not new_appt:
+                new_appt, selected_slot = self.reserveslot(db, patientid, userid, reason, doctorid, callid=callid)
+            if not new_appt:
                 db.close()
                 return None
-
-            # Simple logic: Book the first available slot 
-            # (In a real app, match 'userinput' to the specific slot time)
-            selected_slot = slots[0]
-            
-            new_appt = Appointment(
-                patientid=patientid,
-                userid=userid,
-                doctorid=selected_slot["doctorid"],
-                appointmentdate=selected_slot["datetime"],
-                appointmenttime=selected_slot["timeobj"],
-                reason=reason,
-                status="scheduled"
-            )
-            db.add(new_appt)
-            db.commit()
-            db.refresh(new_appt)
             
             # Send Notification
             try:
@@ -730,47 +875,75 @@ class MedicalReceptionistAgent:
                 db.close()
             return None
 
-    def find_doctor_by_preference(self, userinput: str, reason: str) -> Doctor:
-        """Find best matching doctor based on user preference or reason"""
-        db = SessionLocal()
-        try:
-            # 1. Check if user named a specific doctor
-            # Simple keyword search
-            all_doctors = db.query(Doctor).all()
-            for doc in all_doctors:
-                if doc.name.lower() in userinput.lower() or doc.name.split()[-1].lower() in userinput.lower():
-                    return doc
-            
-            # 2. Check for "No preference" keywords
-            no_pref_keywords = ["any", "no preference", "doesn't matter", "don't care", "whoever", "recommend"]
-            if any(k in userinput.lower() for k in no_pref_keywords):
-                # 3. Match specialty based on reason
-                reason_lower = reason.lower()
-                target_specialty = "General Practice"
-                
-                if "heart" in reason_lower or "chest" in reason_lower:
-                    target_specialty = "Cardiology"
-                elif "skin" in reason_lower or "rash" in reason_lower:
-                    target_specialty = "Dermatology"
-                elif "child" in reason_lower or "baby" in reason_lower:
-                    target_specialty = "Pediatrics"
-                elif "head" in reason_lower or "migraine" in reason_lower:
-                    target_specialty = "Neurology"
-                
-                # Find doctors with this specialty
-                specialists = db.query(Doctor).filter(Doctor.specialty == target_specialty).all()
-                if not specialists:
-                     # Fallback to General
-                     specialists = db.query(Doctor).filter(Doctor.specialty == "General Practice").all()
-                
-                if specialists:
-                    return random.choice(specialists)
-                elif all_doctors:
-                     return random.choice(all_doctors)
-            
-            return None
-        finally:
-            db.close()
+    def reserveslot(self, db, patientid: int, userid: int, reason: str, doctorid: int = None, rounds: int = 3,
+                    callid: str = None):
+        """
+        Book the earliest free slot, atomically
+
+        The unique index on scheduled (doctor, date, time) makes the insert
+        fail if another session took the slot first; we then move on to the
+        next candidate, and fetch fresh candidates once these run out.
+
+        Returns:
+            tuple: (Appointment, slot) or (None, None) when nothing is free
+        """
+        for _ in range(rounds):
+            slots = self.getavailableslots(doctor_id=doctorid, callid=callid)
+            if not slots:
+                return None, None
+            for slot in slots:
+                # Simple logic: Book the first available slot
+                # (In a real app, match 'userinput' to the specific slot time)
+                new_appt = Appointment(
+                    patientid=patientid,
+                    userid=userid,
+                    doctorid=slot["doctorid"],
+                    appointmentdate=slot["datetime"],
+                    appointmenttime=slot["timeobj"],
+                    reason=reason,
+                    status="scheduled"
+                )
+                db.add(new_appt)
+                try:
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()
+                    logger.info(f"Slot {slot['date']} {slot['time']} with {slot['doctor']} taken concurrently, trying next")
+                    # Another process booked it; look for its writes on the next read
+                    occupancy_index.invalidate()
+                    continue
+                db.refresh(new_appt)
+                occupancy_index.apply(new_appt, db)
+                return new_appt, slot
+        return None, None
+
+    def find_doctor_by_preference(self, userinput: str, reason: str):
+        """Find best matching doctor (a DoctorRecord) based on user preference or reason"""
+        # 1. Check if user named a specific doctor (full or last name)
+        doc = doctor_directory.findbyname(userinput)
+        if doc:
+            return doc
+        
+        # 2. Check for "No preference" keywords
+        no_pref_keywords = ["any", "no preference", "doesn't matter", "don't care", "whoever", "recommend"]
+        if any(k in userinput.lower() for k in no_pref_keywords):
+            # 3. Match specialty based on reason
+            specialists = self.specialistsfor(reason)
+            if specialists:
+                return random.choice(specialists)
+            doctors = doctor_directory.all()
+            if doctors:
+                 return random.choice(doctors)
+        
+        return None
+
+    def specialistsfor(self, reason: str) -> list:
+        """Doctors of the best-ranked specialty for the reason that has any (see specialty_router)"""
+        for specialty in specialty_router.specialties(reason):
+            specialists = doctor_directory.byspecialty(specialty)
+            if specialists:
+                return specialists
+        return []
             
 
     
@@ -782,6 +955,7 @@ class MedicalReceptionistAgent:
             if appointment:
                 appointment.status = "cancelled"
                 db.commit()
+                occupancy_index.apply(appointment, db)
                 db.close()
                 return True
             db.close()
@@ -0,0 +1,85 @@
+"""
+Offline re-triage of historical call transcripts
+Streams the calls table in keyset-paginated chunks and scores each chunk
+with the batch classifier/detector entry points.
+"""
+
+from array import array
+from typing import Iterator, List, NamedTuple, Tuple
+from loguru import logger
+from agent.intent_classifier import MedicalIntentClassifier
+from agent.emergency_detector import EmergencyDetector, TriageBatch
+from db.database import SessionLocal
+from db.models import Call
+
+
+class RetriageChunk(NamedTuple):
+    """Scores for one chunk of calls, aligned by position"""
+    callids: array   # 'I'
+    intents: array   # 'B' index into MedicalIntentClassifier.intentids
+    triage: TriageBatch
+
+
+def iter_call_transcripts(chunksize: int = 1000) -> Iterator[Tuple[List[int], List[str]]]:
+    """
+    Yield (call ids, transcripts) chunks without loading the whole table
+
+    Args:
+        chunksize: Rows fetched per round trip
+    """
+    lastid = 0
+    while True:
+        db = SessionLocal()
+        try:
+            rows = db.query(Call.id, Call.transcript).filter(
+                Call.id > lastid,
+                Call.transcript != None
+            ).order_by(Call.id).limit(chunksize).all()
+        finally:
+            db.close()
+
+        if not rows:
+            return
+
+        lastid = rows[-1][0]
+        yield [row[0] for row in rows], [row[1] for row in rows]
+
+
+def retriage_calls(chunksize: int = 1000, classifier: MedicalIntentClassifier = None,
+                   detector: EmergencyDetector = None) -> Iterator[RetriageChunk]:
+    """
+    Re-score every stored call transcript, one chunk at a time
+
+    Args:
+        chunksize: Calls per chunk
+        classifier: Classifier to reuse (a new one is created if omitted)
+        detector: Detector to reuse (a new one is created if omitted)
+    """
+    classifier = classifier or MedicalIntentClassifier()
+    detector = detector or EmergencyDetector()
+
+    for callids, transcripts in iter_call_transcripts(chunksize):
+        yield RetriageChunk(
+            array("I", callids),
+            classifier.classify_batch(transcripts),
+            detector.detect_batch(transcripts)
+        )
+
+
+if __name__ == "__main__":
+    classifier = MedicalIntentClassifier()
+    total = 0
+    intentcounts = [0] * len(classifier.intentids)
+    severitycounts = {}
+    codes = {code: name for name, code in EmergencyDetector.SEVERITYCODES.items()}
+
+    for chunk in retriage_calls(classifier=classifier):
+        total += len(chunk.callids)
+        for intentid in chunk.intents:
+            intentcounts[intentid] += 1
+        for code in chunk.triage.severity:
+            severitycounts[codes[code]] = severitycounts.get(codes[code], 0) + 1
+
+    logger.info(f"Re-triaged {total} calls")
+    logger.info(f"Intents: {dict(zip(classifier.intentids, intentcounts))}")
+    logger.info(f"Severities: {severitycounts}")
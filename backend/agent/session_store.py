@@ -0,0 +1,454 @@
+"""
+Conversation state store for live calls
+One compact ConversationState per call id, bounded by entry count and idle
+TTL. The voice server releases a call's state when its WebSocket closes;
+anything left behind (crashed connections, API callers) expires or is
+evicted instead of accumulating for the life of the process.
+
+Backends (SESSIONBACKEND): "memory" keeps states in this process; "sqlite"
+keeps them in a WAL-mode SQLite file so several voice workers, or a
+restarted one, can continue the same call.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Iterator, Optional
+from loguru import logger
+import config
+
+
+class ConversationState:
+    """
+    Booking/verification state of one call
+
+    Slotted for size; supports the dict-style access the agent handlers use
+    (state["verified"], state.get(...), state.update(...)). Keys outside the
+    known fields go to a lazily created extra dict.
+    """
+
+    FIELDS = (
+        "intent", "patientid", "patientname", "userid", "phone", "verified", "otid",
+        "awaitingname", "awaitingkey", "awaitingreason", "awaitingdoctorpref",
+        "appointmentreason", "selecteddoctorid", "selecteddoctorname", "offeredholds", "retrycount"
+    )
+    DEFAULTS = {
+        "verified": False, "awaitingname": False, "awaitingkey": False,
+        "awaitingreason": False, "awaitingdoctorpref": False, "retrycount": 0
+    }
+    __slots__ = FIELDS + ("extra",)
+
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, self.DEFAULTS.get(name))
+        self.extra = None
+        self.update(fields)
+
+    def __getitem__(self, key: str):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value):
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS or bool(self.extra and key in self.extra)
+
+    def get(self, key: str, default=None):
+        """Field value, or default when it is unset (None)"""
+        if key in self.FIELDS:
+            value = getattr(self, key)
+        else:
+            value = self.extra.get(key) if self.extra else None
+        return default if value is None else value
+
+    def update(self, fields: Dict):
+        for key, value in fields.items():
+            self[key] = value
+
+    def asdict(self) -> Dict:
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def sizeof(self) -> int:
+        """Approximate resident bytes (object plus field values)"""
+        size = sys.getsizeof(self)
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is not None and not isinstance(value, bool):
+                size += sys.getsizeof(value)
+        if self.extra:
+            size += sys.getsizeof(self.extra) + sum(sys.getsizeof(v) for v in self.extra.values())
+        return size
+
+    def __repr__(self) -> str:
+        return f"ConversationState({self.asdict()})"
+
+
+class SessionStore(ABC):
+    """
+    Conversation state backend interface
+
+    A turn runs inside lock(callid); while it is held, get()/[] return the
+    same ConversationState object and the store persists it when the lock is
+    released, so handlers mutate state like a dict. Calls are serialized per
+    call id: two turns for one call never interleave.
+    """
+
+    @abstractmethod
+    def get(self, callid: str, default=None) -> Optional[ConversationState]:
+        """State for a call (marks it active), or default"""
+
+    @abstractmethod
+    def create(self, callid: str, **fields) -> ConversationState:
+        """Start (or replace) a call's state"""
+
+    @abstractmethod
+    def release(self, callid: str) -> bool:
+        """Drop a call's state (call ended)"""
+
+    @abstractmethod
+    def lock(self, callid: str):
+        """Async context manager serializing turns of one call"""
+
+    @abstractmethod
+    def stats(self) -> Dict:
+        """Backend name, resident sessions and counters"""
+
+    def __getitem__(self, callid: str) -> ConversationState:
+        state = self.get(callid)
+        if state is None:
+            raise KeyError(callid)
+        return state
+
+    def __contains__(self, callid: str) -> bool:
+        return self.get(callid) is not None
+
+
+class _CallLocks:
+    """Per-call asyncio locks for this process, dropped when nobody holds or waits"""
+
+    def __init__(self):
+        self._locks: Dict[str, list] = {}  # callid -> [lock, users]
+
+    @asynccontextmanager
+    async def hold(self, callid: str):
+        entry = self._locks.setdefault(callid, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[callid]
+
+
+class MemorySessionStore(SessionStore):
+    """LRU of call id -> ConversationState with idle expiry (single process)"""
+
+    def __init__(self, maxentries: int = None, idlettl: float = None):
+        """
+        Args:
+            maxentries: Most calls kept; the least recently active is evicted beyond this
+            idlettl: Seconds without a turn after which a call's state is dropped
+        """
+        self.maxentries = maxentries or config.config.SESSIONMAXENTRIES
+        self.idlettl = idlettl or config.config.SESSIONIDLETTLSECONDS
+        self._lock = threading.Lock()
+        self._calllocks = _CallLocks()
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()  # callid -> [state, lastaccess]
+        self.created = 0
+        self.released = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _expire(self, now: float):
+        """Drop idle sessions; least recently used are first, so stop at the first live one"""
+        cutoff = now - self.idlettl
+        while self._sessions:
+            callid, entry = next(iter(self._sessions.items()))
+            if entry[1] > cutoff:
+                break
+            del self._sessions[callid]
+            self.expired += 1
+            logger.info(f"[Call {callid}] Conversation state expired after {self.idlettl:.0f}s idle")
+
+    def get(self, callid: str, default=None) -> Optional[ConversationState]:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(callid)
+            if entry is None:
+                return default
+            entry[1] = now
+            self._sessions.move_to_end(callid)
+            return entry[0]
+
+    def create(self, callid: str, **fields) -> ConversationState:
+        state = ConversationState(**fields)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._sessions[callid] = [state, now]
+            self._sessions.move_to_end(callid)
+            self.created += 1
+            while len(self._sessions) > self.maxentries:
+                evictedid, _ = self._sessions.popitem(last=False)
+                self.evicted += 1
+                logger.warning(f"[Call {evictedid}] Conversation state evicted (store full: {self.maxentries})")
+        return state
+
+    def release(self, callid: str) -> bool:
+        with self._lock:
+            if self._sessions.pop(callid, None) is None:
+                return False
+            self.released += 1
+            return True
+
+    def lock(self, callid: str):
+        # State objects are shared in memory, so there is nothing to write back
+        return self._calllocks.hold(callid)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._sessions)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._sessions))
+
+    def stats(self) -> Dict:
+        """Resident sessions, approximate memory and lifecycle counters"""
+        with self._lock:
+            self._expire(time.monotonic())
+            sessions = len(self._sessions)
+            memory = sys.getsizeof(self._sessions) + sum(
+                entry[0].sizeof() + sys.getsizeof(entry) for entry in self._sessions.values()
+            )
+        return {
+            "backend": "memory",
+            "sessions": sessions,
+            "memory_bytes": memory,
+            "max_entries": self.maxentries,
+            "idle_ttl_seconds": self.idlettl,
+            "created": self.created,
+            "released": self.released,
+            "expired": self.expired,
+            "evicted": self.evicted
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Call state in a SQLite file (WAL) shared by every worker process
+
+    Any worker, or a restarted one, can pick up a call where another left
+    it. Turns are serialized across processes with a lease row per call id,
+    renewed by a heartbeat while the turn runs; a lease left by a crashed
+    worker lapses after leaseseconds. A turn writes its state back only if
+    it still owns the lease, so a worker that lost it (stalled past the
+    lease) cannot overwrite the next owner's state. Only states of calls
+    whose turn is running in this process are held in memory.
+    """
+
+    def __init__(self, path: str = None, maxentries: int = None, idlettl: float = None,
+                 leaseseconds: float = None):
+        self.path = path or config.config.SESSIONSTOREPATH
+        self.maxentries = maxentries or config.config.SESSIONMAXENTRIES
+        self.idlettl = idlettl or config.config.SESSIONIDLETTLSECONDS
+        self.leaseseconds = leaseseconds or config.config.SESSIONLOCKSECONDS
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._calllocks = _CallLocks()
+        self._held = set()  # calls whose turn runs in this process
+        self._checkedout: Dict[str, ConversationState] = {}  # their live state objects
+        self.created = 0
+        self.released = 0
+        self.lockwaits = 0
+        self.leaseslost = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS call_sessions (callid TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_call_sessions_updated ON call_sessions (updated)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS call_locks (callid TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        logger.info(f"Session store: {self.path} (WAL, shared by workers)")
+
+    def _load(self, callid: str) -> Optional[ConversationState]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state FROM call_sessions WHERE callid = ? AND updated > ?",
+                (callid, time.time() - self.idlettl)
+            ).fetchone()
+        return ConversationState(**json.loads(row[0])) if row else None
+
+    def _save(self, callid: str, state: ConversationState, owned: bool = False) -> bool:
+        """
+        Write a call's state
+
+        Args:
+            owned: Only write while this worker holds the call's lease (turns)
+
+        Returns:
+            bool: False if the lease was lost and nothing was written
+        """
+        values = (callid, json.dumps(state.asdict(), default=str), time.time())
+        with self._lock:
+            if not owned:
+                self._db.execute("INSERT OR REPLACE INTO call_sessions (callid, state, updated) VALUES (?, ?, ?)", values)
+                return True
+            # One statement, so the ownership check and the write are atomic
+            return self._db.execute(
+                "INSERT OR REPLACE INTO call_sessions (callid, state, updated) SELECT ?, ?, ? "
+                "WHERE EXISTS (SELECT 1 FROM call_locks WHERE callid = ? AND owner = ?)",
+                values + (callid, self.owner)
+            ).rowcount > 0
+
+    def get(self, callid: str, default=None) -> Optional[ConversationState]:
+        state = self._checkedout.get(callid)
+        if state is None:
+            # Outside a turn this is a snapshot; changes are not written back
+            state = self._load(callid)
+        return default if state is None else state
+
+    def create(self, callid: str, **fields) -> ConversationState:
+        state = ConversationState(**fields)
+        owned = callid in self._held
+        if owned:
+            self._checkedout[callid] = state
+        if not self._save(callid, state, owned=owned):
+            logger.warning(f"[Call {callid}] Lease lost; new state not saved")
+        self.created += 1
+        self._trim()
+        return state
+
+    def _trim(self):
+        """Drop expired calls and the least recently active beyond maxentries"""
+        with self._lock:
+            self._db.execute("DELETE FROM call_sessions WHERE updated <= ?", (time.time() - self.idlettl,))
+            self._db.execute(
+                "DELETE FROM call_sessions WHERE callid IN ("
+                "SELECT callid FROM call_sessions ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+                (self.maxentries,)
+            )
+
+    def release(self, callid: str) -> bool:
+        self._checkedout.pop(callid, None)
+        with self._lock:
+            released = self._db.execute("DELETE FROM call_sessions WHERE callid = ?", (callid,)).rowcount > 0
+        if released:
+            self.released += 1
+        return released
+
+    def _tryacquire(self, callid: str) -> bool:
+        now = time.time()
+        with self._lock:
+            return self._db.execute(
+                "INSERT INTO call_locks (callid, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(callid) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE call_locks.expires < ?",
+                (callid, self.owner, now + self.leaseseconds, now)
+            ).rowcount > 0
+
+    def _renew(self, callid: str) -> bool:
+        """Extend this worker's lease; False if another worker has taken it"""
+        with self._lock:
+            return self._db.execute(
+                "UPDATE call_locks SET expires = ? WHERE callid = ? AND owner = ?",
+                (time.time() + self.leaseseconds, callid, self.owner)
+            ).rowcount > 0
+
+    async def _heartbeat(self, callid: str):
+        """Keep renewing the lease while a turn runs (LLM and TTS can outlast it)"""
+        while True:
+            await asyncio.sleep(self.leaseseconds / 3)
+            if not self._renew(callid):
+                self.leaseslost += 1
+                logger.warning(f"[Call {callid}] Session lease taken by another worker mid-turn")
+                return
+
+    def _releaselock(self, callid: str):
+        with self._lock:
+            self._db.execute("DELETE FROM call_locks WHERE callid = ? AND owner = ?", (callid, self.owner))
+
+    @asynccontextmanager
+    async def lock(self, callid: str):
+        async with self._calllocks.hold(callid):
+            # Another worker may be mid-turn on this call; wait for its lease
+            deadline = time.monotonic() + self.leaseseconds
+            while not self._tryacquire(callid):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Call {callid} is locked by another worker")
+                self.lockwaits += 1
+                await asyncio.sleep(0.05)
+
+            self._held.add(callid)
+            heartbeat = asyncio.ensure_future(self._heartbeat(callid))
+            try:
+                state = self._load(callid)
+                if state is not None:
+                    self._checkedout[callid] = state
+                yield
+                # Absent if the call was released during the turn
+                state = self._checkedout.get(callid)
+                if state is not None and not self._save(callid, state, owned=True):
+                    logger.warning(f"[Call {callid}] Lease lost during the turn; state not saved")
+            finally:
+                heartbeat.cancel()
+                self._held.discard(callid)
+                self._checkedout.pop(callid, None)
+                self._releaselock(callid)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            sessions = self._db.execute(
+                "SELECT COUNT(*) FROM call_sessions WHERE updated > ?", (time.time() - self.idlettl,)
+            ).fetchone()[0]
+            pages = self._db.execute("PRAGMA page_count").fetchone()[0]
+            pagesize = self._db.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "sessions": sessions,
+            "memory_bytes": sum(state.sizeof() for state in list(self._checkedout.values())),
+            "disk_bytes": pages * pagesize,
+            "active_turns": len(self._checkedout),
+            "max_entries": self.maxentries,
+            "idle_ttl_seconds": self.idlettl,
+            "created": self.created,
+            "released": self.released,
+            "lock_waits": self.lockwaits,
+            "leases_lost": self.leaseslost
+        }
+
+
+def createsessionstore() -> SessionStore:
+    """Session backend selected by SESSIONBACKEND ("memory" or "sqlite")"""
+    if config.config.SESSIONBACKEND == "sqlite":
+        return SQLiteSessionStore()
+    return MemorySessionStore()
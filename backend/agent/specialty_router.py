@@ -0,0 +1,131 @@
+"""
+Reason-for-visit to specialty routing
+Keywords and weights per specialty (English and French) live in a JSON table
+(agent/specialty_routing.json unless SPECIALTYROUTINGPATH is set). The table
+is compiled into one KeywordMatcher automaton, so routing is a single pass
+over the reason however many specialties and phrases the table holds. The
+file is reloaded when its modification time or size changes; a table that
+fails to load leaves the previous one in place.
+"""
+
+import json
+import os
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+import config
+from agent.keyword_matcher import KeywordMatcher
+
+DEFAULTPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "specialty_routing.json")
+PLURALSUFFIXES = ("s", "x", "es")
+
+
+def foldtext(text: str) -> str:
+    """Lowercase without accents ("Fièvre" -> "fievre")"""
+    decomposed = unicodedata.normalize("NFD", (text or "").lower())
+    return unicodedata.normalize("NFC", "".join(ch for ch in decomposed if not unicodedata.combining(ch)))
+
+
+class SpecialtyRouter:
+    """Ranks specialties for a reason for visit from a weighted keyword table"""
+
+    MATCHERNAMESPACE = "specialty_router"
+
+    def __init__(self, path: str = None):
+        """
+        Args:
+            path: JSON table {"fallback": specialty, "specialties": {specialty: {keyword: weight}}}
+        """
+        self.path = path or config.config.SPECIALTYROUTINGPATH or DEFAULTPATH
+        self._lock = threading.Lock()
+        # Swapped as a whole on reload: (matcher, specialty -> weight per keyword rank,
+        # specialty -> position in the table for tie-breaks)
+        self._compiled: Tuple[KeywordMatcher, Dict[str, List[float]], Dict[str, int]] = (KeywordMatcher(), {}, {})
+        self.fallback = "General Practice"
+        self._signature: Optional[Tuple[float, int]] = None
+        self.loads = 0
+
+    def _reload(self):
+        """Recompile the table if the file changed since the last load"""
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            if self._signature is not None:
+                return
+            logger.error(f"Specialty routing table unavailable: {e}")
+            self._signature = (0.0, -1)
+            return
+        signature = (stat.st_mtime, stat.st_size)
+        if signature == self._signature:
+            return
+
+        with self._lock:
+            if signature == self._signature:
+                return
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    table = json.load(f)
+                keywords, weights = {}, {}
+                for specialty, phrases in table["specialties"].items():
+                    folded = {foldtext(phrase).strip(): float(weight) for phrase, weight in phrases.items()}
+                    folded.pop("", None)
+                    keywords[specialty] = list(folded)
+                    weights[specialty] = list(folded.values())
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                logger.error(f"Invalid specialty routing table {self.path}: {e}")
+                self._signature = signature
+                return
+
+            matcher = KeywordMatcher()
+            matcher.register(self.MATCHERNAMESPACE, keywords)
+            self._compiled = (matcher, weights, {specialty: position for position, specialty in enumerate(keywords)})
+            self.fallback = table.get("fallback", self.fallback)
+            self._signature = signature
+            self.loads += 1
+        logger.info(f"Specialty routing loaded: {len(keywords)} specialties, "
+                    f"{sum(len(k) for k in keywords.values())} phrases")
+
+    def rank(self, reason: str) -> List[Tuple[str, float]]:
+        """
+        Specialties matching the reason, best first
+
+        Phrases only count as whole words (a trailing plural s/x/es is
+        allowed), each distinct phrase once.
+
+        Returns:
+            List[Tuple[str, float]]: (specialty, score) pairs; empty when nothing matched
+        """
+        self._reload()
+        text = foldtext(reason)
+        matcher, weights, order = self._compiled
+        scores: Dict[str, float] = {}
+        seen = set()
+        for hit in matcher.scan(text, self.MATCHERNAMESPACE):
+            if hit.start > 0 and text[hit.start - 1].isalnum():
+                continue
+            tail = text[hit.end:hit.end + 3]
+            if tail[:1].isalnum() and not any(
+                tail.startswith(suffix) and not tail[len(suffix):len(suffix) + 1].isalnum()
+                for suffix in PLURALSUFFIXES
+            ):
+                continue
+            if (hit.category, hit.keyword) in seen:
+                continue
+            seen.add((hit.category, hit.keyword))
+            scores[hit.category] = scores.get(hit.category, 0.0) + weights[hit.category][hit.rank]
+        return sorted(scores.items(), key=lambda item: (-item[1], order[item[0]]))
+
+    def specialties(self, reason: str) -> List[str]:
+        """Ranked specialties for the reason, ending with the fallback specialty"""
+        ranked = [specialty for specialty, _ in self.rank(reason)]
+        if self.fallback not in ranked:
+            ranked.append(self.fallback)
+        return ranked
+
+    def stats(self) -> Dict:
+        return {"path": self.path, "specialties": len(self._compiled[1]), "loads": self.loads}
+
+
+# Singleton instance
+specialty_router = SpecialtyRouter()
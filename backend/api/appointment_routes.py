@@ -14,7 +14,7 @@ async def get_my_appointments(
     result = []
     for appt in appointments:
         # Get doctor info
-        doctor = db.query(Doctor).filter(Doctor.id == appt.doctorid).first()
+        doctor = doctor_directory.get(appt.doctorid)
         
         appt_dict = {
             "id": appt.id,
@@ -52,7 +52,7 @@ async def get_all_appointments_admin(
     result = []
     for appt in appointments:
         user = db.query(User).filter(User.id == appt.userid).first() if appt.userid else None
-        doctor = db.query(Doctor).filter(Doctor.id == appt.doctorid).first()
+        doctor = doctor_directory.get(appt.doctorid)
         patient = db.query(Patient).filter(Patient.id == appt.patientid).first() if appt.patientid else None
         
         appt_dict = {
@@ -5,13 +5,15 @@ Billing API Routes - FastAPI endpoints for Pulse Ledger module
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime
 import secrets
 
 from db.database import getdb
-from db.billing import Bill, BillItem, Payment, InsuranceClaim, CostPrediction
+from db.billing import Bill, BillItem, Payment, InsuranceClaim
 from db.models import Patient
 from services.ai_insights_service import ai_insights_service
+from services.bill_explanation_service import bill_explanation_service
+from services.insight_jobs import enqueuecostprediction
 from services.payment_service import payment_service
 
 router = APIRouter(prefix="/api/billing", tags=["billing"])
@@ -44,19 +46,16 @@ def get_bill_details(bill_id: int, db: Session = Depends(getdb)):
         # Get bill items
         items = db.query(BillItem).filter(BillItem.bill_id == bill_id).all()
         
-        # Generate AI explanations for items without them
-        for item in items:
-            if not item.ai_explanation:
-                item.ai_explanation = ai_insights_service.generate_bill_explanation(
-                    item.description,
-                    item.category,
-                    f"Bill #{bill.bill_number}"
-                )
-                db.commit()
+        # Explanations come from the shared store; missing ones are generated
+        # by a queued job and show up on the next view
+        missing = bill_explanation_service.backfill(db, items)
+        job = bill_explanation_service.schedule(missing) if missing else None
 
         return {
             "bill": bill,
             "items": items,
+            "explanations_pending": len(missing),
+            "explanations_job_id": job["job_id"] if job else None,
             "summary": {
                 "total_amount": bill.total_amount,
                 "insurance_covered": bill.insurance_covered,
@@ -79,26 +78,15 @@ def predict_cost(patient_id: int, visit_type: str, db: Session = Depends(getdb))
         past_bills = db.query(Bill).filter(Bill.patient_id == patient_id).all()
         history = [{"total": b.total_amount, "type": "general"} for b in past_bills]
 
-        # Generate prediction
-        prediction = ai_insights_service.predict_visit_cost(history, visit_type)
-        
-        # Save prediction to database
-        cost_pred = CostPrediction(
-            patient_id=patient_id,
-            predicted_visit_type=visit_type,
-            predicted_min_cost=prediction["min_cost"],
-            predicted_max_cost=prediction["max_cost"],
-            predicted_avg_cost=prediction["avg_cost"],
-            confidence_level=prediction["confidence"],
-            breakdown=prediction["breakdown"],
-            valid_until=datetime.now() + timedelta(days=30)
-        )
-        db.add(cost_pred)
-        db.commit()
+        # Queued; repeated requests with the same history reuse the same job
+        job = enqueuecostprediction(patient_id, visit_type, history)
+        result = job["result"] if job["status"] == "done" else {}
 
         return {
-            "prediction": prediction,
-            "valid_until": cost_pred.valid_until,
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "prediction": result.get("prediction"),
+            "valid_until": result.get("valid_until"),
             "note": "Prediction based on historical billing data and clinic averages"
         }
     except Exception as e:
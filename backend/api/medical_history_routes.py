@@ -11,7 +11,7 @@ import secrets
 from db.database import getdb
 from db.medical_history import MedicalEvent, AnatomicalLocation, AIInsight, SharedVault
 from db.models import Patient
-from services.ai_insights_service import ai_insights_service
+from services.insight_jobs import enqueueeventinsights
 from services.encryption_service import encryption_service
 
 router = APIRouter(prefix="/api/history", tags=["medical_history"])
@@ -140,53 +140,18 @@ def get_history_by_anatomy(patient_id: int, db: Session = Depends(getdb)):
 # Generate AI insights for a medical event
 @router.post("/insights/generate")
 def generate_insights(event_id: int, db: Session = Depends(getdb)):
-    """Generate AI-powered insights for a medical event"""
+    """Queue AI-powered insights for a medical event (poll /api/jobs/{job_id})"""
     try:
         event = db.query(MedicalEvent).filter(MedicalEvent.id == event_id).first()
         if not event:
             raise HTTPException(status_code=404, detail="Medical event not found")
 
-        event_data = {
-            "event_type": event.event_type,
-            "title": event.title,
-            "description": event.description,
-            "event_date": str(event.event_date),
-            "severity": event.severity,
-            "status": event.status
-        }
-
-        # Generate different types of insights
-        insights_generated = []
-
-        # Key takeaway
-        takeaway = ai_insights_service.generate_medical_event_summary(event_data)
-        insight_takeaway = AIInsight(
-            medical_event_id=event_id,
-            insight_type="key_takeaway",
-            content=takeaway,
-            confidence_score=0.85
-        )
-        db.add(insight_takeaway)
-        insights_generated.append(insight_takeaway)
-
-        # Follow-up recommendation
-        if event.status in ["active", "follow_up_needed"]:
-            recommendation = ai_insights_service.generate_follow_up_recommendation(event_data)
-            insight_recommendation = AIInsight(
-                medical_event_id=event_id,
-                insight_type="recommendation",
-                content=recommendation,
-                confidence_score=0.80
-            )
-            db.add(insight_recommendation)
-            insights_generated.append(insight_recommendation)
-
-        db.commit()
+        # Queued per insight type; an unchanged event reuses its existing jobs
+        jobs = enqueueeventinsights(event)
 
         return {
             "event_id": event_id,
-            "insights_generated": len(insights_generated),
-            "insights": insights_generated
+            "jobs": [{"job_id": job["job_id"], "status": job["status"]} for job in jobs]
         }
     except HTTPException:
         raise
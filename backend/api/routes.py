@@ -2,8 +2,14 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from db.database import getdb
-from db.models import Patient, Doctor, Appointment, Call, MedicalKnowledge, User, TempCall
+from db.models import Patient, Doctor, Appointment, Call, User, TempCall
+from db.knowledge_search import searchknowledge as searchknowledgeindex
+from services.llm_client import llm_client
+from services.job_queue import job_queue
+from services.availability_service import occupancy_index
+from services.doctor_directory import doctor_directory
 from auth import (
     get_password_hash,
     verify_password,
@@ -188,6 +194,7 @@ async def delete_user(
     
     db.delete(user)
     db.commit()
+    doctor_directory.invalidate()  # A doctor's account may be gone
     return {"message": "User deleted successfully"}
 
 
@@ -219,9 +226,9 @@ async def searchpatients(name: str, db: Session = Depends(getdb)):
 
 # Doctors
 @router.get("/doctors")
-async def getdoctors(db: Session = Depends(getdb)):
+async def getdoctors():
     """Get all doctors"""
-    doctors = db.query(Doctor).all()
+    doctors = doctor_directory.all()
     return [
         {
             "id": d.id,
@@ -283,7 +290,7 @@ async def getupcomingappointments(db: Session = Depends(getdb)):
     result = []
     for appt in appointments:
         patient = db.query(Patient).filter(Patient.id == appt.patientid).first()
-        doctor = db.query(Doctor).filter(Doctor.id == appt.doctorid).first()
+        doctor = doctor_directory.get(appt.doctorid)
 
         result.append(
             {
@@ -314,7 +321,7 @@ async def gettodayappointments(db: Session = Depends(getdb)):
     result = []
     for appt in appointments:
         patient = db.query(Patient).filter(Patient.id == appt.patientid).first()
-        doctor = db.query(Doctor).filter(Doctor.id == appt.doctorid).first()
+        doctor = doctor_directory.get(appt.doctorid)
 
         result.append(
             {
@@ -421,16 +428,28 @@ async def getanalytics(db: Session = Depends(getdb)):
     }
 
 
+# LLM scheduler metrics (this process)
+@router.get("/llm/metrics")
+async def getllmmetrics():
+    """Queue depth, wait and service times per LLM priority class"""
+    return llm_client.stats()
+
+
+# Background job status (AI insights, bill explanations, cost predictions)
+@router.get("/jobs/{job_id}")
+async def getjobstatus(job_id: int):
+    """Status and result of a queued job"""
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 # Medical Knowledge
 @router.get("/knowledge/search")
 async def searchknowledge(query: str, db: Session = Depends(getdb)):
     """Search medical knowledge base"""
-    results = (
-        db.query(MedicalKnowledge)
-        .filter(MedicalKnowledge.term.ilike(f"%{query}%") | MedicalKnowledge.description.ilike(f"%{query}%"))
-        .limit(5)
-        .all()
-    )
+    results = searchknowledgeindex(db, query, limit=5)
 
     return [
         {"id": k.id, "category": k.category, "term": k.term, "description": k.description, "severity": k.severity}
@@ -444,7 +463,7 @@ async def get_doctor_schedule(
 ):
     """Get appointments for the logged-in doctor"""
     # 1. Find the Doctor profile linked to this user
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
+    doctor = doctor_directory.foruser(current_user.id)
     if not doctor:
         raise HTTPException(status_code=403, detail="User is not a doctor")
     
@@ -515,24 +534,24 @@ async def create_doctor_account(
     )
     db.add(new_doctor)
     db.commit()
+    doctor_directory.invalidate()
     
     return new_user
 
 
 @router.get("/doctors")
 async def get_all_doctors(
-    current_user: User = Depends(require_role("admin")),
-    db: Session = Depends(getdb)
+    current_user: User = Depends(require_role("admin"))
 ):
     """List all doctors (Admin only)"""
-    doctors = db.query(Doctor).all()
+    doctors = doctor_directory.all()
     return [{
         "id": d.id, 
         "name": d.name, 
         "specialty": d.specialty, 
         "email": d.email,
         "phone": d.phone,
-        "username": d.user.username if d.user else "N/A"
+        "username": d.username or "N/A"
     } for d in doctors]
 
 # Get current user's appointments
@@ -554,7 +573,7 @@ async def get_my_appointments(
     result = []
     for appt in appointments:
         # Get doctor info
-        doctor = db.query(Doctor).filter(Doctor.id == appt.doctorid).first()
+        doctor = doctor_directory.get(appt.doctorid)
         
         appt_dict = {
             "id": appt.id,
@@ -592,7 +611,7 @@ async def get_all_appointments_admin(
     result = []
     for appt in appointments:
         user = db.query(User).filter(User.id == appt.userid).first() if appt.userid else None
-        doctor = db.query(Doctor).filter(Doctor.id == appt.doctorid).first()
+        doctor = doctor_directory.get(appt.doctorid)
         patient = db.query(Patient).filter(Patient.id == appt.patientid).first() if appt.patientid else None
         
         appt_dict = {
@@ -648,12 +667,29 @@ async def update_appointment_admin(
         appt.notes = notes
     
     appt.updatedat = datetime.now()
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="The doctor already has an appointment in that slot")
     db.refresh(appt)
+    occupancy_index.apply(appt, db)
     
     return {"message": "Appointment updated successfully", "id": appt.id}
 
 
+# Occupancy index consistency (admin only)
+@router.post("/admin/occupancy/check")
+async def check_occupancy_index(
+    repair: bool = True,
+    current_user: User = Depends(require_role("admin")),
+    db: Session = Depends(getdb)
+):
+    """Compare the in-memory occupancy index with the appointments table (rebuilds on mismatch)"""
+    mismatches = occupancy_index.check(db, repair=repair)
+    return {"consistent": not mismatches, "mismatches": mismatches, "index": occupancy_index.stats()}
+
+
 # Delete appointment (admin only)
 @router.delete("/admin/appointments/{appointment_id}")
 async def delete_appointment_admin(
@@ -668,5 +704,6 @@ async def delete_appointment_admin(
     
     db.delete(appt)
     db.commit()
+    occupancy_index.remove(appointment_id, db)
     
     return {"message": "Appointment deleted successfully", "id": appointment_id}
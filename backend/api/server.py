@@ -2,6 +2,8 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api.routes import router
 from db.database import initdatabase
+from services.job_queue import job_queue
+from services.availability_service import occupancy_index
 from loguru import logger
 import config
 
@@ -31,6 +33,8 @@ async def startup_event():
     logger.info(f"Starting {config.config.APPNAME} v{config.config.VERSION}")
     initdatabase()
     logger.info("Database initialized")
+    job_queue.start()
+    occupancy_index.build()
 
 
 @app.get("/")
@@ -12,6 +12,7 @@ class Settings(BaseSettings):
     APIHOST: str = "0.0.0.0"
     APIPORT: int = 8000
     VOICEPORT: int = 8003
+    VOICEWORKERS: int = 1  # More than one needs SESSIONBACKEND="sqlite"
     
     # Database
     DATABASEURL: str = "sqlite:///./medicalreceptionist.db"
@@ -21,9 +22,24 @@ class Settings(BaseSettings):
     LLMMODEL: str = "llama3.1:8b"  # Optimal for medical conversations
     LLMTEMPERATURE: float = 0.7
     LLMMAXTOKENS: int = 150
+    LLMTIMEOUTSECONDS: float = 30.0
+    LLMMAXCONCURRENCY: int = 4  # Completions sent to Ollama at once (all callers)
+    LLMRESERVEDLIVESLOTS: int = 1  # Part of that window kept free for live call turns
+    LLMQUEUELIMITS: dict = {"live": 8, "interactive": 16, "background": 32}
+    LLMCACHEENABLED: bool = True
+    LLMCACHEMAXENTRIES: int = 2000
+    LLMCACHETTLSECONDS: int = 86400
+    LLMCACHEPATH: str = ""  # e.g. "./llmcache.db" to keep patient-free cached completions across restarts
+    LLMCONTEXTTOKENS: int = 768  # Conversation history sent with each turn (approximate tokens)
+    LLMSUMMARYTOKENS: int = 128  # Rolling summary of turns beyond that budget
+
+    # Background Jobs (AI insights, bill explanations, cost predictions)
+    JOBWORKERS: int = 2
+    JOBSTALESECONDS: int = 600  # A running job older than this is assumed lost and requeued
     
     # MIMIC-IV Configuration
     MIMICDATAPATH: str = "./mimicdata"
+    KNOWLEDGEINDEXSYNCSECONDS: float = 10.0  # How often the Q&A index looks for rows loaded by other processes
     ENABLEMEDICALQA: bool = True
     
     # Emergency Keywords
@@ -38,10 +54,32 @@ class Settings(BaseSettings):
     CLINICHOURSSTART: str = "08:00"
     CLINICHOURSEND: str = "17:00"
     CLINICDAYS: list = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+    OCCUPANCYHORIZONDAYS: int = 60  # Days kept in the in-memory occupancy index
+    OCCUPANCYSYNCSECONDS: float = 5.0  # How often to look for appointment writes by other processes
+    DOCTORCACHESYNCSECONDS: float = 30.0  # How often the doctor directory looks for changes by other processes
+    SPECIALTYROUTINGPATH: str = ""  # Reason -> specialty keyword table (default: agent/specialty_routing.json)
+    SLOTHOLDSECONDS: int = 300  # How long offered slots stay reserved for the caller
+    SLOTHOLDSWEEPSECONDS: float = 30.0  # How often expired holds are deleted
+    PREFETCHWORKERS: int = 2  # Threads looking up doctors/slots ahead of the booking dialogue
+    PREFETCHMAXAGESECONDS: float = 120.0  # Older prefetched slots are looked up again
+    PREFETCHWAITSECONDS: float = 1.0  # How long a turn waits for a running prefetch
+    PREFETCHSLOTS: int = 6  # Free slots prefetched per likely doctor
+
+    # Call Sessions (agent conversation state)
+    SESSIONBACKEND: str = "memory"  # "sqlite" to share calls between voice workers
+    SESSIONSTOREPATH: str = "./sessions.db"
+    SESSIONMAXENTRIES: int = 1000
+    SESSIONIDLETTLSECONDS: int = 1800
+    SESSIONLOCKSECONDS: float = 60.0  # Longest a turn may hold its call (lease for crashed workers)
     
     # Voice Settings
     SPEECHRATE: float = 1.2  # 20% faster
     ENABLEVOICERECORDING: bool = True
+    TTSPOOLSIZE: int = 2  # Warm Piper voices per language
+    TTSTIMEOUTSECONDS: float = 10.0
+    TTSCACHEDIR: str = "./ttscache"
+    TTSCACHEMEMORYMB: int = 64
+    TTSCACHEDISKMB: int = 512
 
     # Email Settings (SMTP)
     SMTPSERVER: str = "smtp.gmail.com"  # e.g., smtp.gmail.com, smtp.sendgrid.net
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, ForeignKey, JSON, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -50,6 +50,18 @@ class BillItem(Base):
     bill = relationship("Bill", back_populates="items")
 
 
+class BillExplanation(Base):
+    """AI explanation of a charge, shared by every bill line with the same description and category"""
+    __tablename__ = "bill_explanations"
+    __table_args__ = (UniqueConstraint("description_key", "category", name="uq_bill_explanation"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    description_key = Column(String, nullable=False)  # Normalized BillItem.description
+    category = Column(String, nullable=False)
+    explanation = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.now)
+
+
 class Payment(Base):
     """Payment transactions"""
     __tablename__ = "payments"
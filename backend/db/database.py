@@ -25,5 +25,26 @@ def getdb():
 def initdatabase():
     """Initialize database with tables"""
     from db.models import Base
+    from db import jobs  # noqa: F401 (registers the jobs table)
+    from db.knowledge_search import initknowledgesearch
     Base.metadata.create_all(bind=engine)
-    logger.info("Database initialized successfully")
\ No newline at end of file
+    createappointmentslotindex()
+    initknowledgesearch()
+    logger.info("Database initialized successfully")
+
+
+def createappointmentslotindex():
+    """
+    Unique index against double booking, also on databases created before it existed
+    (create_all only adds indexes together with new tables)
+    """
+    from db.models import Appointment
+    for index in Appointment.__table__.indexes:
+        if index.name == "uq_appointment_scheduled_slot":
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                logger.error(
+                    f"Could not create {index.name} (existing double bookings?): {e}. "
+                    "Resolve duplicate scheduled appointments and restart."
+                )
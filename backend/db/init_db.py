@@ -163,15 +163,21 @@ def seeddatabase():
                 )
             )
         
-        # Future appointments
-        for i in range(5):
-            futuredate = today + timedelta(days=random.randint(1, 14))
+        # Future appointments (distinct slots: scheduled slots are unique per doctor)
+        futureslots = set()
+        while len(futureslots) < 5:
+            futureslots.add((
+                random.randint(1, 4),
+                today + timedelta(days=random.randint(1, 14)),
+                time(random.randint(9, 16), random.choice([0, 30]))
+            ))
+        for doctorid, futuredate, futuretime in futureslots:
             appointments.append(
                 Appointment(
                     patientid=random.randint(1, 5),
-                    doctorid=random.randint(1, 4),
+                    doctorid=doctorid,
                     appointmentdate=futuredate,
-                    appointmenttime=time(random.randint(9, 16), random.choice([0, 30])),
+                    appointmenttime=futuretime,
                     reason=random.choice([
                         "Annual checkup",
                         "Follow-up visit",
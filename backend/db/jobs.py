@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON
+from datetime import datetime
+
+from db.models import Base
+
+
+class Job(Base):
+    """Background work item (AI insights, bill explanations, cost predictions)"""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String, nullable=False, index=True)  # event_insight, bill_explanations, cost_prediction
+    dedup_key = Column(String, unique=True, nullable=False)  # Identical work maps to the same job
+    payload = Column(JSON)
+    status = Column(String, default="queued", index=True)  # queued, running, done, failed
+    result = Column(JSON)
+    error = Column(Text)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
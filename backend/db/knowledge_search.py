@@ -0,0 +1,178 @@
+"""
+Full-text search over the medicalknowledge table
+Uses an SQLite FTS5 index (kept in sync by triggers) when available and a
+tokenized, ranked LIKE search on other backends.
+"""
+
+import re
+from typing import List, Optional
+from sqlalchemy import or_, text
+from sqlalchemy.orm import Session
+from loguru import logger
+from db.database import engine
+from db.models import MedicalKnowledge
+
+FTSTABLE = "medicalknowledge_fts"
+
+# Column weights for ranking: a hit in the term outranks one in the description
+TERMWEIGHT = 10.0
+DESCRIPTIONWEIGHT = 2.0
+SYMPTOMSWEIGHT = 1.0
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "can", "do", "does", "for", "from", "have",
+    "how", "i", "if", "in", "is", "it", "me", "my", "of", "on", "or", "should", "the",
+    "to", "what", "when", "with", "you", "your", "about", "tell", "know", "normal",
+    "le", "la", "les", "de", "des", "du", "un", "une", "et", "est", "que", "qu", "je", "j",
+    "mon", "ma", "mes", "pour", "avec", "c", "ce", "quoi", "comment"
+}
+
+FTSDDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTSTABLE} USING fts5(
+        term, description, commonsymptoms,
+        content='medicalknowledge', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS medicalknowledge_fts_ai AFTER INSERT ON medicalknowledge BEGIN
+        INSERT INTO {FTSTABLE}(rowid, term, description, commonsymptoms)
+        VALUES (new.id, new.term, new.description, new.commonsymptoms);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS medicalknowledge_fts_ad AFTER DELETE ON medicalknowledge BEGIN
+        INSERT INTO {FTSTABLE}({FTSTABLE}, rowid, term, description, commonsymptoms)
+        VALUES ('delete', old.id, old.term, old.description, old.commonsymptoms);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS medicalknowledge_fts_au AFTER UPDATE ON medicalknowledge BEGIN
+        INSERT INTO {FTSTABLE}({FTSTABLE}, rowid, term, description, commonsymptoms)
+        VALUES ('delete', old.id, old.term, old.description, old.commonsymptoms);
+        INSERT INTO {FTSTABLE}(rowid, term, description, commonsymptoms)
+        VALUES (new.id, new.term, new.description, new.commonsymptoms);
+    END""",
+]
+
+_ftsready = None
+
+
+def tokenize(query: str) -> List[str]:
+    """Split a free-text question into distinct search tokens"""
+    tokens = []
+    for token in re.findall(r"\w+", query.lower()):
+        if len(token) > 1 and token not in STOPWORDS and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+def initknowledgesearch():
+    """Create the FTS5 index and its sync triggers, rebuilding it if it is out of date"""
+    global _ftsready
+    if engine.dialect.name != "sqlite":
+        _ftsready = False
+        return
+
+    try:
+        with engine.begin() as conn:
+            for statement in FTSDDL:
+                conn.exec_driver_sql(statement)
+
+            # Rows inserted before the triggers existed are missing from the index
+            indexed = conn.exec_driver_sql(f"SELECT count(*) FROM {FTSTABLE}_docsize").scalar()
+            stored = conn.exec_driver_sql("SELECT count(*) FROM medicalknowledge").scalar()
+            if indexed != stored:
+                conn.exec_driver_sql(f"INSERT INTO {FTSTABLE}({FTSTABLE}) VALUES ('rebuild')")
+                logger.info(f"Rebuilt medical knowledge search index ({stored} rows)")
+        _ftsready = True
+    except Exception as e:
+        logger.warning(f"FTS5 unavailable, using fallback knowledge search: {e}")
+        _ftsready = False
+
+
+def _isftsready(db: Session) -> bool:
+    global _ftsready
+    if _ftsready is None:
+        if engine.dialect.name != "sqlite":
+            _ftsready = False
+        else:
+            _ftsready = db.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": FTSTABLE}
+            ).first() is not None
+    return _ftsready
+
+
+def searchknowledge(db: Session, query: str, limit: int = 3, category: Optional[str] = None,
+                    severity: Optional[str] = None) -> List[MedicalKnowledge]:
+    """
+    Ranked full-text search over term, description and commonsymptoms
+
+    Args:
+        db: Database session
+        query: Free-text user question
+        limit: Maximum number of results
+        category: Only return rows of this category
+        severity: Only return rows of this severity
+
+    Returns:
+        List[MedicalKnowledge]: Best matches first
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    if _isftsready(db):
+        return _ftssearch(db, tokens, limit, category, severity)
+    return _fallbacksearch(db, tokens, limit, category, severity)
+
+
+def _ftssearch(db: Session, tokens: List[str], limit: int, category: Optional[str],
+               severity: Optional[str]) -> List[MedicalKnowledge]:
+    matchquery = " OR ".join(f'"{token}"*' for token in tokens)
+    sql = (
+        f"SELECT k.id FROM {FTSTABLE} f JOIN medicalknowledge k ON k.id = f.rowid "
+        f"WHERE {FTSTABLE} MATCH :match"
+    )
+    params = {"match": matchquery, "limit": limit}
+    if category:
+        sql += " AND k.category = :category"
+        params["category"] = category
+    if severity:
+        sql += " AND k.severity = :severity"
+        params["severity"] = severity
+    sql += f" ORDER BY bm25({FTSTABLE}, {TERMWEIGHT}, {DESCRIPTIONWEIGHT}, {SYMPTOMSWEIGHT}) LIMIT :limit"
+
+    ids = [row[0] for row in db.execute(text(sql), params)]
+    if not ids:
+        return []
+
+    rows = {row.id: row for row in db.query(MedicalKnowledge).filter(MedicalKnowledge.id.in_(ids)).all()}
+    return [rows[i] for i in ids if i in rows]
+
+
+def _fallbacksearch(db: Session, tokens: List[str], limit: int, category: Optional[str],
+                    severity: Optional[str], candidates: int = 200) -> List[MedicalKnowledge]:
+    """Token-wise LIKE search with weighted scoring (non-SQLite backends)"""
+    clauses = []
+    for token in tokens:
+        pattern = f"%{token}%"
+        clauses.extend([
+            MedicalKnowledge.term.ilike(pattern),
+            MedicalKnowledge.description.ilike(pattern),
+            MedicalKnowledge.commonsymptoms.ilike(pattern)
+        ])
+
+    query = db.query(MedicalKnowledge).filter(or_(*clauses))
+    if category:
+        query = query.filter(MedicalKnowledge.category == category)
+    if severity:
+        query = query.filter(MedicalKnowledge.severity == severity)
+
+    def score(row: MedicalKnowledge) -> float:
+        term = (row.term or "").lower()
+        description = (row.description or "").lower()
+        symptoms = (row.commonsymptoms or "").lower()
+        return sum(
+            TERMWEIGHT * (token in term) + DESCRIPTIONWEIGHT * (token in description) + SYMPTOMSWEIGHT * (token in symptoms)
+            for token in tokens
+        )
+
+    results = query.limit(candidates).all()
+    results.sort(key=score, reverse=True)
+    return results[:limit]
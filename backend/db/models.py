@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, ForeignKey, Date, Time
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, ForeignKey, Date, Time, Index, UniqueConstraint, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -55,6 +55,15 @@ class Doctor(Base):
 class Appointment(Base):
     """Appointment scheduling"""
     __tablename__ = "appointments"
+    __table_args__ = (
+        # One scheduled appointment per doctor and slot; cancelled/completed rows don't count
+        Index(
+            "uq_appointment_scheduled_slot", "doctorid", "appointmentdate", "appointmenttime",
+            unique=True,
+            sqlite_where=text("status = 'scheduled'"),
+            postgresql_where=text("status = 'scheduled'")
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patientid = Column(Integer, ForeignKey("patients.id"), nullable=True)  # Made nullable for user-based appointments
@@ -75,6 +84,20 @@ class Appointment(Base):
     doctor = relationship("Doctor", back_populates="appointments")
 
 
+class SlotHold(Base):
+    """Slot offered to a caller, reserved for them until it expires or is confirmed"""
+    __tablename__ = "slot_holds"
+    __table_args__ = (UniqueConstraint("doctorid", "slotdate", "slottime", name="uq_slot_hold"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    callid = Column(String, nullable=False, index=True)
+    doctorid = Column(Integer, ForeignKey("doctors.id"), nullable=False)
+    slotdate = Column(Date, nullable=False)
+    slottime = Column(Time, nullable=False)
+    expiresat = Column(DateTime, nullable=False, index=True)
+    createdat = Column(DateTime, default=datetime.now)
+
+
 class Call(Base):
     """Call records"""
     __tablename__ = "calls"
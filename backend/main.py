@@ -11,6 +11,8 @@ from api import routes
 from api.billing_routes import router as billing_router
 from api.medical_history_routes import router as medical_history_router
 from db.init_db import seeddatabase
+from services.job_queue import job_queue
+from services.availability_service import occupancy_index
 import config
 
 app = FastAPI(title=config.config.APPNAME, version=config.config.VERSION)
@@ -42,6 +44,10 @@ def initialize():
     except Exception as e:
         logger.warning(f"Database already initialized or seeding failed: {e}")
 
+    # Resume background jobs left over from the last run
+    job_queue.start()
+    occupancy_index.build()
+
     logger.info("Initialization complete")
 
 
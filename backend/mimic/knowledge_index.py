@@ -0,0 +1,320 @@
+"""
+In-memory BM25 index over MedicalKnowledge
+Serves MedicalQAEngine lookups without touching the database. Postings are
+stored as typed arrays per term; the index can be snapshotted to disk and
+refreshed incrementally as new rows are loaded. Rows are loaded by a
+separate process (mimic_loader), so searches check the table's row count
+and max id every KNOWLEDGEINDEXSYNCSECONDS: new rows are indexed
+incrementally, and a table that shrank (reset/reloaded DB) is rebuilt.
+"""
+
+import math
+import os
+import pickle
+import re
+import threading
+import time
+from array import array
+from typing import Dict, List, NamedTuple, Optional
+import numpy as np
+from loguru import logger
+from sqlalchemy import func
+from db.database import SessionLocal
+from db.models import MedicalKnowledge
+import config
+
+SNAPSHOTVERSION = 1
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "can", "do", "does", "for", "from", "have",
+    "how", "i", "if", "in", "is", "it", "me", "my", "of", "on", "or", "should", "the",
+    "to", "what", "when", "with", "you", "your", "about", "tell", "know", "n", "na"
+}
+
+
+class KnowledgeEntry(NamedTuple):
+    """Detached copy of a MedicalKnowledge row"""
+    id: int
+    category: str
+    term: str
+    description: str
+    icdcode: str
+    severity: str
+    commonsymptoms: str
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords dropped and plurals folded"""
+    tokens = []
+    for token in re.findall(r"\w+", (text or "").lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class KnowledgeIndex:
+    """BM25 inverted index with array-backed postings"""
+
+    # Field weights (a term hit counts more than a symptom hit)
+    FIELDWEIGHTS = (("term", 3.0), ("description", 1.5), ("commonsymptoms", 1.0))
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, snapshotpath: Optional[str] = None, syncseconds: float = None):
+        self.snapshotpath = snapshotpath
+        self.syncseconds = syncseconds if syncseconds is not None else config.config.KNOWLEDGEINDEXSYNCSECONDS
+        self._lock = threading.RLock()
+        self._reset()
+        self.loaded = False
+        self._checkedat = 0.0
+
+    def _reset(self):
+        self.entries: List[KnowledgeEntry] = []
+        self.vocab: Dict[str, int] = {}
+        self.postings: List[array] = []   # termid -> array('I') of entry positions
+        self.weights: List[array] = []    # termid -> array('f') of weighted term frequency
+        self.doclengths = array("f")
+        self.totallength = 0.0
+        self.maxid = 0
+
+    # --- Building ---
+
+    def _addentries(self, entries: List[KnowledgeEntry]):
+        for entry in entries:
+            position = len(self.entries)
+            self.entries.append(entry)
+            self.maxid = max(self.maxid, entry.id)
+
+            frequencies: Dict[str, float] = {}
+            length = 0.0
+            for field, weight in self.FIELDWEIGHTS:
+                for token in tokenize(getattr(entry, field)):
+                    frequencies[token] = frequencies.get(token, 0.0) + weight
+                    length += weight
+
+            for token, frequency in frequencies.items():
+                termid = self.vocab.get(token)
+                if termid is None:
+                    termid = len(self.postings)
+                    self.vocab[token] = termid
+                    self.postings.append(array("I"))
+                    self.weights.append(array("f"))
+                self.postings[termid].append(position)
+                self.weights[termid].append(frequency)
+
+            self.doclengths.append(length)
+            self.totallength += length
+
+    @staticmethod
+    def _fetch(minid: int = 0) -> List[KnowledgeEntry]:
+        db = SessionLocal()
+        try:
+            rows = db.query(MedicalKnowledge).filter(
+                MedicalKnowledge.id > minid
+            ).order_by(MedicalKnowledge.id).all()
+            return [
+                KnowledgeEntry(r.id, r.category, r.term, r.description, r.icdcode, r.severity, r.commonsymptoms)
+                for r in rows
+            ]
+        finally:
+            db.close()
+
+    def rebuild(self):
+        """Rebuild the whole index from the database"""
+        entries = self._fetch()
+        with self._lock:
+            self._reset()
+            self._addentries(entries)
+            self.loaded = True
+        logger.info(f"Knowledge index built: {len(entries)} entries, {len(self.vocab)} terms")
+        self.save()
+
+    def refresh(self) -> int:
+        """
+        Index rows added since the last build (incremental refresh hook)
+
+        Returns:
+            int: Number of newly indexed rows
+        """
+        if not self.loaded:
+            return 0
+        entries = self._fetch(self.maxid)
+        if entries:
+            with self._lock:
+                self._addentries(entries)
+            logger.info(f"Knowledge index refreshed: +{len(entries)} entries")
+            self.save()
+        return len(entries)
+
+    @staticmethod
+    def _readfingerprint(upto: Optional[int] = None):
+        """(row count, max id) of the table, counting only ids <= upto if given"""
+        db = SessionLocal()
+        try:
+            query = db.query(func.count(MedicalKnowledge.id), func.max(MedicalKnowledge.id))
+            if upto is not None:
+                query = query.filter(MedicalKnowledge.id <= upto)
+            count, maxid = query.one()
+            return count, maxid or 0
+        finally:
+            db.close()
+
+    def _matchesdb(self) -> bool:
+        """Whether the indexed rows are still exactly the table's rows up to maxid"""
+        count, _ = self._readfingerprint(self.maxid)
+        _, maxid = self._readfingerprint()
+        return count == len(self.entries) and maxid >= self.maxid
+
+    def ensureloaded(self):
+        """Load the snapshot (then catch up with the database) or build from scratch"""
+        if self.loaded:
+            return
+        with self._lock:
+            if self.loaded:
+                return
+            self._checkedat = time.monotonic()
+            if self.load() and self._matchesdb():
+                self.refresh()
+            else:
+                self.rebuild()
+
+    def sync(self):
+        """Pick up rows written by other processes (at most every syncseconds)"""
+        self.ensureloaded()
+        now = time.monotonic()
+        if now - self._checkedat < self.syncseconds:
+            return
+        with self._lock:
+            if now - self._checkedat < self.syncseconds:
+                return
+            self._checkedat = now
+            try:
+                count, maxid = self._readfingerprint()
+            except Exception as e:
+                logger.warning(f"Knowledge index sync check failed: {e}")
+                return
+            if maxid == self.maxid and count == len(self.entries):
+                return
+            if maxid > self.maxid and self._matchesdb():
+                self.refresh()
+            else:
+                logger.info("Knowledge table changed outside this process; rebuilding index")
+                self.rebuild()
+
+    # --- Snapshots ---
+
+    def save(self):
+        """Write the index to the snapshot path (if configured)"""
+        if not self.snapshotpath:
+            return
+        try:
+            with self._lock:
+                state = {
+                    "version": SNAPSHOTVERSION,
+                    "entries": [tuple(e) for e in self.entries],
+                    "vocab": self.vocab,
+                    "postings": self.postings,
+                    "weights": self.weights,
+                    "doclengths": self.doclengths,
+                    "totallength": self.totallength,
+                    "maxid": self.maxid
+                }
+                os.makedirs(os.path.dirname(os.path.abspath(self.snapshotpath)), exist_ok=True)
+                tmppath = self.snapshotpath + ".tmp"
+                with open(tmppath, "wb") as f:
+                    pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmppath, self.snapshotpath)
+        except Exception as e:
+            logger.warning(f"Could not save knowledge index snapshot: {e}")
+
+    def load(self) -> bool:
+        """Load the index from the snapshot path. Returns False if unavailable"""
+        if not self.snapshotpath or not os.path.exists(self.snapshotpath):
+            return False
+        try:
+            with open(self.snapshotpath, "rb") as f:
+                state = pickle.load(f)
+            if state.get("version") != SNAPSHOTVERSION:
+                return False
+            with self._lock:
+                self.entries = [KnowledgeEntry(*e) for e in state["entries"]]
+                self.vocab = state["vocab"]
+                self.postings = state["postings"]
+                self.weights = state["weights"]
+                self.doclengths = state["doclengths"]
+                self.totallength = state["totallength"]
+                self.maxid = state["maxid"]
+                self.loaded = True
+            logger.info(f"Knowledge index loaded from snapshot: {len(self.entries)} entries")
+            return True
+        except Exception as e:
+            logger.warning(f"Could not load knowledge index snapshot: {e}")
+            return False
+
+    # --- Querying ---
+
+    def search(self, query: str, limit: int = 3, category: Optional[str] = None,
+               severity: Optional[str] = None) -> List[KnowledgeEntry]:
+        """
+        Rank entries against a free-text query with BM25
+
+        Args:
+            query: User question
+            limit: Maximum number of results
+            category: Only return entries of this category
+            severity: Only return entries of this severity
+
+        Returns:
+            List[KnowledgeEntry]: Best matches first
+        """
+        self.sync()
+        with self._lock:
+            count = len(self.entries)
+            if not count:
+                return []
+            averagelength = self.totallength / count
+            doclengths = np.frombuffer(self.doclengths, dtype=np.float32)
+            scores = None
+
+            for token in set(tokenize(query)):
+                termid = self.vocab.get(token)
+                if termid is None:
+                    continue
+                positions = np.frombuffer(self.postings[termid], dtype=np.uint32)
+                frequencies = np.frombuffer(self.weights[termid], dtype=np.float32)
+                idf = math.log(1 + (count - len(positions) + 0.5) / (len(positions) + 0.5))
+                norm = self.K1 * (1 - self.B + self.B * doclengths[positions] / averagelength)
+                if scores is None:
+                    scores = np.zeros(count, dtype=np.float32)
+                # Positions are unique within one posting list, so fancy-index add is safe
+                scores[positions] += idf * frequencies * (self.K1 + 1) / (frequencies + norm)
+
+            if scores is None:
+                return []
+
+            candidates = np.flatnonzero(scores)
+            if category or severity:
+                entries = self.entries
+                candidates = [
+                    position for position in candidates.tolist()
+                    if (not category or entries[position].category == category)
+                    and (not severity or entries[position].severity == severity)
+                ]
+                candidates = np.array(candidates, dtype=np.int64)
+            if not len(candidates):
+                return []
+
+            if len(candidates) > limit:
+                top = np.argpartition(-scores[candidates], limit - 1)[:limit]
+                candidates = candidates[top]
+            ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [self.entries[position] for position in ranked.tolist()]
+
+
+# Process-wide index shared by the Q&A engine and the MIMIC loader
+knowledge_index = KnowledgeIndex(
+    snapshotpath=os.path.join(config.config.MIMICDATAPATH, "knowledge_index.pkl")
+)
@@ -3,14 +3,16 @@ Medical Q&A Engine using MIMIC-IV knowledge
 """
 
 from loguru import logger
-from db.database import SessionLocal
-from db.models import MedicalKnowledge
+from mimic.knowledge_index import knowledge_index
 from typing import Optional, List
 
 class MedicalQAEngine:
     """Answer medical questions using MIMIC-IV knowledge base"""
 
     def __init__(self):
+        # Served from the in-memory BM25 index (snapshot or DB build at startup)
+        self.index = knowledge_index
+        self.index.ensureloaded()
         logger.info("Medical Q&A Engine initialized")
     
     def searchknowledge(self, query: str) -> Optional[str]:
@@ -24,17 +26,8 @@ class MedicalQAEngine:
             str: Answer from knowledge base or None
         """
         try:
-            db = SessionLocal()
-            querylower = query.lower()
-            
-            # Search for matching terms
-            results = db.query(MedicalKnowledge).filter(
-                MedicalKnowledge.term.ilike(f"%{query}%") |
-                MedicalKnowledge.description.ilike(f"%{query}%") |
-                MedicalKnowledge.commonsymptoms.ilike(f"%{query}%")
-            ).limit(3).all()
-            
-            db.close()
+            # BM25-ranked search for matching terms
+            results = self.index.search(query, limit=3)
             
             if results:
                 response = "Based on our medical database:\n\n"
@@ -59,14 +52,8 @@ class MedicalQAEngine:
     def getemergencyinfo(self, condition: str) -> Optional[str]:
         """Get emergency information for a condition"""
         try:
-            db = SessionLocal()
-            
-            result = db.query(MedicalKnowledge).filter(
-                MedicalKnowledge.term.ilike(f"%{condition}%"),
-                MedicalKnowledge.severity == "emergency"
-            ).first()
-            
-            db.close()
+            results = self.index.search(condition, limit=1, severity="emergency")
+            result = results[0] if results else None
             
             if result:
                 return f"🚨 EMERGENCY: {result.term}\n{result.description}\nCall 911 immediately!"
@@ -80,14 +67,8 @@ class MedicalQAEngine:
     def getmedicationinfo(self, medication: str) -> Optional[str]:
         """Get information about a medication"""
         try:
-            db = SessionLocal()
-            
-            result = db.query(MedicalKnowledge).filter(
-                MedicalKnowledge.category == "medication",
-                MedicalKnowledge.term.ilike(f"%{medication}%")
-            ).first()
-            
-            db.close()
+            results = self.index.search(medication, limit=1, category="medication")
+            result = results[0] if results else None
             
             if result:
                 return f"{result.term}\n{result.description}\n{result.commonsymptoms}"
@@ -6,6 +6,8 @@ Loads medical knowledge from MIMIC-IV demo dataset
 from loguru import logger
 from db.database import SessionLocal
 from db.models import MedicalKnowledge
+from db.knowledge_search import initknowledgesearch
+from mimic.knowledge_index import knowledge_index
 import os
 import json
 
@@ -177,6 +179,13 @@ class MIMICLoader:
         self.loaddiagnoses()
         self.loadprocedures()
         self.loadmedications()
+        # Triggers keep the search index in sync; this catches rows loaded before they existed
+        initknowledgesearch()
+        # Index the new rows now when the index lives in this process, and write an
+        # up-to-date snapshot for the next start; other running servers pick the
+        # rows up themselves (see KnowledgeIndex.sync)
+        knowledge_index.ensureloaded()
+        knowledge_index.refresh()
         logger.info("MIMIC-IV data loading complete")
 
 if __name__ == "__main__":
@@ -4,9 +4,16 @@ Implements 8-step medical triage process with medically-advised procedures
 """
 
 from loguru import logger
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from agent.keyword_matcher import KeywordMatcher
 from mimic.urgent_care_knowledge import URGENT_CARE_KNOWLEDGE
 
+# Lower rank = considered first when several conditions match
+TRIAGE_PRIORITY = {'EMERGENCY': 0, 'URGENT': 1, 'ROUTINE': 2}
+
+# Score contributed by each kind of match
+MATCH_WEIGHTS = {'term': 3.0, 'symptom': 2.0, 'keyword': 1.0}
+
 
 class UrgentCareHandler:
     """
@@ -14,9 +21,30 @@ class UrgentCareHandler:
     Follows 8-step thinking process for medical assessment
     """
     
-    def __init__(self):
+    def __init__(self, precompute: bool = False):
+        """
+        Args:
+            precompute: Render every condition's protocol template up front.
+                Emergency protocols are always prerendered.
+        """
         self.knowledge_base = URGENT_CARE_KNOWLEDGE
+        self._build_symptom_index()
+        # (term, triage level) -> static part of the rendered protocol
+        self._protocol_templates: Dict[Tuple[str, str], Dict] = {}
+        self.precompute_protocols(None if precompute else ['EMERGENCY'])
         logger.info("Urgent Care Handler initialized")
+
+    def _build_symptom_index(self):
+        """Compile terms, symptoms and condition-key words into one matcher"""
+        self.symptom_index = KeywordMatcher()
+        self._condition_order = {}
+        for order, (condition_key, data) in enumerate(self.knowledge_base.items()):
+            self._condition_order[condition_key] = order
+            self.symptom_index.register(condition_key, {
+                'term': [data['term'].lower()],
+                'symptom': [symptom.lower() for symptom in data.get('symptoms', [])],
+                'keyword': condition_key.split('_')
+            })
     
     def handle_medical_concern(self, symptoms: str, patient_responses: Dict = None) -> Dict:
         """
@@ -40,27 +68,102 @@ class UrgentCareHandler:
         return self._eight_step_protocol(condition_data, symptoms, patient_responses)
     
     def _match_condition(self, symptoms: str) -> Optional[Dict]:
-        """Match symptoms to known conditions"""
-        symptoms_lower = symptoms.lower()
-        
-        # Check for exact matches or keyword matches
-        for condition_key, data in self.knowledge_base.items():
-            # Check term
-            if data['term'].lower() in symptoms_lower:
-                return data
-            
-            # Check symptoms list
-            for symptom in data.get('symptoms', []):
-                if symptom.lower() in symptoms_lower:
-                    return data
-            
-            # Check keywords in condition key
-            keywords = condition_key.split('_')
-            if any(keyword in symptoms_lower for keyword in keywords):
-                return data
-        
-        return None
+        """Match symptoms to the best known condition"""
+        matches = self.match_conditions(symptoms, top_k=1)
+        return matches[0][1] if matches else None
+
+    def match_conditions(self, symptoms: str, top_k: int = 3) -> List[Tuple[str, Dict, float]]:
+        """
+        Score every condition in a single scan of the symptom text
+
+        Args:
+            symptoms: Patient's described symptoms
+            top_k: Number of candidates to return
+
+        Returns:
+            List of (condition_key, condition_data, score): strong matches
+            before weak ones, then most urgent triage level, then highest score
+        """
+        scores: Dict[str, float] = {}
+        seen = set()
+        for hit in self.symptom_index.scan(symptoms):
+            # Each distinct term/symptom/keyword counts once per condition
+            marker = (hit.namespace, hit.category, hit.rank)
+            if marker in seen:
+                continue
+            seen.add(marker)
+            scores[hit.namespace] = scores.get(hit.namespace, 0.0) + MATCH_WEIGHTS[hit.category]
+
+        # A lone condition-name word (e.g. "minor", "burn") is weak evidence and
+        # ranks after real term/symptom matches regardless of triage level
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: (
+                item[1] < MATCH_WEIGHTS['symptom'],
+                TRIAGE_PRIORITY.get(self.knowledge_base[item[0]]['triage_level'], len(TRIAGE_PRIORITY)),
+                -item[1],
+                self._condition_order[item[0]]
+            )
+        )
+        return [(key, self.knowledge_base[key], score) for key, score in ranked[:top_k]]
     
+    def precompute_protocols(self, triage_levels: List[str] = None) -> int:
+        """
+        Render protocol templates ahead of the first request
+
+        Args:
+            triage_levels: Only prerender conditions at these levels (all if None)
+
+        Returns:
+            int: Number of templates in the cache
+        """
+        for condition in self.knowledge_base.values():
+            if triage_levels is None or condition['triage_level'] in triage_levels:
+                self._protocol_template(condition)
+        return len(self._protocol_templates)
+
+    def _protocol_template(self, condition: Dict) -> Dict:
+        """
+        Steps 2-8 depend only on the condition, so render them once per
+        (condition, triage level). Step 2 varies only with whether responses
+        were given, so both variants are kept.
+        """
+        key = (condition['term'], condition['triage_level'])
+        template = self._protocol_templates.get(key)
+        if template is not None:
+            return template
+
+        triage_level = condition['triage_level']
+        assessments = {}
+        for responses_received in (False, True):
+            step = {
+                'step': 2,
+                'title': 'Assessment',
+                'content': self._step2_assess(condition, {'received': True} if responses_received else None)
+            }
+            assessments[responses_received] = (step, self._format_step(step))
+
+        steps = [
+            {'step': 3, 'title': 'Triage Classification', 'content': self._step3_triage(condition)},
+            {'step': 4, 'title': 'Immediate Guidance', 'content': self._step4_guidance(condition, triage_level)}
+        ]
+        if condition.get('first_aid'):
+            steps.append({'step': 5, 'title': 'First-Aid Instructions', 'content': self._step5_first_aid(condition)})
+        steps.extend([
+            {'step': 6, 'title': 'Warning Signs', 'content': self._step6_red_flags(condition)},
+            {'step': 7, 'title': 'Medical Disclaimer', 'content': self._step7_disclaimer(condition)},
+            {'step': 8, 'title': 'Follow-Up Care', 'content': self._step8_followup(triage_level)}
+        ])
+
+        template = {
+            'header': self._format_header(condition['term'], triage_level),
+            'assessments': assessments,
+            'steps': steps,
+            'tail': "".join(self._format_step(step) for step in steps)
+        }
+        self._protocol_templates[key] = template
+        return template
+
     def _eight_step_protocol(self, condition: Dict, symptoms: str, responses: Dict = None) -> Dict:
         """
         Execute 8-step medical thinking process:
@@ -72,86 +175,27 @@ class UrgentCareHandler:
         6. Explain red flags to watch for
         7. Include disclaimer
         8. Offer to schedule follow-up appointment
+
+        Steps 2-8 come from the cached template (shared, treat as read-only);
+        only the acknowledgment is rendered per request.
         """
-        
-        triage_level = condition['triage_level']
-        
-        # Build structured response
-        response = {
-            'condition': condition['term'],
-            'triage_level': triage_level,
-            'steps': []
-        }
-        
-        # STEP 1: Acknowledge the concern
-        acknowledgment = self._step1_acknowledge(condition, symptoms)
-        response['steps'].append({
+        template = self._protocol_template(condition)
+
+        acknowledgment = {
             'step': 1,
             'title': 'Acknowledgment',
-            'content': acknowledgment
-        })
-        
-        # STEP 2: Assess severity
-        assessment = self._step2_assess(condition, responses)
-        response['steps'].append({
-            'step': 2,
-            'title': 'Assessment',
-            'content': assessment
-        })
-        
-        # STEP 3: Classify triage level
-        triage = self._step3_triage(condition)
-        response['steps'].append({
-            'step': 3,
-            'title': 'Triage Classification',
-            'content': triage
-        })
-        
-        # STEP 4: Provide appropriate guidance
-        guidance = self._step4_guidance(condition, triage_level)
-        response['steps'].append({
-            'step': 4,
-            'title': 'Immediate Guidance',
-            'content': guidance
-        })
-        
-        # STEP 5: Give first-aid steps
-        if condition.get('first_aid'):
-            first_aid = self._step5_first_aid(condition)
-            response['steps'].append({
-                'step': 5,
-                'title': 'First-Aid Instructions',
-                'content': first_aid
-            })
-        
-        # STEP 6: Explain red flags
-        red_flags = self._step6_red_flags(condition)
-        response['steps'].append({
-            'step': 6,
-            'title': 'Warning Signs',
-            'content': red_flags
-        })
-        
-        # STEP 7: Include disclaimer
-        disclaimer = self._step7_disclaimer(condition)
-        response['steps'].append({
-            'step': 7,
-            'title': 'Medical Disclaimer',
-            'content': disclaimer
-        })
-        
-        # STEP 8: Offer follow-up
-        followup = self._step8_followup(triage_level)
-        response['steps'].append({
-            'step': 8,
-            'title': 'Follow-Up Care',
-            'content': followup
-        })
-        
-        # Add formatted response text
-        response['formatted_response'] = self._format_response(response)
-        
-        return response
+            'content': self._step1_acknowledge(condition, symptoms)
+        }
+        assessment, assessment_text = template['assessments'][bool(responses)]
+
+        return {
+            'condition': condition['term'],
+            'triage_level': condition['triage_level'],
+            'steps': [acknowledgment, assessment] + template['steps'],
+            'formatted_response': (
+                template['header'] + self._format_step(acknowledgment) + assessment_text + template['tail']
+            )
+        }
     
     def _step1_acknowledge(self, condition: Dict, symptoms: str) -> str:
         """Step 1: Acknowledge the concern empathetically"""
@@ -318,28 +362,38 @@ class UrgentCareHandler:
     
     def _format_response(self, response_data: Dict) -> str:
         """Format complete response for patient"""
-        formatted = f"\n{'='*60}\n"
-        formatted += f"MEDICAL ASSESSMENT: {response_data['condition']}\n"
-        formatted += f"TRIAGE LEVEL: {response_data['triage_level']}\n"
-        formatted += f"{'='*60}\n\n"
-        
+        formatted = self._format_header(response_data['condition'], response_data['triage_level'])
         for step in response_data['steps']:
-            formatted += f"**{step['title']}**\n\n"
-            
-            content = step['content']
-            if isinstance(content, dict):
-                if 'formatted' in content:
-                    formatted += content['formatted'] + "\n\n"
-                elif 'text' in content:
-                    formatted += content['text'] + "\n\n"
-                else:
-                    formatted += str(content) + "\n\n"
+            formatted += self._format_step(step)
+        return formatted
+
+    @staticmethod
+    def _format_header(condition_term: str, triage_level: str) -> str:
+        """Banner shown above the protocol steps"""
+        return (
+            f"\n{'='*60}\n"
+            f"MEDICAL ASSESSMENT: {condition_term}\n"
+            f"TRIAGE LEVEL: {triage_level}\n"
+            f"{'='*60}\n\n"
+        )
+
+    @staticmethod
+    def _format_step(step: Dict) -> str:
+        """Format a single protocol step"""
+        formatted = f"**{step['title']}**\n\n"
+
+        content = step['content']
+        if isinstance(content, dict):
+            if 'formatted' in content:
+                formatted += content['formatted'] + "\n\n"
+            elif 'text' in content:
+                formatted += content['text'] + "\n\n"
             else:
                 formatted += str(content) + "\n\n"
-            
-            formatted += "-" * 60 + "\n\n"
-        
-        return formatted
+        else:
+            formatted += str(content) + "\n\n"
+
+        return formatted + "-" * 60 + "\n\n"
     
     def _generic_medical_response(self, symptoms: str) -> Dict:
         """Handle cases where no specific condition matches"""
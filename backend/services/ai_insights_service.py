@@ -1,23 +1,29 @@
 """
 AI Insights Service - Generate intelligent explanations and summaries
-Uses the existing LLM (Llama 3.1) from the medical agent
+Uses the existing LLM (Llama 3.1) from the medical agent, through the shared LLM client
 """
 
-import os
 from typing import Dict, List
-import ollama
 from config import config
+from services.llm_client import llm_client
 
 
 class AIInsightsService:
     def __init__(self):
-        self.ollama_host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
         self.model = config.LLMMODEL
-        # Initialize client directly
-        self.client = ollama.Client(host=self.ollama_host)
+        # Shared keep-alive client; the job queue runs these generations at
+        # background priority so they yield to live calls
+        self.client = llm_client
 
-    def generate_bill_explanation(self, item_description: str, category: str, patient_context: str = "") -> str:
-        """Generate AI explanation for a bill item"""
+    def generate_bill_explanation(self, item_description: str, category: str, patient_context: str = "",
+                                  priority: str = "interactive", fallback: bool = True) -> str:
+        """
+        Generate AI explanation for a bill item
+
+        Args:
+            priority: LLM scheduler class for this request
+            fallback: Return a generic sentence on failure instead of raising
+        """
         prompt = f"""You are a helpful medical bill explainer. Explain this medical charge in simple, patient-friendly language.
 
 Charge: {item_description}
@@ -31,13 +37,18 @@ Provide a brief 1-2 sentence explanation of:
 Keep it friendly, clear, and avoid medical jargon."""
 
         try:
-            response = self.client.generate(model=self.model, prompt=prompt)
-            return response.get('services', {}).get('response', response.get('response', '')).strip()
+            # Generic charge descriptions can be kept on disk; a patient context cannot
+            response = self.client.generate_sync(
+                prompt, model=self.model, priority=priority, cache=True, persist=not patient_context
+            )
+            return response.get('response', '').strip()
         except Exception as e:
+            if not fallback:
+                raise
             return f"This is a {category} charge for {item_description}."
 
-    def generate_medical_event_summary(self, event_data: Dict) -> str:
-        """Generate key takeaways from a medical event"""
+    def generate_medical_event_summary(self, event_data: Dict, fallback: bool = True) -> str:
+        """Generate key takeaways from a medical event (fallback as in generate_bill_explanation)"""
         prompt = f"""Summarize this medical event in one clear sentence for the patient:
 
 Event Type: {event_data.get('event_type', 'medical event')}
@@ -48,13 +59,15 @@ Date: {event_data.get('event_date', 'N/A')}
 Create a patient-friendly key takeaway that explains what happened and why it matters."""
 
         try:
-            response = self.client.generate(model=self.model, prompt=prompt)
+            response = self.client.generate_sync(prompt, model=self.model, priority="background")
             return response.get('response', '').strip()
         except Exception as e:
+            if not fallback:
+                raise
             return f"{event_data.get('title', 'Medical event')} on {event_data.get('event_date', 'this date')}."
 
-    def generate_follow_up_recommendation(self, event_data: Dict) -> str:
-        """Generate follow-up recommendation for a medical event"""
+    def generate_follow_up_recommendation(self, event_data: Dict, fallback: bool = True) -> str:
+        """Generate follow-up recommendation for a medical event (fallback as in generate_bill_explanation)"""
         prompt = f"""Based on this medical event, provide a brief follow-up recommendation:
 
 Event: {event_data.get('title', 'N/A')}
@@ -66,9 +79,11 @@ Suggest what the patient should do next (e.g., schedule follow-up, monitor sympt
 Keep it to 1-2 sentences."""
 
         try:
-            response = self.client.generate(model=self.model, prompt=prompt)
+            response = self.client.generate_sync(prompt, model=self.model, priority="background", cache=True)
             return response.get('response', '').strip()
         except Exception as e:
+            if not fallback:
+                raise
             if event_data.get('status') == 'follow_up_needed':
                 return "Consider scheduling a follow-up appointment with your provider."
             return "Continue monitoring as advised by your healthcare provider."
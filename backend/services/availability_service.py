@@ -0,0 +1,397 @@
+"""
+Availability Service - Free appointment slots from occupancy bitmaps
+Scheduled appointments are folded into one bitmap per (doctor, day), bit
+i = slot i taken, and free slots are generated lazily in time order with
+bit operations.
+
+The bitmaps come from a long-lived OccupancyIndex (one uint16 array per
+doctor over the next OCCUPANCYHORIZONDAYS days). It is built once, updated
+incrementally by every appointment write in this process, and rebuilt when
+another process (voice server vs API) has changed the appointments table.
+Ranges outside the horizon fall back to one range query.
+"""
+
+import json
+import random
+import threading
+import time as clock
+from array import array
+from datetime import date, time, timedelta
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+from loguru import logger
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import config
+from db.database import SessionLocal
+from db.models import Appointment, Doctor
+
+# Bookable slots: 09:00 to 16:30, every 30 minutes
+DAYSTARTMINUTES = 9 * 60
+SLOTMINUTES = 30
+SLOTSPERDAY = 16
+SLOTTIMES = [
+    time((DAYSTARTMINUTES + i * SLOTMINUTES) // 60, (DAYSTARTMINUTES + i * SLOTMINUTES) % 60)
+    for i in range(SLOTSPERDAY)
+]
+FULLDAY = (1 << SLOTSPERDAY) - 1
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+DAYNUMBERS = {name: number for number, name in enumerate(WEEKDAYS)}
+DAYNUMBERS.update({name[:3]: number for number, name in enumerate(WEEKDAYS)})
+
+
+@lru_cache(maxsize=256)
+def parseavailabledays(value: Optional[str]) -> FrozenSet[int]:
+    """
+    Weekday numbers (Monday = 0) from Doctor.availabledays
+
+    Accepts the JSON list the seed data uses ('["Monday", "Friday"]') and the
+    comma-separated form of the doctor signup form ("Mon,Tue,Wed").
+    """
+    if not value:
+        return frozenset()
+    try:
+        names = json.loads(value)
+        if isinstance(names, str):
+            names = [names]
+    except ValueError:
+        names = value.split(",")
+    return frozenset(
+        DAYNUMBERS[name.strip().lower()] for name in names
+        if isinstance(name, str) and name.strip().lower() in DAYNUMBERS
+    )
+
+
+def clinicdays() -> FrozenSet[int]:
+    return parseavailabledays(json.dumps(config.config.CLINICDAYS))
+
+
+def slotmask(appointmenttime: time, durationminutes: Optional[int]) -> int:
+    """Bits of the slots an appointment overlaps (off-grid times block both neighbours)"""
+    start = appointmenttime.hour * 60 + appointmenttime.minute - DAYSTARTMINUTES
+    end = start + (durationminutes or SLOTMINUTES)
+    first = max(0, start // SLOTMINUTES)
+    last = min(SLOTSPERDAY, -(-end // SLOTMINUTES))
+    if first >= last:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def freebits(mask: int) -> Iterator[int]:
+    """Indexes of the set bits of mask, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def slotinfo(doctor: Doctor, day: date, index: int) -> Dict:
+    """Slot in the shape the booking flow uses"""
+    slottime = SLOTTIMES[index]
+    return {
+        "date": day.strftime("%A, %B %d"),
+        "time": slottime.strftime("%I:%M %p"),
+        "doctor": doctor.name,
+        "doctorid": doctor.id,
+        "datetime": day,
+        "timeobj": slottime
+    }
+
+
+def loadoccupancy(db: Session, doctorids: Optional[Iterable[int]], start: date, end: date) -> Dict[Tuple[int, date], int]:
+    """
+    Occupancy bitmaps from one range query
+
+    Args:
+        doctorids: Doctors to load, or None for all
+
+    Returns:
+        Dict: (doctor id, day) -> bitmap of taken slots (days without appointments are absent)
+    """
+    query = db.query(
+        Appointment.doctorid, Appointment.appointmentdate, Appointment.appointmenttime, Appointment.durationminutes
+    ).filter(
+        Appointment.appointmentdate >= start,
+        Appointment.appointmentdate <= end,
+        Appointment.status == "scheduled"
+    )
+    if doctorids is not None:
+        doctorids = list(doctorids)
+        if not doctorids:
+            return {}
+        query = query.filter(Appointment.doctorid.in_(doctorids))
+
+    occupied: Dict[Tuple[int, date], int] = {}
+    for doctorid, day, slottime, duration in query.all():
+        key = (doctorid, day)
+        occupied[key] = occupied.get(key, 0) | slotmask(slottime, duration)
+    return occupied
+
+
+class OccupancyIndex:
+    """Per-doctor arrays of daily occupancy bitmaps, kept in step with appointment writes"""
+
+    def __init__(self, horizondays: int = None, syncseconds: float = None):
+        """
+        Args:
+            horizondays: Days from today covered by the index
+            syncseconds: How often readers check whether another process changed appointments
+        """
+        self.horizondays = horizondays or config.config.OCCUPANCYHORIZONDAYS
+        self.syncseconds = syncseconds if syncseconds is not None else config.config.OCCUPANCYSYNCSECONDS
+        self._lock = threading.RLock()
+        self.base: Optional[date] = None  # Day 0 of the arrays
+        self._days: Dict[int, array] = {}  # doctor id -> uint16 bitmap per day offset
+        self._cells: Dict[Tuple[int, int], Dict[int, int]] = {}  # (doctor id, offset) -> {appointment id: mask}
+        self._placed: Dict[int, Tuple[int, int]] = {}  # appointment id -> (doctor id, offset)
+        self._fingerprint = None
+        self._checkedat = 0.0
+        self.builds = 0
+        self.updates = 0
+
+    # --- Build / sync ---
+
+    def build(self, db: Session = None):
+        """(Re)load every scheduled appointment in the horizon"""
+        owndb = db is None
+        db = db or SessionLocal()
+        try:
+            base = date.today()
+            # Read first: a write landing during the load then triggers another rebuild
+            fingerprint = self._readfingerprint(db)
+            rows = db.query(
+                Appointment.id, Appointment.doctorid, Appointment.appointmentdate,
+                Appointment.appointmenttime, Appointment.durationminutes
+            ).filter(
+                Appointment.appointmentdate >= base,
+                Appointment.appointmentdate < base + timedelta(days=self.horizondays),
+                Appointment.status == "scheduled"
+            ).all()
+            with self._lock:
+                self.base = base
+                self._days, self._cells, self._placed = {}, {}, {}
+                for appointmentid, doctorid, day, slottime, duration in rows:
+                    self._place(appointmentid, doctorid, (day - base).days, slotmask(slottime, duration))
+                self._fingerprint = fingerprint
+                self._checkedat = clock.monotonic()
+                self.builds += 1
+            logger.info(f"Occupancy index built: {len(rows)} appointments, {len(self._days)} doctors, {self.horizondays} days")
+        finally:
+            if owndb:
+                db.close()
+
+    @staticmethod
+    def _readfingerprint(db: Session):
+        """Changes whenever an appointment is added, deleted or updated through the ORM"""
+        return tuple(db.query(
+            func.count(Appointment.id), func.max(Appointment.id), func.max(Appointment.updatedat)
+        ).one())
+
+    def _sync(self, db: Session):
+        """Build on first use or a new day; rebuild if another process wrote appointments"""
+        with self._lock:
+            if self.base != date.today():
+                self.build(db)
+                return
+            now = clock.monotonic()
+            if now - self._checkedat < self.syncseconds:
+                return
+            self._checkedat = now
+            if self._readfingerprint(db) != self._fingerprint:
+                logger.info("Appointments changed outside this process; rebuilding occupancy index")
+                self.build(db)
+
+    def invalidate(self):
+        """Check for writes by other processes on the next read"""
+        with self._lock:
+            self._checkedat = 0.0
+
+    # --- Incremental updates ---
+
+    def _place(self, appointmentid: int, doctorid: int, offset: int, mask: int):
+        if not 0 <= offset < self.horizondays or not mask:
+            return
+        days = self._days.get(doctorid)
+        if days is None:
+            days = self._days[doctorid] = array("H", bytes(2 * self.horizondays))
+        self._cells.setdefault((doctorid, offset), {})[appointmentid] = mask
+        self._placed[appointmentid] = (doctorid, offset)
+        days[offset] |= mask
+
+    def _unplace(self, appointmentid: int):
+        placed = self._placed.pop(appointmentid, None)
+        if placed is None:
+            return
+        cell = self._cells[placed]
+        del cell[appointmentid]
+        # Overlapping appointments may share bits, so recompute the day
+        mask = 0
+        for other in cell.values():
+            mask |= other
+        if not cell:
+            del self._cells[placed]
+        self._days[placed[0]][placed[1]] = mask
+
+    def apply(self, appointment: Appointment, db: Session = None):
+        """
+        Record an appointment's committed state (created, moved, cancelled, ...)
+
+        Args:
+            db: Session used to refresh the change fingerprint after this process's own write
+        """
+        with self._lock:
+            if self.base is None:
+                return  # Not built yet; the first read loads the committed state
+            self._unplace(appointment.id)
+            if appointment.status == "scheduled":
+                self._place(
+                    appointment.id, appointment.doctorid, (appointment.appointmentdate - self.base).days,
+                    slotmask(appointment.appointmenttime, appointment.durationminutes)
+                )
+            self.updates += 1
+            self._refreshfingerprint(db)
+
+    def remove(self, appointmentid: int, db: Session = None):
+        """Forget a deleted appointment"""
+        with self._lock:
+            if self.base is None:
+                return
+            self._unplace(appointmentid)
+            self.updates += 1
+            self._refreshfingerprint(db)
+
+    def _refreshfingerprint(self, db: Session = None):
+        owndb = db is None
+        db = db or SessionLocal()
+        try:
+            self._fingerprint = self._readfingerprint(db)
+        finally:
+            if owndb:
+                db.close()
+
+    # --- Reads ---
+
+    def occupancy(self, db: Session, doctorids: Iterable[int], start: date, end: date) -> Dict[Tuple[int, date], int]:
+        """Same result as loadoccupancy, from memory when [start, end] is inside the horizon"""
+        self._sync(db)
+        with self._lock:
+            first = (start - self.base).days
+            last = (end - self.base).days
+            if first < 0 or last >= self.horizondays:
+                return loadoccupancy(db, doctorids, start, end)
+
+            occupied = {}
+            for doctorid in doctorids:
+                days = self._days.get(doctorid)
+                if days is None:
+                    continue
+                for offset in range(first, last + 1):
+                    if days[offset]:
+                        occupied[(doctorid, self.base + timedelta(days=offset))] = days[offset]
+            return occupied
+
+    def check(self, db: Session = None, repair: bool = True) -> List[Dict]:
+        """
+        Compare the index with the appointments table
+
+        Args:
+            repair: Rebuild the index if they differ
+
+        Returns:
+            List[Dict]: Mismatching (doctor, day) bitmaps (empty when consistent)
+        """
+        owndb = db is None
+        db = db or SessionLocal()
+        try:
+            with self._lock:
+                if self.base is None:
+                    self.build(db)
+                    return []
+                expected = loadoccupancy(db, None, self.base, self.base + timedelta(days=self.horizondays - 1))
+                actual = {
+                    (doctorid, self.base + timedelta(days=offset)): mask
+                    for doctorid, days in self._days.items()
+                    for offset, mask in enumerate(days) if mask
+                }
+                mismatches = [
+                    {"doctorid": key[0], "date": key[1].isoformat(),
+                     "expected": expected.get(key, 0), "indexed": actual.get(key, 0)}
+                    for key in sorted(set(expected) | set(actual))
+                    if expected.get(key, 0) != actual.get(key, 0)
+                ]
+                if mismatches:
+                    logger.warning(f"Occupancy index inconsistent ({len(mismatches)} doctor-days)")
+                    if repair:
+                        self.build(db)
+                return mismatches
+        finally:
+            if owndb:
+                db.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "base": self.base.isoformat() if self.base else None,
+                "horizon_days": self.horizondays,
+                "doctors": len(self._days),
+                "appointments": len(self._placed),
+                "builds": self.builds,
+                "updates": self.updates
+            }
+
+
+class AvailabilityService:
+    def __init__(self, index: OccupancyIndex = None):
+        self.index = index or OccupancyIndex()
+
+    def occupancy(self, db: Session, doctorids: Iterable[int], start: date, end: date) -> Dict[Tuple[int, date], int]:
+        """Occupancy bitmaps per (doctor id, day) for the range"""
+        return self.index.occupancy(db, list(doctorids), start, end)
+
+    def freeslots(self, db: Session, doctors: List[Doctor], start: date, days: int,
+                  shuffle: bool = False, held: Dict[Tuple[int, date], int] = None) -> Iterator[Dict]:
+        """
+        Free slots of these doctors from start for the next days, earliest first
+
+        Occupancy is loaded on the first next(); the rest is computed lazily,
+        so taking a few slots costs one query however long the horizon is.
+
+        Args:
+            shuffle: Vary which doctor is offered first at the same time (load balancing)
+            held: Extra (doctor id, day) bitmaps to treat as taken (slots held for other calls)
+        """
+        doctors = list(doctors)
+        if shuffle:
+            random.shuffle(doctors)
+        end = start + timedelta(days=days - 1)
+        occupied = self.occupancy(db, [doctor.id for doctor in doctors], start, end)
+        if held:
+            occupied = dict(occupied)
+            for key, mask in held.items():
+                occupied[key] = occupied.get(key, 0) | mask
+        opendays = clinicdays()
+        workdays = [(doctor, parseavailabledays(doctor.availabledays)) for doctor in doctors]
+
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            weekday = day.weekday()
+            if weekday not in opendays:
+                continue
+            free = [
+                (doctor, FULLDAY & ~occupied.get((doctor.id, day), 0))
+                for doctor, daynumbers in workdays if weekday in daynumbers
+            ]
+            anyfree = 0
+            for _, mask in free:
+                anyfree |= mask
+            for index in freebits(anyfree):
+                bit = 1 << index
+                for doctor, mask in free:
+                    if mask & bit:
+                        yield slotinfo(doctor, day, index)
+
+
+# Singleton instances
+occupancy_index = OccupancyIndex()
+availability_service = AvailabilityService(occupancy_index)
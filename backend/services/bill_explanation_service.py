@@ -0,0 +1,156 @@
+"""
+Bill Explanation Service - Shared explanations for bill line items
+An explanation depends only on (description, category), so it is generated
+once, stored in bill_explanations and reused for every patient's bills.
+Requests only read the store; missing explanations are generated by a
+bill_explanations job (services/job_queue) and picked up on the next read.
+"""
+
+import re
+from typing import Dict, List, Tuple
+from loguru import logger
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from db.database import SessionLocal
+from db.billing import BillExplanation, BillItem
+from services.ai_insights_service import ai_insights_service
+from services.job_queue import job_queue, contenthash
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalizedescription(description: str) -> str:
+    """Store key for a charge description (case and spacing insensitive)"""
+    return WHITESPACE.sub(" ", (description or "").strip().lower())
+
+
+class BillExplanationService:
+    def backfill(self, db: Session, items: List[BillItem]) -> List[BillItem]:
+        """
+        Fill ai_explanation from the shared store in one query and one commit
+
+        Returns:
+            List[BillItem]: Items whose explanation is not in the store yet
+        """
+        missing = [item for item in items if not item.ai_explanation]
+        if not missing:
+            return []
+
+        keys = {normalizedescription(item.description) for item in missing}
+        stored = {
+            (row.description_key, row.category): row.explanation
+            for row in db.query(BillExplanation).filter(BillExplanation.description_key.in_(keys)).all()
+        }
+
+        stillmissing = []
+        for item in missing:
+            explanation = stored.get((normalizedescription(item.description), item.category))
+            if explanation:
+                item.ai_explanation = explanation
+            else:
+                stillmissing.append(item)
+
+        if len(stillmissing) < len(missing):
+            db.commit()
+        return stillmissing
+
+    def schedule(self, items: List[BillItem]) -> Dict:
+        """
+        Queue one job generating explanations for these items
+
+        The dedup key covers only the charges, so the same missing charges on
+        other bills reuse the job instead of generating them again.
+
+        Returns:
+            Dict: Job status
+        """
+        batch: Dict[str, list] = {}
+        for item in items:
+            key = (normalizedescription(item.description), item.category)
+            batch.setdefault(key, [key[0], key[1], item.description, []])[3].append(item.id)
+
+        charges = sorted(batch)
+        return job_queue.enqueue(
+            "bill_explanations",
+            {"items": [batch[key] for key in charges]},
+            dedupkey=f"bill_explanations:{contenthash(charges)}"
+        )
+
+    def generate(self, payload: Dict) -> Dict:
+        """
+        Job handler: generate and store missing explanations, then update the waiting bill items
+
+        Args:
+            payload: {"items": [[description_key, category, original description, bill item ids], ...]}
+
+        Raises:
+            RuntimeError: Some explanations failed (the rest are stored); the job
+                fails and the next bill view queues it again
+        """
+        batch = {(key, category): (description, itemids) for key, category, description, itemids in payload["items"]}
+
+        # Skip charges stored since the job was queued (e.g. by an overlapping batch)
+        db = SessionLocal()
+        try:
+            for row in db.query(BillExplanation).filter(
+                BillExplanation.description_key.in_({key for key, _ in batch})
+            ).all():
+                batch.pop((row.description_key, row.category), None)
+        finally:
+            db.close()
+
+        explanations = {}
+        failed = 0
+        for (descriptionkey, category), (description, _) in batch.items():
+            try:
+                explanations[(descriptionkey, category)] = ai_insights_service.generate_bill_explanation(
+                    description, category, priority="background", fallback=False
+                )
+            except Exception as e:
+                logger.warning(f"Bill explanation failed for '{description}' ({category}): {e}")
+                failed += 1
+
+        if explanations:
+            self._save(explanations, batch)
+        if failed:
+            raise RuntimeError(f"{failed} of {len(batch)} bill explanations failed")
+        return {"generated": len(explanations)}
+
+    def _save(self, explanations: Dict[Tuple[str, str], str], batch: Dict):
+        db = SessionLocal()
+        try:
+            db.add_all([
+                BillExplanation(description_key=key[0], category=key[1], explanation=text)
+                for key, text in explanations.items()
+            ])
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another worker stored some of these first; keep theirs
+                db.rollback()
+                for key, text in explanations.items():
+                    try:
+                        db.add(BillExplanation(description_key=key[0], category=key[1], explanation=text))
+                        db.commit()
+                    except IntegrityError:
+                        db.rollback()
+
+            updates = [
+                {"id": itemid, "ai_explanation": text}
+                for key, text in explanations.items()
+                for itemid in batch[key][1]
+            ]
+            db.bulk_update_mappings(BillItem, updates)
+            db.commit()
+            logger.info(f"Stored {len(explanations)} bill explanations ({len(updates)} bill items updated)")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to store bill explanations: {e}")
+            raise
+        finally:
+            db.close()
+
+
+# Singleton instance
+bill_explanation_service = BillExplanationService()
+job_queue.register("bill_explanations", bill_explanation_service.generate)
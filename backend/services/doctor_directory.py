@@ -0,0 +1,183 @@
+"""
+Doctor Directory - Process-wide cache of the doctors table
+The doctors table is small and rarely written, but the booking dialogue and
+several routes read it on every turn/request. It is loaded once into
+immutable records indexed by id, linked user id, normalized full name, last
+name and specialty, and reloaded after writes in this process (invalidate())
+or when a periodic fingerprint check sees another process add or remove
+doctors.
+"""
+
+import re
+import threading
+import time as clock
+from typing import Dict, List, NamedTuple, Optional
+from loguru import logger
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import config
+from db.database import SessionLocal
+from db.models import Doctor, User
+
+TITLES = {"dr", "doctor", "docteur", "doc"}
+
+
+class DoctorRecord(NamedTuple):
+    """Cached doctor row (plus the linked account's username)"""
+    id: int
+    name: str
+    specialty: Optional[str]
+    phone: Optional[str]
+    email: Optional[str]
+    availabledays: Optional[str]
+    user_id: Optional[int]
+    username: Optional[str]
+
+
+def normalizename(text: str) -> str:
+    """Lowercase words without punctuation or titles ("Dr. Sarah Johnson" -> "sarah johnson")"""
+    words = re.findall(r"[^\W\d_]+(?:['-][^\W\d_]+)*", (text or "").lower())
+    return " ".join(word for word in words if word not in TITLES)
+
+
+class DoctorDirectory:
+    def __init__(self, syncseconds: float = None):
+        """
+        Args:
+            syncseconds: How often to check whether another process changed the doctors
+        """
+        self.syncseconds = syncseconds if syncseconds is not None else config.config.DOCTORCACHESYNCSECONDS
+        self._lock = threading.RLock()
+        self._doctors: Optional[List[DoctorRecord]] = None
+        self._byid: Dict[int, DoctorRecord] = {}
+        self._byuser: Dict[int, DoctorRecord] = {}
+        self._byname: Dict[str, DoctorRecord] = {}
+        self._bylastname: Dict[str, List[DoctorRecord]] = {}
+        self._byspecialty: Dict[str, List[DoctorRecord]] = {}
+        self._fingerprint = None
+        self._checkedat = 0.0
+        self.loads = 0
+
+    def load(self, db: Session = None):
+        """(Re)load every doctor and rebuild the indexes"""
+        owndb = db is None
+        db = db or SessionLocal()
+        try:
+            fingerprint = self._readfingerprint(db)
+            rows = db.query(
+                Doctor.id, Doctor.name, Doctor.specialty, Doctor.phone, Doctor.email,
+                Doctor.availabledays, Doctor.user_id, User.username
+            ).outerjoin(User, User.id == Doctor.user_id).order_by(Doctor.id).all()
+        finally:
+            if owndb:
+                db.close()
+
+        doctors = [DoctorRecord(*row) for row in rows]
+        byname, bylastname, byspecialty = {}, {}, {}
+        for doctor in doctors:
+            name = normalizename(doctor.name)
+            if not name:
+                continue
+            byname.setdefault(name, doctor)
+            bylastname.setdefault(name.split()[-1], []).append(doctor)
+            byspecialty.setdefault((doctor.specialty or "").lower(), []).append(doctor)
+
+        with self._lock:
+            self._doctors = doctors
+            self._byid = {doctor.id: doctor for doctor in doctors}
+            self._byuser = {doctor.user_id: doctor for doctor in doctors if doctor.user_id is not None}
+            self._byname = byname
+            self._bylastname = bylastname
+            self._byspecialty = byspecialty
+            self._fingerprint = fingerprint
+            self._checkedat = clock.monotonic()
+            self.loads += 1
+        logger.info(f"Doctor directory loaded: {len(doctors)} doctors")
+
+    @staticmethod
+    def _readfingerprint(db: Session):
+        """Changes whenever a doctor is added or deleted"""
+        return tuple(db.query(func.count(Doctor.id), func.max(Doctor.id)).one())
+
+    def _sync(self):
+        """Load on first use; reload if another process added or deleted doctors"""
+        with self._lock:
+            if self._doctors is None or self._fingerprint is None:
+                self.load()
+                return
+            now = clock.monotonic()
+            if now - self._checkedat < self.syncseconds:
+                return
+            self._checkedat = now
+            db = SessionLocal()
+            try:
+                changed = self._readfingerprint(db) != self._fingerprint
+            finally:
+                db.close()
+            if changed:
+                logger.info("Doctors changed outside this process; reloading directory")
+                self.load()
+
+    def invalidate(self):
+        """
+        Reload on the next lookup (after a write to doctors or their accounts)
+
+        The current indexes stay in place until the reload swaps them, so
+        lookups running concurrently still see a complete directory.
+        """
+        with self._lock:
+            self._fingerprint = None
+            self._checkedat = 0.0
+
+    # --- Lookups ---
+
+    def all(self) -> List[DoctorRecord]:
+        self._sync()
+        return list(self._doctors)
+
+    def get(self, doctorid: int) -> Optional[DoctorRecord]:
+        self._sync()
+        return self._byid.get(doctorid)
+
+    def foruser(self, userid: int) -> Optional[DoctorRecord]:
+        """Doctor profile linked to a user account"""
+        self._sync()
+        return self._byuser.get(userid)
+
+    def byspecialty(self, specialty: str) -> List[DoctorRecord]:
+        self._sync()
+        return list(self._byspecialty.get((specialty or "").lower(), []))
+
+    def findbyname(self, text: str) -> Optional[DoctorRecord]:
+        """
+        Doctor named in free text ("Dr. Chen please", "with Sarah Johnson")
+
+        Full names are tried before last names; word windows of the text are
+        looked up in the name indexes, so the cost does not grow with the
+        number of doctors.
+        """
+        self._sync()
+        words = normalizename(text).split()
+        longest = max((len(name.split()) for name in self._byname), default=1)
+        for size in range(min(longest, len(words)), 1, -1):
+            for start in range(len(words) - size + 1):
+                doctor = self._byname.get(" ".join(words[start:start + size]))
+                if doctor:
+                    return doctor
+        for word in words:
+            doctors = self._bylastname.get(word)
+            if doctors:
+                return doctors[0]
+        return None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "doctors": len(self._doctors) if self._doctors is not None else None,
+                "specialties": len(self._byspecialty),
+                "loads": self.loads
+            }
+
+
+# Singleton instance
+doctor_directory = DoctorDirectory()
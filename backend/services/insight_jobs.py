@@ -0,0 +1,158 @@
+"""
+Insight Jobs - Background handlers for medical event insights and cost predictions
+Routes enqueue these through the job queue and return immediately; results
+are stored in ai_insights / cost_predictions and in the job result.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List
+from db.database import SessionLocal
+from db.medical_history import MedicalEvent, AIInsight
+from db.billing import CostPrediction
+from services.ai_insights_service import ai_insights_service
+from services.job_queue import job_queue, contenthash
+
+# insight_type -> (generator, confidence score)
+INSIGHT_TYPES = {
+    "key_takeaway": (ai_insights_service.generate_medical_event_summary, 0.85),
+    "recommendation": (ai_insights_service.generate_follow_up_recommendation, 0.80)
+}
+
+
+def eventdata(event: MedicalEvent) -> Dict:
+    """Event fields the insight prompts use (and the dedup hash covers)"""
+    return {
+        "event_type": event.event_type,
+        "title": event.title,
+        "description": event.description,
+        "event_date": str(event.event_date),
+        "severity": event.severity,
+        "status": event.status
+    }
+
+
+def insightstored(result: Dict) -> bool:
+    """Whether the insight a done job produced is still stored (a later version may have replaced it)"""
+    if not result or "insight_id" not in result:
+        return False
+    db = SessionLocal()
+    try:
+        # Content too: SQLite may hand the replaced row's id to its successor
+        stored = db.query(AIInsight.content).filter(AIInsight.id == result["insight_id"]).first()
+        return stored is not None and stored.content == result.get("content")
+    finally:
+        db.close()
+
+
+def enqueueeventinsights(event: MedicalEvent) -> List[Dict]:
+    """
+    Queue the insights for a medical event
+
+    Returns:
+        List[Dict]: One job per insight type; unchanged events reuse their
+            existing jobs unless their insight has been replaced since
+            (e.g. the event was edited A -> B -> A)
+    """
+    data = eventdata(event)
+    insighttypes = ["key_takeaway"]
+    if event.status in ["active", "follow_up_needed"]:
+        insighttypes.append("recommendation")
+
+    return [
+        job_queue.enqueue(
+            "event_insight",
+            {"event_id": event.id, "insight_type": insighttype, "event_data": data},
+            dedupkey=f"event_insight:{event.id}:{insighttype}:{contenthash(data)}",
+            keep=insightstored
+        )
+        for insighttype in insighttypes
+    ]
+
+
+def generateeventinsight(payload: Dict) -> Dict:
+    """Job handler: generate one insight and replace the event's previous unreviewed one of that type"""
+    eventid = payload["event_id"]
+    insighttype = payload["insight_type"]
+    generator, confidence = INSIGHT_TYPES[insighttype]
+    content = generator(payload["event_data"], fallback=False)
+
+    db = SessionLocal()
+    try:
+        if not db.query(MedicalEvent.id).filter(MedicalEvent.id == eventid).first():
+            raise ValueError(f"Medical event {eventid} no longer exists")
+
+        db.query(AIInsight).filter(
+            AIInsight.medical_event_id == eventid,
+            AIInsight.insight_type == insighttype,
+            AIInsight.reviewed_by_human == False
+        ).delete(synchronize_session=False)
+        insight = AIInsight(
+            medical_event_id=eventid,
+            insight_type=insighttype,
+            content=content,
+            confidence_score=confidence
+        )
+        db.add(insight)
+        db.commit()
+        return {"insight_id": insight.id, "insight_type": insighttype, "content": content}
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def predictionvalid(result: Dict) -> bool:
+    """Whether the prediction a done job produced is still within its valid_until"""
+    if not result or "valid_until" not in result:
+        return False
+    return datetime.fromisoformat(result["valid_until"]) > datetime.now()
+
+
+def enqueuecostprediction(patient_id: int, visit_type: str, history: List[Dict]) -> Dict:
+    """
+    Queue a cost prediction
+
+    The same patient, visit type and billing history reuse one job until its
+    prediction expires; after that the prediction is computed again.
+    """
+    return job_queue.enqueue(
+        "cost_prediction",
+        {"patient_id": patient_id, "visit_type": visit_type, "history": history},
+        dedupkey=f"cost_prediction:{patient_id}:{visit_type}:{contenthash(history)}",
+        keep=predictionvalid
+    )
+
+
+def generatecostprediction(payload: Dict) -> Dict:
+    """Job handler: predict and store the cost of a future visit"""
+    prediction = ai_insights_service.predict_visit_cost(payload["history"], payload["visit_type"])
+
+    db = SessionLocal()
+    try:
+        costpred = CostPrediction(
+            patient_id=payload["patient_id"],
+            predicted_visit_type=payload["visit_type"],
+            predicted_min_cost=prediction["min_cost"],
+            predicted_max_cost=prediction["max_cost"],
+            predicted_avg_cost=prediction["avg_cost"],
+            confidence_level=prediction["confidence"],
+            breakdown=prediction["breakdown"],
+            valid_until=datetime.now() + timedelta(days=30)
+        )
+        db.add(costpred)
+        db.commit()
+        return {
+            "prediction_id": costpred.id,
+            "prediction": prediction,
+            "valid_until": costpred.valid_until.isoformat()
+        }
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+job_queue.register("event_insight", generateeventinsight)
+job_queue.register("cost_prediction", generatecostprediction)
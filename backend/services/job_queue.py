@@ -0,0 +1,210 @@
+"""
+Job Queue - Persistent background work with deduplication
+Slow work (LLM insights, bill explanations, cost predictions) is recorded in
+the jobs table and run by a small bounded worker pool, so API requests only
+enqueue and return. Each job has a dedup key built from its inputs: asking
+for identical work again returns the existing job instead of recomputing it.
+Jobs left queued by a previous process are resumed on start; jobs lost
+mid-run (older than JOBSTALESECONDS) are requeued on start and whenever they
+are enqueued again or polled.
+"""
+
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+from loguru import logger
+from sqlalchemy.exc import IntegrityError
+from config import config
+from db.database import SessionLocal
+from db.jobs import Job
+
+
+def contenthash(data: Any) -> str:
+    """Stable short hash of JSON-serializable job inputs"""
+    raw = json.dumps(data, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def jobstatus(job: Job) -> Dict:
+    """API representation of a job"""
+    return {
+        "job_id": job.id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    }
+
+
+class JobQueue:
+    def __init__(self, workers: int = None):
+        self.workers = workers or config.JOBWORKERS
+        self._handlers: Dict[str, Callable[[Dict], Any]] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def register(self, jobtype: str, handler: Callable[[Dict], Any]):
+        """
+        Register the function that runs jobs of this type
+
+        Args:
+            jobtype: Job type name
+            handler: Called with the job payload in a worker thread; its return
+                value (JSON-serializable) becomes the job result, an exception fails the job
+        """
+        self._handlers[jobtype] = handler
+        if self._executor is not None:
+            self._resume(jobtype)
+
+    def start(self):
+        """Start the worker pool and resume unfinished jobs (idempotent)"""
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        logger.info(f"Job queue started ({self.workers} workers)")
+        for jobtype in list(self._handlers):
+            self._resume(jobtype)
+
+    def _resume(self, jobtype: str):
+        """Requeue stale running jobs of this type and submit everything queued"""
+        db = SessionLocal()
+        try:
+            stale = datetime.now() - timedelta(seconds=config.JOBSTALESECONDS)
+            db.query(Job).filter(
+                Job.job_type == jobtype, Job.status == "running", Job.started_at < stale
+            ).update({"status": "queued"}, synchronize_session=False)
+            db.commit()
+            jobids = [row.id for row in db.query(Job.id).filter(Job.job_type == jobtype, Job.status == "queued").all()]
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Could not resume {jobtype} jobs: {e}")
+            return
+        finally:
+            db.close()
+
+        for jobid in jobids:
+            self._executor.submit(self._run, jobid)
+        if jobids:
+            logger.info(f"Resumed {len(jobids)} queued {jobtype} jobs")
+
+    def enqueue(self, jobtype: str, payload: Dict, dedupkey: str, keep: Callable[[Any], bool] = None) -> Dict:
+        """
+        Queue a job unless identical work is already queued, running or done
+
+        A failed job with the same key is queued again.
+
+        Args:
+            jobtype: Registered job type
+            payload: JSON-serializable handler input
+            dedupkey: Identity of the work (same key = same result)
+            keep: Optional check of a done job's result; returning False runs
+                the job again (e.g. its stored output was since overwritten)
+
+        Returns:
+            Dict: Job status (see jobstatus); the existing job when deduplicated
+        """
+        if jobtype not in self._handlers:
+            raise ValueError(f"No handler registered for job type '{jobtype}'")
+        self.start()
+
+        db = SessionLocal()
+        try:
+            job = db.query(Job).filter(Job.dedup_key == dedupkey).first()
+            if job is None:
+                job = Job(job_type=jobtype, dedup_key=dedupkey, payload=payload, status="queued")
+                db.add(job)
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Same work enqueued concurrently; use that job
+                    db.rollback()
+                    return jobstatus(db.query(Job).filter(Job.dedup_key == dedupkey).one())
+            elif job.status == "failed" or (job.status == "done" and keep is not None and not keep(job.result)):
+                job.status = "queued"
+                job.payload = payload
+                job.error = None
+                db.commit()
+            elif not self._requeuestale(db, job):
+                return jobstatus(job)
+
+            status = jobstatus(job)
+        finally:
+            db.close()
+
+        self._executor.submit(self._run, status["job_id"])
+        return status
+
+    def get(self, jobid: int) -> Optional[Dict]:
+        """Job status, or None if unknown (a job lost mid-run is queued again)"""
+        db = SessionLocal()
+        try:
+            job = db.query(Job).filter(Job.id == jobid).first()
+            if job is None:
+                return None
+            if self._requeuestale(db, job):
+                self.start()
+                self._executor.submit(self._run, job.id)
+            return jobstatus(job)
+        finally:
+            db.close()
+
+    def _requeuestale(self, db, job: Job) -> bool:
+        """
+        Put a job back in the queue if it has been running for longer than
+        JOBSTALESECONDS (its worker died, e.g. the process crashed mid-job)
+
+        Returns:
+            bool: True if this call requeued it (the caller submits it)
+        """
+        stale = datetime.now() - timedelta(seconds=config.JOBSTALESECONDS)
+        if job.status != "running" or job.started_at is None or job.started_at >= stale:
+            return False
+        # Conditional on the run we saw, so concurrent callers requeue it only once
+        requeued = db.query(Job).filter(
+            Job.id == job.id, Job.status == "running", Job.started_at == job.started_at
+        ).update({"status": "queued"}, synchronize_session=False)
+        db.commit()
+        if requeued:
+            logger.warning(f"Job {job.id} ({job.job_type}) was lost mid-run; queued again")
+        db.refresh(job)
+        return bool(requeued)
+
+    def _run(self, jobid: int):
+        db = SessionLocal()
+        try:
+            # Claim atomically so a job is never run twice (also across processes)
+            claimed = db.query(Job).filter(Job.id == jobid, Job.status == "queued").update(
+                {"status": "running", "started_at": datetime.now(), "attempts": Job.attempts + 1},
+                synchronize_session=False
+            )
+            db.commit()
+            if not claimed:
+                return
+            job = db.query(Job).filter(Job.id == jobid).one()
+
+            try:
+                job.result = self._handlers[job.job_type](job.payload or {})
+                job.status = "done"
+            except Exception as e:
+                logger.warning(f"Job {jobid} ({job.job_type}) failed: {e}")
+                job.status = "failed"
+                job.error = str(e)
+            job.finished_at = datetime.now()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Job {jobid} could not be processed: {e}")
+        finally:
+            db.close()
+
+
+# Singleton instance
+job_queue = JobQueue()
@@ -0,0 +1,129 @@
+"""
+Completion cache for repeated LLM prompts
+Keys are built from a normalized form of the prompt (system prompt, trimmed
+history and user text, case- and whitespace-folded). Entries live in a
+size-bounded LRU with a TTL. Entries stored with persist=True are also written
+to an optional SQLite file so they survive restarts; everything else (live
+conversation turns, prompts built from patient records) stays in memory only,
+since the file is plaintext.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from loguru import logger
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation"""
+    return WHITESPACE.sub(" ", (text or "").strip().lower()).rstrip(" .!?")
+
+
+def makekey(model: str, messages: List[Dict] = None, prompt: str = None, format: str = "",
+            options: Dict = None) -> str:
+    """Cache key for a chat (messages) or generate (prompt) request"""
+    if messages is not None:
+        body = [(m.get("role", ""), normalize(m.get("content", ""))) for m in messages]
+    else:
+        body = normalize(prompt)
+    raw = json.dumps([model, format, options or {}, body], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """LRU + TTL cache of completion text with optional SQLite persistence"""
+
+    def __init__(self, maxentries: int = 2000, ttlseconds: float = 86400, path: str = None):
+        self.maxentries = maxentries
+        self.ttlseconds = ttlseconds
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires, text)
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self._opendb()
+
+    def _opendb(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            now = time.time()
+            self._db.execute("DELETE FROM llm_cache WHERE expires <= ?", (now,))
+            rows = self._db.execute(
+                "SELECT key, value, expires FROM llm_cache ORDER BY expires DESC LIMIT ?", (self.maxentries,)
+            ).fetchall()
+            for key, value, expires in reversed(rows):
+                self._entries[key] = (expires, value)
+            logger.info(f"LLM cache loaded {len(rows)} entries from {self.path}")
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache persistence disabled: {e}")
+            self._db = None
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached completion text, or None on miss/expiry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, text: str, persist: bool = False):
+        """
+        Store a completion, evicting the least recently used entries
+
+        Args:
+            persist: Also write it to the SQLite file (only for text without patient data)
+        """
+        expires = time.time() + self.ttlseconds
+        with self._lock:
+            self._entries[key] = (expires, text)
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.maxentries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            if self._db is not None:
+                try:
+                    if persist:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO llm_cache (key, value, expires) VALUES (?, ?, ?)", (key, text, expires)
+                        )
+                    if evicted:
+                        self._db.executemany("DELETE FROM llm_cache WHERE key = ?", [(k,) for k in evicted])
+                except sqlite3.Error as e:
+                    logger.warning(f"LLM cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "persistent": self._db is not None
+            }
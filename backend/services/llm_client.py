@@ -0,0 +1,281 @@
+"""
+Shared non-blocking LLM client
+Every completion (voice agent, AI insights) goes through one ollama.AsyncClient
+running on a dedicated event-loop thread: HTTP connections are kept alive and
+reused, each request has a timeout, and a priority scheduler (see
+services/llm_scheduler) caps how many completions hit the model at once.
+Async callers await without blocking their own loop; sync callers (threadpool
+routes) block only their worker thread. Requests may opt into the completion
+cache (services/llm_cache), in which case repeated prompts never reach the model;
+only completions marked persist (no patient data) are written to its disk file.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import Future
+from typing import AsyncIterator, Dict, List, Optional
+from loguru import logger
+from config import config
+from services.llm_scheduler import LLMScheduler, LLMOverloaded
+from services.llm_cache import CompletionCache, makekey
+
+try:
+    import ollama
+    OLLAMAAVAILABLE = True
+except ImportError:
+    OLLAMAAVAILABLE = False
+
+
+class LLMError(Exception):
+    """Completion could not be obtained"""
+
+
+class LLMTimeout(LLMError):
+    """Completion exceeded its timeout"""
+
+
+_DONE = object()
+
+
+class LLMClient:
+    """Process-wide async Ollama client on its own event loop"""
+
+    def __init__(self, host: str = None, timeout: float = None, maxconcurrency: int = None):
+        self.host = host or os.getenv("OLLAMA_HOST", "http://localhost:11434")
+        self.timeout = timeout or config.LLMTIMEOUTSECONDS
+        self.maxconcurrency = maxconcurrency or config.LLMMAXCONCURRENCY
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client = None
+        self.scheduler = LLMScheduler(
+            window=self.maxconcurrency,
+            queuelimits=config.LLMQUEUELIMITS,
+            reservedlive=config.LLMRESERVEDLIVESLOTS
+        )
+        self.cache = CompletionCache(
+            maxentries=config.LLMCACHEMAXENTRIES,
+            ttlseconds=config.LLMCACHETTLSECONDS,
+            path=config.LLMCACHEPATH or None
+        ) if config.LLMCACHEENABLED else None
+        self.inflight = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+
+    # --- Event loop ---
+
+    def _ensureloop(self):
+        if self._loop is not None:
+            return
+        if not OLLAMAAVAILABLE:
+            raise LLMError("Ollama client library not installed")
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+
+            async def setup():
+                # Created on the client loop so its connections belong to it
+                self._client = ollama.AsyncClient(host=self.host)
+
+            asyncio.run_coroutine_threadsafe(setup(), loop).result()
+            self._loop = loop
+            logger.info(f"LLM client started ({self.host}, max {self.maxconcurrency} concurrent, {self.timeout}s timeout)")
+
+    def _submit(self, coro) -> Future:
+        self._ensureloop()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _run(self, factory, timeout: Optional[float], priority: str):
+        """Run one request on the client loop once the scheduler admits it (timeout includes queueing)"""
+        async def execute():
+            async with self.scheduler.slot(priority):
+                self.inflight += 1
+                try:
+                    return await factory()
+                finally:
+                    self.inflight -= 1
+
+        try:
+            result = await asyncio.wait_for(execute(), timeout or self.timeout)
+            self.completed += 1
+            return result
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMTimeout(f"LLM request exceeded {timeout or self.timeout}s")
+        except LLMOverloaded:
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+
+    # --- Completion cache ---
+
+    def _cachekey(self, cache: bool, model: str, messages: List[Dict] = None, prompt: str = None,
+                  format: str = "", options: Dict = None) -> Optional[str]:
+        if not cache or self.cache is None:
+            return None
+        return makekey(model, messages=messages, prompt=prompt, format=format, options=options)
+
+    def _store(self, key: Optional[str], text: str, format: str, persist: bool = False):
+        if not key or not text:
+            return
+        if format == "json":
+            # Never replay a malformed JSON-mode completion
+            try:
+                json.loads(text)
+            except ValueError:
+                return
+        self.cache.put(key, text, persist=persist)
+
+    # --- Requests ---
+
+    async def chat(self, messages: List[Dict], model: str = None, format: str = "", options: Dict = None,
+                   timeout: float = None, priority: str = "interactive", cache: bool = False,
+                   persist: bool = False) -> Dict:
+        """
+        Chat completion (awaitable from any event loop)
+
+        Args:
+            cache: Serve/store this completion from the completion cache
+            persist: Also write it to the cache's disk file (LLMCACHEPATH). Only
+                for prompts without patient data; conversation turns stay in memory
+
+        Raises:
+            LLMOverloaded: Shed by the scheduler (queue for this priority full)
+            LLMTimeout: Not finished within the timeout (queueing included)
+        """
+        model = model or config.LLMMODEL
+        key = self._cachekey(cache, model, messages=messages, format=format, options=options)
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            return {"model": model, "message": {"role": "assistant", "content": cached}, "done": True, "cached": True}
+
+        response = await asyncio.wrap_future(self._submit(self._run(
+            lambda: self._client.chat(model=model, messages=messages, format=format, options=options),
+            timeout,
+            priority
+        )))
+        self._store(key, response["message"]["content"], format, persist)
+        return response
+
+    def chat_sync(self, messages: List[Dict], model: str = None, format: str = "", options: Dict = None,
+                  timeout: float = None, priority: str = "interactive", cache: bool = False,
+                  persist: bool = False) -> Dict:
+        """Chat completion for synchronous callers"""
+        model = model or config.LLMMODEL
+        key = self._cachekey(cache, model, messages=messages, format=format, options=options)
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            return {"model": model, "message": {"role": "assistant", "content": cached}, "done": True, "cached": True}
+
+        response = self._submit(self._run(
+            lambda: self._client.chat(model=model, messages=messages, format=format, options=options),
+            timeout,
+            priority
+        )).result()
+        self._store(key, response["message"]["content"], format, persist)
+        return response
+
+    async def generate(self, prompt: str, model: str = None, options: Dict = None, timeout: float = None,
+                       priority: str = "interactive", cache: bool = False,
+                       persist: bool = False) -> Dict:
+        """Prompt completion (awaitable from any event loop)"""
+        model = model or config.LLMMODEL
+        key = self._cachekey(cache, model, prompt=prompt, options=options)
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            return {"model": model, "response": cached, "done": True, "cached": True}
+
+        response = await asyncio.wrap_future(self._submit(self._run(
+            lambda: self._client.generate(model=model, prompt=prompt, options=options),
+            timeout,
+            priority
+        )))
+        self._store(key, response.get("response", ""), "", persist)
+        return response
+
+    def generate_sync(self, prompt: str, model: str = None, options: Dict = None, timeout: float = None,
+                      priority: str = "interactive", cache: bool = False,
+                      persist: bool = False) -> Dict:
+        """Prompt completion for synchronous callers"""
+        model = model or config.LLMMODEL
+        key = self._cachekey(cache, model, prompt=prompt, options=options)
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            return {"model": model, "response": cached, "done": True, "cached": True}
+
+        response = self._submit(self._run(
+            lambda: self._client.generate(model=model, prompt=prompt, options=options),
+            timeout,
+            priority
+        )).result()
+        self._store(key, response.get("response", ""), "", persist)
+        return response
+
+    async def chat_stream(self, messages: List[Dict], model: str = None, format: str = "", options: Dict = None,
+                          timeout: float = None, priority: str = "interactive", cache: bool = False,
+                          persist: bool = False) -> AsyncIterator[Dict]:
+        """
+        Streamed chat completion; yields response parts on the caller's loop
+
+        The timeout covers the whole stream. A cache hit is yielded as a single part.
+        """
+        model = model or config.LLMMODEL
+        key = self._cachekey(cache, model, messages=messages, format=format, options=options)
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            yield {"model": model, "message": {"role": "assistant", "content": cached}, "done": True, "cached": True}
+            return
+
+        callerloop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def pump():
+            stream = await self._client.chat(
+                model=model, messages=messages, format=format, options=options, stream=True
+            )
+            async for part in stream:
+                callerloop.call_soon_threadsafe(queue.put_nowait, part)
+
+        async def run():
+            try:
+                await self._run(pump, timeout, priority)
+            except BaseException as e:
+                callerloop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                callerloop.call_soon_threadsafe(queue.put_nowait, _DONE)
+
+        future = self._submit(run())
+        parts = []
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    self._store(key, "".join(parts), format, persist)
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                parts.append(item.get("message", {}).get("content", ""))
+                yield item
+        finally:
+            # Caller stopped early: abandon the request on the client loop
+            future.cancel()
+
+    def stats(self) -> Dict:
+        """Request counters, scheduler queue depth/wait/service times and cache hit rate"""
+        return {
+            "inflight": self.inflight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "scheduler": self.scheduler.snapshot(),
+            "cache": self.cache.stats() if self.cache is not None else None
+        }
+
+
+# Process-wide client shared by the agent and the AI insights service
+llm_client = LLMClient()
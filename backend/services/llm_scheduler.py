@@ -0,0 +1,163 @@
+"""
+Priority scheduler in front of the local LLM
+Requests are admitted into a bounded concurrency window in priority order
+(live call turn > interactive API > background insight). Each class has its
+own queue limit; when it is full the request is shed immediately with
+LLMOverloaded so the caller can fall back to its rule-based path.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict
+
+PRIORITIES = {"live": 0, "interactive": 1, "background": 2}
+
+
+class LLMOverloaded(Exception):
+    """No capacity for this request's priority class (load shed)"""
+
+
+class _ClassMetrics:
+    __slots__ = ("queued", "admitted", "shed", "completed", "waittotal", "waitmax", "servicetotal", "servicemax")
+
+    def __init__(self):
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.completed = 0
+        self.waittotal = 0.0
+        self.waitmax = 0.0
+        self.servicetotal = 0.0
+        self.servicemax = 0.0
+
+    def asdict(self) -> Dict:
+        return {
+            "queue_depth": self.queued,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "completed": self.completed,
+            "avg_wait_ms": round(1000 * self.waittotal / self.admitted, 1) if self.admitted else 0.0,
+            "max_wait_ms": round(1000 * self.waitmax, 1),
+            "avg_service_ms": round(1000 * self.servicetotal / self.completed, 1) if self.completed else 0.0,
+            "max_service_ms": round(1000 * self.servicemax, 1)
+        }
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM requests; all methods run on one event loop
+
+    Usage:
+        async with scheduler.slot("live"):
+            ...call the model...
+    """
+
+    def __init__(self, window: int, queuelimits: Dict[str, int], reservedlive: int = 1):
+        """
+        Args:
+            window: Maximum concurrent requests to the model
+            queuelimits: Maximum waiting requests per priority class
+            reservedlive: Slots only live call turns may take, so background
+                work can never occupy the whole window
+        """
+        self.window = max(1, window)
+        self.queuelimits = queuelimits
+        self.reservedlive = min(max(0, reservedlive), self.window - 1)
+        self.running = 0
+        self._heap = []
+        self._sequence = itertools.count()
+        self.metrics = {priority: _ClassMetrics() for priority in PRIORITIES}
+
+    def _cangrant(self, priority: str) -> bool:
+        limit = self.window if priority == "live" else self.window - self.reservedlive
+        return self.running < limit
+
+    def _dispatch(self):
+        """Grant freed slots to the highest-priority waiters"""
+        while self._heap:
+            _, _, priority, future = self._heap[0]
+            if future.done():
+                # Waiter gave up (timeout/cancel)
+                heapq.heappop(self._heap)
+                continue
+            if not self._cangrant(priority):
+                # Lower classes queue behind this one and face the same or stricter limit
+                return
+            heapq.heappop(self._heap)
+            self.metrics[priority].queued -= 1
+            self.running += 1
+            future.set_result(None)
+
+    async def acquire(self, priority: str):
+        """Wait for a slot, or raise LLMOverloaded if this class's queue is full"""
+        if priority not in PRIORITIES:
+            priority = "interactive"
+        metrics = self.metrics[priority]
+        started = time.perf_counter()
+
+        if not self._heap and self._cangrant(priority):
+            self.running += 1
+        else:
+            if metrics.queued >= self.queuelimits.get(priority, 0):
+                metrics.shed += 1
+                raise LLMOverloaded(f"LLM busy: {priority} queue full ({metrics.queued} waiting)")
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._heap, (PRIORITIES[priority], next(self._sequence), priority, future))
+            metrics.queued += 1
+            self._dispatch()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Granted just as we were cancelled: hand the slot back
+                    self.release()
+                else:
+                    metrics.queued -= 1
+                    future.cancel()
+                raise
+
+        waited = time.perf_counter() - started
+        metrics.admitted += 1
+        metrics.waittotal += waited
+        metrics.waitmax = max(metrics.waitmax, waited)
+
+    def release(self, priority: str = None, servicetime: float = None):
+        """Free a slot (recording service time) and admit the next waiter"""
+        self.running -= 1
+        if priority in self.metrics and servicetime is not None:
+            metrics = self.metrics[priority]
+            metrics.completed += 1
+            metrics.servicetotal += servicetime
+            metrics.servicemax = max(metrics.servicemax, servicetime)
+        self._dispatch()
+
+    def slot(self, priority: str) -> "_Slot":
+        return _Slot(self, priority)
+
+    def snapshot(self) -> Dict:
+        """Metrics per priority class plus window usage"""
+        return {
+            "window": self.window,
+            "running": self.running,
+            "reserved_live": self.reservedlive,
+            "classes": {priority: metrics.asdict() for priority, metrics in self.metrics.items()}
+        }
+
+
+class _Slot:
+    """Async context manager holding one scheduler slot"""
+
+    def __init__(self, scheduler: LLMScheduler, priority: str):
+        self.scheduler = scheduler
+        self.priority = priority if priority in PRIORITIES else "interactive"
+
+    async def __aenter__(self):
+        await self.scheduler.acquire(self.priority)
+        self.started = time.perf_counter()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.scheduler.release(self.priority, time.perf_counter() - self.started)
+        return False
@@ -0,0 +1,176 @@
+"""
+Slot Hold Service - Keep offered slots for the caller until they choose
+When the agent offers slots, each one is held for that call id for
+SLOTHOLDSECONDS (one row per slot in slot_holds, unique per doctor/slot, so
+two callers are never offered the same time). Other callers' availability
+skips held slots. Confirming books the held slot by hold id in one
+transaction, without searching availability again. A background sweeper
+drops expired holds.
+"""
+
+import threading
+import time as clock
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import config
+from db.database import SessionLocal
+from db.models import Appointment, SlotHold
+from services.availability_service import slotmask, occupancy_index
+
+
+class SlotHoldService:
+    def __init__(self, ttlseconds: float = None, sweepseconds: float = None):
+        self.ttlseconds = ttlseconds or config.config.SLOTHOLDSECONDS
+        self.sweepseconds = sweepseconds or config.config.SLOTHOLDSWEEPSECONDS
+        self._sweeper: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the expiry sweeper (idempotent)"""
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweeploop, name="slot-hold-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _sweeploop(self):
+        while True:
+            clock.sleep(self.sweepseconds)
+            db = SessionLocal()
+            try:
+                self.sweep(db)
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Slot hold sweep failed: {e}")
+            finally:
+                db.close()
+
+    def sweep(self, db: Session) -> int:
+        """Delete expired holds"""
+        expired = db.query(SlotHold).filter(SlotHold.expiresat <= datetime.now()).delete(synchronize_session=False)
+        db.commit()
+        if expired:
+            logger.info(f"Released {expired} expired slot holds")
+        return expired
+
+    def hold(self, db: Session, callid: str, slots: List[Dict]) -> List[Dict]:
+        """
+        Hold slots for a call, replacing its previous holds
+
+        Slots another call holds or that were booked in the meantime are
+        skipped (the slots may come from an earlier lookup).
+
+        Args:
+            slots: Slots from getavailableslots
+
+        Returns:
+            List[Dict]: The held slots with their hold_id
+        """
+        self.start()
+        self.sweep(db)
+        self.release(callid, db)
+
+        expiresat = datetime.now() + timedelta(seconds=self.ttlseconds)
+        taken = {}
+        if slots:
+            days = [slot["datetime"] for slot in slots]
+            taken = occupancy_index.occupancy(db, {slot["doctorid"] for slot in slots}, min(days), max(days))
+        held = []
+        for slot in slots:
+            if taken.get((slot["doctorid"], slot["datetime"]), 0) & slotmask(slot["timeobj"], None):
+                continue
+            hold = SlotHold(
+                callid=callid, doctorid=slot["doctorid"], slotdate=slot["datetime"],
+                slottime=slot["timeobj"], expiresat=expiresat
+            )
+            db.add(hold)
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                continue
+            held.append({**slot, "hold_id": hold.id})
+        return held
+
+    def heldmasks(self, db: Session, excludecallid: str = None) -> Dict[Tuple[int, object], int]:
+        """Slots held by other calls, as (doctor id, day) -> occupancy bitmap"""
+        query = db.query(SlotHold.doctorid, SlotHold.slotdate, SlotHold.slottime).filter(
+            SlotHold.expiresat > datetime.now()
+        )
+        if excludecallid is not None:
+            query = query.filter(SlotHold.callid != excludecallid)
+        masks: Dict[Tuple[int, object], int] = {}
+        for doctorid, day, slottime in query.all():
+            masks[(doctorid, day)] = masks.get((doctorid, day), 0) | slotmask(slottime, None)
+        return masks
+
+    def confirm(self, db: Session, holdid: int, callid: str, patientid: int, userid: int,
+                reason: str) -> Optional[Appointment]:
+        """
+        Book a held slot
+
+        Returns:
+            Appointment: The new appointment, or None if the hold expired or
+                the slot was booked anyway (e.g. by staff)
+        """
+        hold = db.query(SlotHold).filter(
+            SlotHold.id == holdid, SlotHold.callid == callid, SlotHold.expiresat > datetime.now()
+        ).first()
+        if not hold:
+            return None
+
+        appointment = Appointment(
+            patientid=patientid,
+            userid=userid,
+            doctorid=hold.doctorid,
+            appointmentdate=hold.slotdate,
+            appointmenttime=hold.slottime,
+            reason=reason,
+            status="scheduled"
+        )
+        db.add(appointment)
+        # The call's other offers go back in the same transaction
+        db.query(SlotHold).filter(SlotHold.callid == callid).delete(synchronize_session=False)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            occupancy_index.invalidate()
+            return None
+        db.refresh(appointment)
+        occupancy_index.apply(appointment, db)
+        return appointment
+
+    def get(self, db: Session, holdids: List[int], callid: str) -> List[SlotHold]:
+        """This call's unexpired holds among holdids, in that order"""
+        if not holdids:
+            return []
+        holds = {
+            hold.id: hold for hold in db.query(SlotHold).filter(
+                SlotHold.id.in_(holdids), SlotHold.callid == callid, SlotHold.expiresat > datetime.now()
+            ).all()
+        }
+        return [holds[holdid] for holdid in holdids if holdid in holds]
+
+    def release(self, callid: str, db: Session = None) -> int:
+        """Drop every hold of a call (new offer, booking done or call ended)"""
+        owndb = db is None
+        db = db or SessionLocal()
+        try:
+            released = db.query(SlotHold).filter(SlotHold.callid == callid).delete(synchronize_session=False)
+            db.commit()
+            return released
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"[Call {callid}] Could not release slot holds: {e}")
+            return 0
+        finally:
+            if owndb:
+                db.close()
+
+
+# Singleton instance
+slot_hold_service = SlotHoldService()
@@ -0,0 +1,185 @@
+"""
+Persistent cache of synthesized TTS audio
+Raw PCM is kept in a byte-bounded in-memory LRU backed by an on-disk LRU
+directory, keyed by (text, language, Piper model, sample rate).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger("VoiceServer.TTSCache")
+
+DEFAULT_SAMPLE_RATE = 22050
+
+
+class TTSCache:
+    """Two-level (memory + disk) LRU cache for synthesized audio"""
+
+    def __init__(self, cachedir: str, maxmemorybytes: int, maxdiskbytes: int):
+        self.cachedir = cachedir
+        self.maxmemorybytes = maxmemorybytes
+        self.maxdiskbytes = maxdiskbytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memorybytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # key -> size, oldest first
+        self._diskbytes = 0
+        self._samplerates: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self._scandisk()
+
+    def _scandisk(self):
+        """Rebuild the disk LRU order from file modification times"""
+        os.makedirs(self.cachedir, exist_ok=True)
+        files = []
+        for name in os.listdir(self.cachedir):
+            if not name.endswith(".pcm"):
+                continue
+            stat = os.stat(os.path.join(self.cachedir, name))
+            files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+            self._diskbytes += size
+        if files:
+            logger.info(f"TTS cache: {len(files)} clips on disk ({self._diskbytes // 1024} KB)")
+
+    def _samplerate(self, modelpath: str) -> int:
+        """Sample rate declared in the Piper model's .json config"""
+        rate = self._samplerates.get(modelpath)
+        if rate is None:
+            try:
+                with open(modelpath + ".json", "r", encoding="utf-8") as f:
+                    rate = int(json.load(f)["audio"]["sample_rate"])
+            except Exception:
+                rate = DEFAULT_SAMPLE_RATE
+            self._samplerates[modelpath] = rate
+        return rate
+
+    def key(self, text: str, language: str, modelpath: str) -> str:
+        """Cache key for one utterance"""
+        raw = "\x1f".join([
+            text.strip(), language, os.path.basename(modelpath), str(self._samplerate(modelpath))
+        ])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cachedir, key + ".pcm")
+
+    def _remember(self, key: str, audio: bytes):
+        """Insert into the memory LRU (caller holds the lock)"""
+        if len(audio) > self.maxmemorybytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memorybytes -= len(previous)
+        self._memory[key] = audio
+        self._memorybytes += len(audio)
+        while self._memorybytes > self.maxmemorybytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memorybytes -= len(evicted)
+
+    def get(self, text: str, language: str, modelpath: str) -> Optional[bytes]:
+        """Cached audio for this utterance, or None"""
+        key = self.key(text, language, modelpath)
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return audio
+            ondisk = key in self._disk
+
+        if ondisk:
+            try:
+                path = self._path(key)
+                with open(path, "rb") as f:
+                    audio = f.read()
+                os.utime(path)
+                with self._lock:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self._remember(key, audio)
+                    self.hits += 1
+                return audio
+            except OSError:
+                with self._lock:
+                    self._diskbytes -= self._disk.pop(key, 0)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text: str, language: str, modelpath: str, audio: bytes, persist: bool = True):
+        """
+        Store audio in memory and (if persist) on disk, evicting least recently used clips
+
+        Conversation-specific replies can contain patient details, so callers
+        only persist fixed prompts.
+        """
+        key = self.key(text, language, modelpath)
+        path = self._path(key) if persist else None
+        if path:
+            try:
+                tmppath = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmppath, "wb") as f:
+                    f.write(audio)
+                os.replace(tmppath, path)
+            except OSError as e:
+                logger.warning(f"Could not write TTS cache entry: {e}")
+                path = None
+
+        evict = []
+        with self._lock:
+            self._remember(key, audio)
+            if path:
+                self._diskbytes -= self._disk.pop(key, 0)
+                self._disk[key] = len(audio)
+                self._diskbytes += len(audio)
+                while self._diskbytes > self.maxdiskbytes and len(self._disk) > 1:
+                    evictedkey, size = self._disk.popitem(last=False)
+                    self._diskbytes -= size
+                    evict.append(evictedkey)
+
+        for evictedkey in evict:
+            try:
+                os.remove(self._path(evictedkey))
+            except OSError:
+                pass
+
+    def getorsynthesize(self, text: str, language: str, modelpath: str,
+                        synthesize: Callable[[str, str], Optional[bytes]],
+                        persist: bool = True) -> Optional[bytes]:
+        """
+        Return cached audio, synthesizing and storing it on a miss
+
+        Args:
+            text: Text to speak
+            language: Language code passed to the synthesizer
+            modelpath: Piper model used for this language
+            synthesize: Fallback synthesizer, called as synthesize(text, language)
+            persist: Also write newly synthesized audio to disk
+        """
+        audio = self.get(text, language, modelpath)
+        if audio is None:
+            audio = synthesize(text, language)
+            if audio:
+                self.put(text, language, modelpath, audio, persist)
+        return audio
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current sizes"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memorybytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._diskbytes
+            }
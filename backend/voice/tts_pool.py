@@ -0,0 +1,139 @@
+"""
+Pool of long-lived in-process Piper voices
+Each language's ONNX voice is loaded once per pool slot and reused, so a turn
+pays only for synthesis instead of a process spawn plus model load.
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger("VoiceServer.TTSPool")
+
+try:
+    from piper.voice import PiperVoice
+    PIPERAVAILABLE = True
+except ImportError:
+    PIPERAVAILABLE = False
+    logger.warning("piper-tts Python package not available, TTS will use the piper CLI")
+
+
+class TTSTimeout(Exception):
+    """Raised when a synthesis request exceeds its deadline"""
+
+
+class PiperVoicePool:
+    """Fixed-size pool of warm PiperVoice instances per language"""
+
+    def __init__(self, modelpaths: Dict[str, str], size: int = 2, timeout: float = 10.0):
+        """
+        Args:
+            modelpaths: Language code -> Piper .onnx model path
+            size: Voices kept loaded per language (max concurrent syntheses)
+            timeout: Default per-request deadline in seconds
+        """
+        self.modelpaths = modelpaths
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._voices: Dict[str, queue.Queue] = {}
+        self._loaded: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._failed = set()
+
+    @property
+    def available(self) -> bool:
+        return PIPERAVAILABLE
+
+    def _load(self, language: str):
+        """Load one more voice for this language (if the pool is not full)"""
+        with self._lock:
+            pool = self._voices.setdefault(language, queue.Queue())
+            if language in self._failed or self._loaded.get(language, 0) >= self.size:
+                return
+            self._loaded[language] = self._loaded.get(language, 0) + 1
+
+        try:
+            started = time.time()
+            voice = PiperVoice.load(self.modelpaths[language])
+            pool.put(voice)
+            logger.info(f"Loaded Piper voice ({language}) in {time.time() - started:.2f}s")
+        except Exception as e:
+            logger.error(f"Could not load Piper voice ({language}): {e}")
+            with self._lock:
+                self._loaded[language] -= 1
+                self._failed.add(language)
+
+    def warm(self):
+        """Load every voice up front (call from a worker thread at startup)"""
+        if not PIPERAVAILABLE:
+            return
+        for language in self.modelpaths:
+            for _ in range(self.size):
+                self._load(language)
+
+    def _acquire(self, language: str, deadline: float):
+        pool = self._voices.get(language)
+        if pool is None or pool.empty():
+            # Grow lazily up to the pool size before waiting on a busy voice
+            self._load(language)
+            pool = self._voices[language]
+        if language in self._failed and not self._loaded.get(language):
+            return None
+        try:
+            return pool.get(timeout=max(0.0, deadline - time.time()))
+        except queue.Empty:
+            raise TTSTimeout(f"No Piper voice ({language}) free within timeout")
+
+    def synthesize(self, text: str, language: str = "en", timeout: Optional[float] = None) -> Optional[bytes]:
+        """
+        Synthesize raw 16-bit PCM with a pooled voice
+
+        Args:
+            text: Text to speak
+            language: Key into the model paths
+            timeout: Deadline in seconds (defaults to the pool timeout)
+
+        Returns:
+            bytes or None if Piper is unavailable for this language
+
+        Raises:
+            TTSTimeout: If no voice frees up or synthesis runs past the deadline
+        """
+        if not PIPERAVAILABLE or language not in self.modelpaths:
+            return None
+
+        deadline = time.time() + (self.timeout if timeout is None else timeout)
+        voice = self._acquire(language, deadline)
+        if voice is None:
+            return None
+
+        try:
+            chunks = []
+            # Piper yields audio per sentence, which gives natural points to check the deadline
+            for chunk in self._stream(voice, text):
+                chunks.append(chunk)
+                if time.time() > deadline:
+                    raise TTSTimeout(f"Piper synthesis ({language}) exceeded timeout")
+            return b"".join(chunks)
+        finally:
+            self._voices[language].put(voice)
+
+    @staticmethod
+    def _stream(voice, text: str):
+        if hasattr(voice, "synthesize_stream_raw"):
+            # piper-tts 1.2
+            yield from voice.synthesize_stream_raw(text)
+        else:
+            # piper-tts 1.3+ yields AudioChunk objects
+            for chunk in voice.synthesize(text):
+                yield chunk.audio_int16_bytes
+
+    def stats(self) -> Dict:
+        """Loaded and idle voices per language"""
+        with self._lock:
+            return {
+                language: {"loaded": self._loaded.get(language, 0), "idle": pool.qsize()}
+                for language, pool in self._voices.items()
+            }
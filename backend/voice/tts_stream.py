@@ -0,0 +1,186 @@
+"""
+Sentence-level TTS streaming over the voice WebSocket
+Replies are cut into sentences (or clauses, for run-on text) as they arrive;
+each chunk is synthesized in the executor and sent as soon as it is ready,
+in order, so playback starts while later sentences are still rendering.
+
+Wire format per chunk:
+    {"type": "audio_chunk", "seq": n, "text": "...", "final": false} + binary PCM
+End of utterance:
+    {"type": "response", "text": "<full reply>", "role": "assistant", "seq": <chunks sent>, "final": true}
+"""
+
+import asyncio
+import json
+import logging
+import re
+from typing import Callable, List, Optional
+
+logger = logging.getLogger("VoiceServer.TTSStream")
+
+# Words ending in "." that do not end a sentence
+ABBREVIATIONS = {
+    "dr", "mr", "mrs", "ms", "st", "vs", "etc", "e.g", "i.e", "a.m", "p.m", "no", "approx",
+    "m", "mme", "mlle", "pr"
+}
+
+SENTENCEEND = re.compile(r"[.!?]+|\n")
+SPEAKABLE = re.compile(r"\w")
+
+
+class SentenceSplitter:
+    """Incrementally cut text into speakable chunks"""
+
+    def __init__(self, minchars: int = 12, maxchars: int = 200):
+        """
+        Args:
+            minchars: Shorter sentences are merged into the next one
+            maxchars: Longer runs are cut at the last comma/semicolon
+        """
+        self.minchars = minchars
+        self.maxchars = maxchars
+        self.buffer = ""
+
+    def _isboundary(self, match: re.Match) -> bool:
+        if match.group() == "\n":
+            return True
+        end = match.end()
+        # Need to see what follows before committing to a sentence end
+        if end >= len(self.buffer) or not self.buffer[end].isspace():
+            return False
+        if match.group() != ".":
+            return True
+        before = self.buffer[:match.start()].split()
+        word = before[-1].lower() if before else ""
+        # "1." list markers and abbreviations such as "Dr."
+        return not (word.isdigit() or word in ABBREVIATIONS)
+
+    def feed(self, fragment: str) -> List[str]:
+        """Add text, returning any chunks that are now complete"""
+        self.buffer += fragment
+        chunks = []
+        start = 0
+        for match in SENTENCEEND.finditer(self.buffer):
+            if not self._isboundary(match):
+                continue
+            chunk = self.buffer[start:match.end()].strip()
+            # Short sentences ride along with the next one; line breaks always cut
+            if len(chunk) < self.minchars and match.group() != "\n":
+                continue
+            if chunk:
+                chunks.append(chunk)
+            start = match.end()
+
+        self.buffer = self.buffer[start:]
+
+        if len(self.buffer) > self.maxchars:
+            cut = max(self.buffer.rfind(", ", 0, self.maxchars), self.buffer.rfind("; ", 0, self.maxchars))
+            if cut > self.minchars:
+                chunks.append(self.buffer[:cut + 1].strip())
+                self.buffer = self.buffer[cut + 1:]
+
+        return [chunk for chunk in chunks if SPEAKABLE.search(chunk)]
+
+    def flush(self) -> List[str]:
+        """Return whatever is left in the buffer"""
+        chunk = self.buffer.strip()
+        self.buffer = ""
+        return [chunk] if SPEAKABLE.search(chunk) else []
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split a complete reply into the chunks the streamer would send"""
+    splitter = SentenceSplitter()
+    return splitter.feed(text) + splitter.flush()
+
+
+class TTSStreamer:
+    """Synthesize and send one reply chunk by chunk, preserving order"""
+
+    def __init__(self, websocket, synthesize: Callable, executor=None,
+                 language: str = "en", persist: bool = False):
+        """
+        Args:
+            websocket: Client connection
+            synthesize: Blocking synthesize(text, language, persist) -> bytes or None
+            executor: Executor for synthesis (default loop executor if None)
+            language: Voice language (may be updated before later chunks are fed)
+            persist: Passed through to synthesize (disk-cache fixed prompts)
+        """
+        self.websocket = websocket
+        self.synthesize = synthesize
+        self.executor = executor
+        self.language = language
+        self.persist = persist
+        self.splitter = SentenceSplitter()
+        self.seq = 0
+        self.texts: List[str] = []
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._sender: Optional[asyncio.Task] = None
+
+    def _submit(self, chunks: List[str]):
+        loop = asyncio.get_event_loop()
+        for chunk in chunks:
+            # Synthesis starts now; the sender awaits results in submission order
+            future = loop.run_in_executor(self.executor, self.synthesize, chunk, self.language, self.persist)
+            self._queue.put_nowait((chunk, future))
+        if chunks and self._sender is None:
+            self._sender = asyncio.ensure_future(self._send())
+
+    async def _send(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            chunk, future = item
+            try:
+                audio = await future
+            except Exception as e:
+                logger.error(f"TTS chunk failed: {e}")
+                audio = None
+            self.texts.append(chunk)
+            if not audio:
+                continue
+            await self.websocket.send_text(json.dumps({
+                "type": "audio_chunk",
+                "seq": self.seq,
+                "text": chunk,
+                "final": False
+            }))
+            await self.websocket.send_bytes(audio)
+            self.seq += 1
+
+    async def feed(self, fragment: str):
+        """Queue any sentences completed by this text fragment"""
+        self._submit(self.splitter.feed(fragment))
+
+    async def finish(self, text: Optional[str] = None, **extra) -> str:
+        """
+        Flush the tail, wait for every chunk to be sent and send the end-of-utterance marker
+
+        Args:
+            text: Full reply text for the transcript (defaults to the chunks joined)
+            **extra: Additional fields for the final control message
+
+        Returns:
+            str: The full reply text
+        """
+        self._submit(self.splitter.flush())
+        if self._sender is not None:
+            self._queue.put_nowait(None)
+            await self._sender
+        text = text if text is not None else " ".join(self.texts)
+        await self.websocket.send_text(json.dumps({
+            "type": "response",
+            "text": text,
+            "role": "assistant",
+            "seq": self.seq,
+            "final": True,
+            **extra
+        }))
+        return text
+
+    async def speak(self, text: str, **extra) -> str:
+        """Stream a complete reply"""
+        await self.feed(text)
+        return await self.finish(text, **extra)
@@ -36,10 +36,17 @@ logger = logging.getLogger("VoiceServer")
 # Add backend to path
 sys.path.insert(0, BASE_DIR)
 from agent.medical_agent import MedicalReceptionistAgent
+from agent.context_manager import ConversationContext
 from db.database import SessionLocal
 from db.models import Call, User
 import config
 from auth import decode_access_token
+from voice.tts_cache import TTSCache
+from voice.tts_pool import PiperVoicePool, TTSTimeout
+from voice.tts_stream import TTSStreamer, split_sentences
+from services.llm_client import llm_client
+from services.availability_service import occupancy_index
+from services.slot_hold_service import slot_hold_service
 
 app = FastAPI(title="Medical Receptionist Streaming Server")
 
@@ -54,7 +61,7 @@ app.add_middleware(
 # --- Global Resources ---
 agent = MedicalReceptionistAgent()
 vad = webrtcvad.Vad(VAD_MODE)
-executor = ThreadPoolExecutor(max_workers=3)  # For STT/TTS blocking calls
+executor = ThreadPoolExecutor(max_workers=max(3, config.config.TTSPOOLSIZE + 1))  # For STT/TTS blocking calls
 
 # Initialize Whisper (Lazy load or startup?)
 # using 'base' for multilingual support (en/fr)
@@ -77,6 +84,20 @@ PIPER_MODEL_PATHS = {
     "fr": os.path.join(MODELS_DIR, PIPER_MODELS["fr"])
 }
 
+# Warm Piper voices, loaded once per pool slot
+tts_pool = PiperVoicePool(
+    PIPER_MODEL_PATHS,
+    size=config.config.TTSPOOLSIZE,
+    timeout=config.config.TTSTIMEOUTSECONDS
+)
+
+# Pre-rendered audio for repeated replies (greeting, emergency protocols, ...)
+tts_cache = TTSCache(
+    cachedir=config.config.TTSCACHEDIR,
+    maxmemorybytes=config.config.TTSCACHEMEMORYMB * 1024 * 1024,
+    maxdiskbytes=config.config.TTSCACHEDISKMB * 1024 * 1024
+)
+
 async def ensure_piper_models():
     """Check if piper models exist, else download them."""
     
@@ -112,9 +133,32 @@ async def ensure_piper_models():
                 
                 logger.info(f"Piper Model ({lang}) Downloaded.")
 
+def prewarm_tts():
+    """Load the Piper voices, then synthesize fixed replies ahead of the first call
+    (emergency protocols first)."""
+    tts_pool.warm()
+    # Replies are streamed sentence by sentence, so cache the same chunks
+    for text in agent.getfixedresponses():
+        for sentence in split_sentences(text):
+            synthesize(sentence, "en", True)
+    logger.info(f"TTS cache prewarmed: {tts_cache.stats()}")
+
 @app.on_event("startup")
 async def startup_event():
     await ensure_piper_models()
+    await asyncio.get_event_loop().run_in_executor(executor, occupancy_index.build)
+    # Don't hold up startup; cached clips load from disk, new ones need Piper
+    asyncio.get_event_loop().run_in_executor(executor, prewarm_tts)
+
+@app.get("/llm/metrics")
+async def llm_metrics():
+    """LLM scheduler metrics for live call turns handled by this server."""
+    return llm_client.stats()
+
+@app.get("/sessions/metrics")
+async def session_metrics():
+    """Resident call sessions and their approximate memory."""
+    return agent.conversationstate.stats()
 
 # --- Audio Processing Helpers ---
 
@@ -160,6 +204,27 @@ def run_tts(text, language="en"):
         logger.error(f"TTS Exception: {e}")
         return None
 
+def run_piper(text, language="en"):
+    """Synthesize with a pooled in-process voice, falling back to the piper CLI."""
+    try:
+        audio = tts_pool.synthesize(text, language)
+    except TTSTimeout as e:
+        logger.error(f"TTS Timeout: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Pooled TTS Exception: {e}")
+        audio = None
+    if audio is None:
+        audio = run_tts(text, language)
+    return audio
+
+def synthesize(text, language="en", persist=False):
+    """TTS through the audio cache; falls back to Piper on a miss.
+    Only fixed prompts (persist=True) are written to the disk cache."""
+    if language not in PIPER_MODEL_PATHS:
+        language = "en"
+    return tts_cache.getorsynthesize(text, language, PIPER_MODEL_PATHS[language], run_piper, persist)
+
 class VADManager:
     """Manages Voice Activity Detection state."""
     def __init__(self):
@@ -199,6 +264,47 @@ class VADManager:
         
         return None
 
+# --- Agent Turn ---
+
+async def respond_and_speak(websocket, user_text, conversation_history, call_id, user_context):
+    """Run the agent and stream its reply as speech. Returns (agent_text, language).
+    LLM replies are spoken while they are still being generated."""
+    streamer = TTSStreamer(websocket, synthesize, executor)
+    streamed = []
+
+    async def on_fragment(fragment, language):
+        # Voice is fixed by the time the first sentence is submitted
+        if not streamed and language in PIPER_MODEL_PATHS:
+            streamer.language = language
+        streamed.append(fragment)
+        await streamer.feed(fragment)
+
+    json_response = await agent.processinput(
+        user_text, conversation_history, callid=call_id, user_context=user_context, on_fragment=on_fragment
+    )
+
+    try:
+        parsed_response = json.loads(json_response)
+        agent_text = parsed_response.get("spoken_response", "")
+        # Extract language if provided (metadata or the LLM's top-level field), default to en
+        response_metadata = parsed_response.get("metadata", {})
+        language = response_metadata.get("language") or parsed_response.get("language") or "en"
+    except:
+        parsed_response = {}
+        agent_text = json_response
+        language = "en"
+
+    if streamed:
+        # What was actually spoken wins if the final JSON turned out malformed
+        if not agent_text or parsed_response.get("metadata", {}).get("error"):
+            agent_text = "".join(streamed)
+        await streamer.finish(agent_text)
+    else:
+        streamer.language = language
+        await streamer.speak(agent_text)
+
+    return agent_text, language
+
 # --- WebSocket Endpoint ---
 
 @app.websocket("/ws")
@@ -235,29 +341,24 @@ async def websocket_endpoint(websocket: WebSocket, token: str = None):
         db.close()
     except Exception as e:
         logger.error(f"Failed to init DB record: {e}")
-        call_id = "temp_" + str(int(time.time()))
+        call_id = f"temp_{int(time.time())}_{os.getpid()}"
     
     # Initialize Conversation State with User Info (if authenticated)
     if user:
-        agent.conversationstate[call_id] = {
-            "intent": None,
-            "patientid": user.patient_id,
-            "patientname": user.patient.name if user.patient else user.username,
-            "userid": user.id,
-            "phone": None,
-            "verified": True,   # Auto-verify logged-in users
-            "otid": user.otid,
-            "awaitingname": False,
-            "awaitingkey": False,
-            "awaitingreason": False,
-            "appointmentreason": None,
-            "retrycount": 0
-        }
+        agent.conversationstate.create(
+            call_id,
+            patientid=user.patient_id,
+            patientname=user.patient.name if user.patient else user.username,
+            userid=user.id,
+            verified=True,   # Auto-verify logged-in users
+            otid=user.otid
+        )
         logger.info(f"State set for call_id '{call_id}': {agent.conversationstate.get(call_id)}")
     else:
         logger.info("User not authenticated or user object is None")
 
-    conversation_history = []
+    # Token-budgeted; older turns are folded into a rolling summary
+    conversation_history = ConversationContext()
     
     # Initialize VAD Manager for this connection
     vad_manager = VADManager()
@@ -267,21 +368,10 @@ async def websocket_endpoint(websocket: WebSocket, token: str = None):
         greeting = agent.getgreeting()
         conversation_history.append({"role": "assistant", "content": greeting})
         
-        # TTS Greeting (Async)
+        # TTS Greeting (streamed sentence by sentence, served from the cache)
         logger.info(f"Generating Greeting: {greeting}")
-        audio_bytes = await asyncio.get_event_loop().run_in_executor(executor, run_tts, greeting, "en")
-        
-        # Send control + audio
-        if audio_bytes:
-             # Send metadata first
-            await websocket.send_text(json.dumps({
-                "type": "response", 
-                "text": greeting,
-                "role": "assistant"
-            }))
-            # Send Binary Audio
-            await websocket.send_bytes(audio_bytes)
-            logger.info("Sent Greeting Audio")
+        await TTSStreamer(websocket, synthesize, executor, "en", persist=True).speak(greeting)
+        logger.info("Sent Greeting Audio")
 
         # Construct User Context for State Enforcement
         user_context = None
@@ -366,31 +456,13 @@ async def websocket_endpoint(websocket: WebSocket, token: str = None):
                         # Call Agent (Blocking-ish)
                         # The agent.processinput returns a JSON string now
                         print(f"DEBUG_VOICE: Calling processinput with context: {user_context}", flush=True)
-                        json_response = await agent.processinput(user_text, conversation_history, callid=call_id, user_context=user_context)
-                        
-                        try:
-                            parsed_response = json.loads(json_response)
-                            agent_text = parsed_response.get("spoken_response", "")
-                            # Extract language if provided, default to en
-                            response_metadata = parsed_response.get("metadata", {})
-                            language = response_metadata.get("language", "en")
-                        except:
-                            agent_text = json_response
-                            language = "en"
+                        # 4. TTS starts on the first sentence while the LLM is still generating
+                        agent_text, language = await respond_and_speak(
+                            websocket, user_text, conversation_history, call_id, user_context
+                        )
                         
                         conversation_history.append({"role": "assistant", "content": agent_text})
                         logger.info(f"Agent Response ({language}): {agent_text}")
-                        
-                        # 4. Generate TTS
-                        tts_audio = await asyncio.get_event_loop().run_in_executor(executor, run_tts, agent_text, language)
-                        
-                        if tts_audio:
-                             await websocket.send_text(json.dumps({
-                                "type": "response", # triggers client to play next blob
-                                "text": agent_text,
-                                "role": "assistant"
-                            }))
-                             await websocket.send_bytes(tts_audio)
 
             elif "text" in message:
                 # Handle control messages (if any)
@@ -407,29 +479,13 @@ async def websocket_endpoint(websocket: WebSocket, token: str = None):
                     
                     conversation_history.append({"role": "user", "content": user_text})
                     
-                    # Call Agent
-                    json_response = await agent.processinput(user_text, conversation_history, callid=call_id, user_context=user_context)
-                    try:
-                        parsed_response = json.loads(json_response)
-                        agent_text = parsed_response.get("spoken_response", "")
-                        language = parsed_response.get("metadata", {}).get("language", "en")
-                    except:
-                        agent_text = json_response
-                        language = "en"
+                    # Call Agent + TTS
+                    agent_text, language = await respond_and_speak(
+                        websocket, user_text, conversation_history, call_id, user_context
+                    )
                     
                     conversation_history.append({"role": "assistant", "content": agent_text})
                     logger.info(f"Agent Response: {agent_text}")
-                    
-                    # Generate TTS
-                    tts_audio = await asyncio.get_event_loop().run_in_executor(executor, run_tts, agent_text, language)
-                    
-                    if tts_audio:
-                         await websocket.send_text(json.dumps({
-                            "type": "response", 
-                            "text": agent_text,
-                            "role": "assistant"
-                        }))
-                         await websocket.send_bytes(tts_audio)
     
     except WebSocketDisconnect:
         logger.info("Client Disconnected")
@@ -437,9 +493,16 @@ async def websocket_endpoint(websocket: WebSocket, token: str = None):
         logger.error(f"WS Error: {e}", exc_info=True)
     finally:
         # Save Call Status
-        pass
+        agent.conversationstate.release(call_id)
+        slot_hold_service.release(call_id)
+        agent.bookingprefetch.release(call_id)
 
 if __name__ == "__main__":
     import uvicorn
     print("🚀 Starting Streaming Voice Server...")
-    uvicorn.run(app, host=config.config.APIHOST, port=config.config.VOICEPORT)
\ No newline at end of file
+    if config.config.VOICEWORKERS > 1:
+        # Workers share call state through the SQLite session store
+        uvicorn.run("voice.voice_server:app", host=config.config.APIHOST, port=config.config.VOICEPORT,
+                    workers=config.config.VOICEWORKERS)
+    else:
+        uvicorn.run(app, host=config.config.APIHOST, port=config.config.VOICEPORT)
\ No newline at end of file